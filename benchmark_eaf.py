@@ -0,0 +1,71 @@
+''' Compare EAF parsing speed of the available XML backends
+
+Usage: python benchmark_eaf.py [file.eaf ...]
+A synthetic EAF file will be generated when no file is provided.
+'''
+
+import os
+import sys
+import time
+import tempfile
+from texttaglib import elan
+
+
+def make_eaf(path, tiers=4, annotations=50000):
+    ''' Generate a synthetic EAF file with utterance and translation tiers '''
+    with open(path, 'w', encoding='utf-8') as outfile:
+        outfile.write('<?xml version="1.0" encoding="UTF-8"?>\n<ANNOTATION_DOCUMENT AUTHOR="" FORMAT="3.0" VERSION="3.0">\n')
+        outfile.write('<HEADER MEDIA_FILE="" TIME_UNITS="milliseconds"/>\n<TIME_ORDER>\n')
+        for i in range(tiers * annotations * 2):
+            outfile.write(f'<TIME_SLOT TIME_SLOT_ID="ts{i}" TIME_VALUE="{i * 500}"/>\n')
+        outfile.write('</TIME_ORDER>\n')
+        for t in range(tiers):
+            outfile.write(f'<TIER LINGUISTIC_TYPE_REF="Utterance" PARTICIPANT="P{t}" TIER_ID="P{t}">\n')
+            for a in range(annotations):
+                slot = (t * annotations + a) * 2
+                outfile.write(f'<ANNOTATION><ALIGNABLE_ANNOTATION ANNOTATION_ID="a{t}_{a}" TIME_SLOT_REF1="ts{slot}" TIME_SLOT_REF2="ts{slot + 1}">'
+                              f'<ANNOTATION_VALUE>utterance {a}</ANNOTATION_VALUE></ALIGNABLE_ANNOTATION></ANNOTATION>\n')
+            outfile.write('</TIER>\n')
+        outfile.write('<TIER LINGUISTIC_TYPE_REF="Translation" PARENT_REF="P0" PARTICIPANT="P0" TIER_ID="P0 (Translation)">\n')
+        for a in range(annotations):
+            outfile.write(f'<ANNOTATION><REF_ANNOTATION ANNOTATION_ID="r{a}" ANNOTATION_REF="a0_{a}">'
+                          f'<ANNOTATION_VALUE>translation {a}</ANNOTATION_VALUE></REF_ANNOTATION></ANNOTATION>\n')
+        outfile.write('</TIER>\n<LINGUISTIC_TYPE LINGUISTIC_TYPE_ID="Utterance" TIME_ALIGNABLE="true"/>\n'
+                      '<LINGUISTIC_TYPE CONSTRAINTS="Symbolic_Association" LINGUISTIC_TYPE_ID="Translation" TIME_ALIGNABLE="false"/>\n'
+                      '</ANNOTATION_DOCUMENT>\n')
+
+
+def timeit(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark(eaf_path):
+    tier_id = elan.scan_eaf(eaf_path).tiers()[0].ID
+    tasks = [('full parse', {}), ('one tier', {'tiers': tier_id}), ('inventory', {'inventory': True})]
+    backends = ['etree', 'lxml'] if elan._get_lxml_etree() is not None else ['etree']
+    print(f"{eaf_path} ({os.path.getsize(eaf_path) / 1024 / 1024:.1f} MB)")
+    for task, kwargs in tasks:
+        timings = []
+        for backend in backends:
+            def _parse():
+                with open(eaf_path, encoding='utf-8') as eaf_stream:
+                    elan.parse_eaf_stream(eaf_stream, backend=backend, **kwargs)
+            timings.append(f"{backend}: {timeit(_parse):.2f}s")
+        print(f"  {task.ljust(12)} {' | '.join(timings)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for eaf_path in sys.argv[1:]:
+            benchmark(eaf_path)
+    else:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            eaf_path = os.path.join(tmpdir, 'synthetic.eaf')
+            make_eaf(eaf_path)
+            benchmark(eaf_path)
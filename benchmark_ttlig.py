@@ -0,0 +1,86 @@
+''' Compare TTLIG token parsing and furigana alignment speed
+
+Usage: python benchmark_ttlig.py [file.txt ...]
+Synthetic TTLIG lines will be generated when no file is provided.
+Furigana tokens ({kanji/reading}) found in the files are used to benchmark RubyToken.from_furi().
+'''
+
+import sys
+import time
+import random
+from texttaglib import ttlig
+from texttaglib.chirptext.deko import KATA2HIRA_TRANS
+
+WORDS = [('友達', 'ともだち'), ('言い尽くす', 'いいつくす'), ('巡り', 'めぐり'), ('会っ', 'あっ'), ('好き', 'すき'), ('お茶', 'おちゃ'),
+         ('食べる', 'たべる'), ('面白い', 'おもしろい'), ('お天気', 'おてんき'), ('取り扱い', 'とりあつかい'), ('申し込み', 'もうしこみ'),
+         ('見学', 'けんがく'), ('振り返る', 'ふりかえる'), ('思い出す', 'おもいだす'), ('東京', 'とうきょう'), ('子ども', 'こども'),
+         ('お父さん', 'おとうさん'), ('立ち上がる', 'たちあがる'), ('落とし物', 'おとしもの'), ('大きな', 'おおきな'), ('少し', 'すこし'),
+         ('話し合い', 'はなしあい'), ('3月', 'さんがつ'), ('人々', 'ひとびと'), ('赤ちゃん', 'あかちゃん'), ('打ち合わせ', 'うちあわせ'),
+         ('明日', 'あした'), ('時', 'じ'), ('漢字', 'かんじ'), ('お見舞い', 'おみまい'), ('当たり前', 'あたりまえ'), ('乗り換え', 'のりかえ')]
+
+
+def make_lines(count=200000, escaped=0.1, seed=1):
+    ''' Generate synthetic token lines, a fraction of them contains escaped spaces '''
+    rand = random.Random(seed)
+    words = ['{{{}/{}}}'.format(surface, reading) for surface, reading in WORDS] + ['が', 'を', 'です', '。', 'I', 'drink', 'green', 'tea', '.']
+    lines = []
+    for _ in range(count):
+        tokens = [rand.choice(words) for _ in range(rand.randint(5, 25))]
+        if rand.random() < escaped:
+            tokens[0] = 'green\\ tea'
+        lines.append(' '.join(tokens))
+    return lines
+
+
+def read_lines(path):
+    ''' Read all non-empty lines of a TTLIG file '''
+    with open(path, encoding='utf-8') as infile:
+        return [line.rstrip('\n') for line in infile if line.strip()]
+
+
+def furi_pairs(lines, limit=50000):
+    ''' Collect (surface, reading) pairs from tokens that contain furigana '''
+    pairs = []
+    for line in lines:
+        if len(pairs) >= limit:
+            break
+        if '{' not in line:
+            continue
+        for token in ttlig.parse_ruby(line):
+            if any(isinstance(g, ttlig.RubyFrag) for g in token.groups):
+                reading = ''.join(g.furi if isinstance(g, ttlig.RubyFrag) else str(g).translate(KATA2HIRA_TRANS) for g in token.groups)
+                pairs.append((token.text(), reading))
+    return pairs
+
+
+def timeit(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def benchmark(name, lines):
+    parser = ttlig.TTLTokensParser()
+    escaped = sum(1 for line in lines if parser.escapechar in line)
+    print(f"{name} ({len(lines)} lines, {escaped} with escape chars)")
+    char_time = timeit(lambda: [parser._parse_chars(line) for line in lines])
+    fast_time = timeit(lambda: ttlig.tokenize_many(lines))
+    print(f"  per-character: {char_time:.2f}s | fast path: {fast_time:.2f}s | speed up: {char_time / fast_time:.1f}x")
+    pairs = furi_pairs(lines)
+    if not pairs:
+        return
+    timings = [f"{aligner}: {timeit(lambda: [ttlig.RubyToken.from_furi(s, k, aligner=aligner) for s, k in pairs]):.2f}s"
+               for aligner in ttlig.FURI_ALIGNERS]
+    print(f"  from_furi ({len(pairs)} tokens) {' | '.join(timings)}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            benchmark(path, read_lines(path))
+    else:
+        benchmark('synthetic', make_lines())
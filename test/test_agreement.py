@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Test inter-annotator agreement
+Latest version can be found at https://github.com/letuananh/texttaglib
+
+References:
+    Python unittest documentation:
+        https://docs.python.org/3/library/unittest.html
+
+@author: Le Tuan Anh <tuananh.ke@gmail.com>
+@license: MIT
+'''
+
+# Copyright (c) 2020, Le Tuan Anh <tuananh.ke@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+########################################################################
+
+import os
+import tempfile
+import unittest
+import logging
+
+from texttaglib import elan
+from texttaglib import agreement
+
+
+# -------------------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------------------
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+TEST_EAF = os.path.join(TEST_DIR, 'data', 'test.eaf')
+EMOTIONS = [('cveid0', 'happy'), ('cveid1', 'neutral'), ('cveid2', 'sad')]
+ANNOTATOR1 = [(0, 1000, 'cveid0'), (1000, 2000, 'cveid1'), (3000, 4000, 'cveid2')]
+ANNOTATOR2 = [(0, 1000, 'cveid0'), (1000, 2000, 'cveid2'), (3500, 4500, 'cveid2')]
+
+
+def getLogger():
+    return logging.getLogger(__name__)
+
+
+def write_eaf(eaf_path):
+    vocab = elan.ELANVocab('Emotions', 'Emotion categories', 'und',
+                           entries=[elan.ELANCVEntry(ID, 'und', value) for ID, value in EMOTIONS])
+    with elan.EAFWriter(eaf_path) as writer:
+        writer.add_linguistic_type('Emotion', controlled_vocabulary_ref='Emotions')
+        writer.add_vocab(vocab)
+        for tier_id, spans in (('Annotator1', ANNOTATOR1), ('Annotator2', ANNOTATOR2)):
+            writer.add_tier(tier_id, 'Emotion', participant='Person1')
+            for start, end, cve_ref in spans:
+                writer.add_annotation(tier_id, start, end, vocab[cve_ref].value, cve_ref=cve_ref)
+
+
+# -------------------------------------------------------------------------------
+# Test cases
+# -------------------------------------------------------------------------------
+
+class TestAgreement(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.eaf_path = os.path.join(self.tmpdir.name, 'annotators.eaf')
+        write_eaf(self.eaf_path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_segments(self):
+        eaf = elan.open_eaf(TEST_EAF)
+        spans_a, _ = agreement.tier_spans(eaf['Person1 (Utterance)'])
+        spans_b, labels = agreement.tier_spans(eaf['Person2 (Utterance)'])
+        self.assertEqual(labels, ('Hi', "I'm good", 'Bye'))
+        expected = [(0, 800, 'Hello', None), (800, 1000, 'Hello', 'Hi'), (1000, 1500, None, 'Hi'),
+                    (1500, 1600, 'How are you', 'Hi'), (1600, 3000, 'How are you', None), (3200, 5000, None, "I'm good"),
+                    (5000, 5200, 'Fine thanks BABYNAME', "I'm good"), (5200, 6500, 'Fine thanks BABYNAME', None),
+                    (7000, 8000, None, 'Bye')]
+        self.assertEqual(list(agreement.segments(spans_a, spans_b)), expected)
+        self.assertEqual(list(agreement.segments(spans_a, [])), [(s.start, s.end, s.label, None) for s in spans_a])
+        self.assertEqual(list(agreement.segments([], [])), [])
+        # overlapping spans within a list: the span that started last gives the label
+        outer, inner, late = agreement.Span(0, 100, 'outer', None), agreement.Span(20, 40, 'inner', None), agreement.Span(90, 120, 'late', None)
+        self.assertEqual(list(agreement.segments([outer, inner, late], [agreement.Span(30, 50, 'b', None)])),
+                         [(0, 20, 'outer', None), (20, 30, 'inner', None), (30, 40, 'inner', 'b'), (40, 50, 'outer', 'b'),
+                          (50, 90, 'outer', None), (90, 100, 'late', None), (100, 120, 'late', None)])
+
+    def test_compare_tiers(self):
+        eaf = elan.open_eaf(self.eaf_path)
+        report = agreement.compare_tiers(eaf['Annotator1'], eaf['Annotator2'])
+        self.assertEqual(report.labels, ('happy', 'neutral', 'sad'))
+        self.assertEqual((report.a_ms, report.b_ms, report.overlap_ms, report.agree_ms), (3000, 3000, 2500, 1500))
+        self.assertEqual((report.precision(), report.recall(), report.f1()), (0.5, 0.5, 0.5))
+        self.assertAlmostEqual(report.recall(match_labels=False), 2500 / 3000)
+        self.assertAlmostEqual(report.kappa(), 2 / 9)
+        self.assertAlmostEqual(report.kappa(include_blank=False), 4 / 9)
+        labels, rows = report.matrix()
+        self.assertEqual(labels, ('happy', 'neutral', 'sad', None))
+        self.assertEqual(rows, [[1000, 0, 0, 0], [0, 0, 1000, 0], [0, 0, 500, 500], [0, 0, 500, 0]])
+        self.assertEqual(agreement.compare_tiers(eaf['Annotator1'], eaf['Annotator1']).kappa(), 1.0)
+
+    def test_corpus_agreement(self):
+        total, results = agreement.corpus_agreement([self.eaf_path, self.eaf_path, TEST_EAF], 'Annotator1', 'Annotator2', jobs=1)
+        self.assertEqual([r.ok for r in results], [True, True, False])
+        self.assertGreaterEqual(results[0].value.load_time, 0)
+        self.assertEqual(total.agree_ms, 3000)
+        self.assertAlmostEqual(total.kappa(), 2 / 9)
+
+
+# -------------------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    unittest.main()
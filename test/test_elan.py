@@ -0,0 +1,875 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Test ELAN support
+Latest version can be found at https://github.com/letuananh/texttaglib
+
+References:
+    Python unittest documentation:
+        https://docs.python.org/3/library/unittest.html
+
+@author: Le Tuan Anh <tuananh.ke@gmail.com>
+@license: MIT
+'''
+
+# Copyright (c) 2020, Le Tuan Anh <tuananh.ke@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+########################################################################
+
+import os
+import io
+import re
+import json
+import inspect
+import random
+import shutil
+import tempfile
+import unittest
+import logging
+from unittest.mock import patch
+
+from texttaglib import elan
+
+
+# -------------------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------------------
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+TEST_EAF = os.path.join(TEST_DIR, 'data', 'test.eaf')
+
+
+def getLogger():
+    return logging.getLogger(__name__)
+
+
+def read_eaf():
+    return elan.open_eaf(TEST_EAF)
+
+
+def make_annotations(spans):
+    ''' Create time-alignable annotations from (start, end) tuples '''
+    return [elan.ELANTimeAnnotation(str(idx), elan.TimeSlot(f'ts{idx}a', start), elan.TimeSlot(f'ts{idx}b', end), str(idx))
+            for idx, (start, end) in enumerate(spans)]
+
+
+def count_babyname(eaf):
+    return sum(1 for tier in eaf for ann in tier if 'BABYNAME' in ann.value)
+
+
+def summarise(eaf):
+    ''' Summarise an ELANDoc object into builtin types for comparison '''
+    def _ann(a):
+        if isinstance(a, elan.ELANTimeAnnotation):
+            return (a.ID, a.value, a.cve_ref, a.from_ts.ID, a.from_ts.value, a.to_ts.ID, a.to_ts.value)
+        return (a.ID, a.value, a.cve_ref, a.ref, a.previous)
+    return ((eaf.author, eaf.date, eaf.fileformat, eaf.version, eaf.media_file, eaf.time_units,
+             eaf.media_url, eaf.mime_type, eaf.relative_media_url, list(eaf.properties.items())),
+            [(ts.ID, ts.value) for ts in eaf.time_order.values()],
+            [(t.ID, t.participant, t.linguistic_type.ID, t.parent.ID if t.parent else None,
+              [c.ID for c in t.children], [_ann(a) for a in t]) for t in eaf],
+            [lt._to_xml_attrib() for lt in eaf.linguistic_types],
+            [(c.description, c.stereotype) for c in eaf.constraints],
+            [(v.ID, v.description, v.lang_ref, [(e.ID, e.lang_ref, e.value, e.description) for e in v]) for v in eaf.vocabs])
+
+
+# -------------------------------------------------------------------------------
+# Tests
+# -------------------------------------------------------------------------------
+
+class TestELAN(unittest.TestCase):
+
+    def test_read_eaf(self):
+        eaf = read_eaf()
+        self.assertEqual(eaf.media_url, 'file:///home/tuananh/Documents/test.wav')
+        self.assertEqual(eaf.time_units, 'milliseconds')
+        self.assertEqual(len(eaf.tiers()), 5)
+        self.assertEqual([t.ID for t in eaf.roots], ['Person1 (Utterance)', 'Person2 (Utterance)', 'Person1 (Emotion)'])
+        self.assertEqual(len(eaf['Person1 (Words)']), 3)
+        self.assertEqual(eaf['Person1 (Words)'].parent.ID, 'Person1 (Utterance)')
+        emotion = eaf['Person1 (Emotion)']
+        self.assertEqual(emotion.linguistic_type.vocab.ID, 'Emotions')
+        self.assertEqual(emotion[0].cve_ref, 'cveid0')
+
+    def test_selective_parsing(self):
+        eaf = elan.open_eaf(TEST_EAF, tiers=['Person2 (Utterance)'])
+        self.assertEqual([t.ID for t in eaf.tiers()], ['Person2 (Utterance)'])
+        self.assertEqual(len(eaf['Person2 (Utterance)']), 3)
+        # linguistic types & vocabs are still available
+        self.assertEqual(len(eaf.linguistic_types), 4)
+        self.assertEqual(len(eaf.vocabs), 1)
+        eaf = elan.open_eaf(TEST_EAF, participants='Person1', linguistic_types=['Utterance', 'Words'])
+        self.assertEqual([t.ID for t in eaf.tiers()], ['Person1 (Utterance)', 'Person1 (Words)'])
+        self.assertEqual([t.ID for t in eaf['Person1 (Utterance)'].children], ['Person1 (Words)'])
+        # parent tiers must be selected together with their children
+        self.assertRaises(ValueError, lambda: elan.open_eaf(TEST_EAF, linguistic_types='Translation'))
+        # filters are keyword-only, extra positional arguments are passed to the file opener
+        params = inspect.signature(elan.open_eaf).parameters
+        self.assertTrue(all(params[p].kind == inspect.Parameter.KEYWORD_ONLY
+                            for p in ('tiers', 'participants', 'linguistic_types', 'cache', 'backend')))
+
+    def test_scan_eaf(self):
+        eaf = elan.scan_eaf(TEST_EAF)
+        self.assertTrue(eaf.inventory)
+        self.assertEqual(eaf.media_url, 'file:///home/tuananh/Documents/test.wav')
+        self.assertEqual(len(eaf.properties), 2)
+        self.assertFalse(eaf.time_order)
+        counts = [(t.ID, t.annotation_count, len(t)) for t in eaf.tiers()]
+        self.assertEqual(counts, [('Person1 (Utterance)', 3, 0), ('Person2 (Utterance)', 3, 0),
+                                  ('Person1 (Translation)', 2, 0), ('Person1 (Words)', 3, 0),
+                                  ('Person1 (Emotion)', 2, 0)])
+        self.assertEqual(eaf['Person1 (Emotion)'].linguistic_type.vocab.ID, 'Emotions')
+
+    def test_scan_eaf_dir(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ('a.eaf', 'b.eaf'):
+                shutil.copy(TEST_EAF, os.path.join(tmpdir, name))
+            with open(os.path.join(tmpdir, 'broken.eaf'), 'w') as outfile:
+                outfile.write('<ANNOTATION_DOCUMENT>')
+            for jobs in (1, 2):
+                catalogue = elan.scan_eaf_dir(tmpdir, jobs=jobs)
+                self.assertEqual(len(catalogue), 10)
+                self.assertEqual(os.path.basename(catalogue[0][0]), 'a.eaf')
+                self.assertEqual(catalogue[0][3:], ('Person1 (Utterance)', 'Person1', 'Utterance', None, 3))
+
+
+LXML_AVAILABLE = elan._get_lxml_etree() is not None
+
+
+class TestBackends(unittest.TestCase):
+
+    def parse(self, backend, **kwargs):
+        with open(TEST_EAF, encoding='utf-8') as eaf_stream:
+            return elan.parse_eaf_stream(eaf_stream, backend=backend, **kwargs)
+
+    @unittest.skipIf(not LXML_AVAILABLE, "lxml is not available")
+    def test_identical_docs(self):
+        for kwargs in ({}, {'participants': 'Person1'}, {'linguistic_types': 'Utterance'}, {'inventory': True}):
+            lxml_doc = self.parse('lxml', **kwargs)
+            etree_doc = self.parse('etree', **kwargs)
+            self.assertEqual(summarise(lxml_doc), summarise(etree_doc))
+            self.assertEqual([t.annotation_count for t in lxml_doc], [t.annotation_count for t in etree_doc])
+        lxml_doc = elan.open_eaf(TEST_EAF, backend='lxml')
+        self.assertEqual(lxml_doc.get_annotation('a11').parent.ID, 'a2')
+        self.assertEqual(lxml_doc.to_csv_rows(), elan.open_eaf(TEST_EAF, backend='etree').to_csv_rows())
+
+    @unittest.skipIf(not LXML_AVAILABLE, "lxml is not available")
+    def test_binary_stream(self):
+        with open(TEST_EAF, 'rb') as eaf_stream:
+            lxml_doc = elan.parse_eaf_stream(eaf_stream, backend='lxml')
+        self.assertEqual(summarise(lxml_doc), summarise(self.parse('etree')))
+
+    def test_invalid_backend(self):
+        self.assertRaises(ValueError, lambda: self.parse('sax'))
+
+    def test_fallback(self):
+        with patch.object(elan, '_get_lxml_etree', return_value=None):
+            with self.assertLogs(elan.getLogger(), level='WARNING'):
+                doc = self.parse('lxml')
+            self.assertEqual(summarise(doc), summarise(self.parse('etree')))
+
+
+class TestTimeSlot(unittest.TestCase):
+
+    def test_timeslot(self):
+        ts = elan.TimeSlot('ts1', 1500)
+        self.assertEqual(ts.ts, '00:00:01.500')
+        self.assertEqual(ts.sec, 1.5)
+        ts.value = 61500
+        self.assertEqual(str(ts), '00:01:01.500')
+        self.assertEqual(elan.TimeSlot.from_ts('00:00:01.500').value, 1500)
+        self.assertIsInstance(elan.TimeSlot.from_ts('00:00:01.001').value, int)
+        # no per-instance dict, __dict__ is only a read-only view for serialisation
+        self.assertRaises(AttributeError, lambda: setattr(ts, 'extra', 1))
+        self.assertEqual(ts.__dict__, {'ID': 'ts1', 'value': 61500})
+        # ordering
+        slots = [elan.TimeSlot('a', 300), elan.TimeSlot('b', 100), elan.TimeSlot('c', 200)]
+        self.assertEqual([s.ID for s in sorted(slots)], ['b', 'c', 'a'])
+        self.assertTrue(slots[0] > None)
+        self.assertTrue(slots[1] < 101)
+        self.assertTrue(slots[1] <= elan.TimeSlot('d', 100))
+        self.assertEqual(elan.TimeSlot('unaligned').ts, None)
+
+    def test_to_json(self):
+        ann = read_eaf()['Person2 (Utterance)'][0]
+        ann_json = json.loads(ann.to_json())
+        self.assertEqual((ann_json['from_ts'], ann_json['to_ts']), ({'ID': 'ts2', 'value': 800}, {'ID': 'ts5', 'value': 1600}))
+
+    def test_time_order(self):
+        eaf = read_eaf()
+        self.assertEqual([ts.ID for ts in eaf.time_order.at(3000)], ['ts6', 'ts13'])
+        self.assertEqual([ts.ID for ts in eaf.time_order.between('00:00:05.000', 6500)], ['ts8', 'ts9', 'ts10', 'ts14'])
+        self.assertEqual(eaf.time_order.nearest(5100).ID, 'ts8')
+        self.assertEqual(eaf.time_order.nearest(100000).ID, 'ts12')
+        eaf.time_order['ts15'] = elan.TimeSlot('ts15', 100000)
+        self.assertEqual(eaf.time_order.nearest(100000).ID, 'ts15')
+
+
+class TestCorpus(unittest.TestCase):
+
+    def test_process_corpus(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ('c.eaf', 'a.eaf', 'b.eaf'):
+                shutil.copy(TEST_EAF, os.path.join(tmpdir, name))
+            with open(os.path.join(tmpdir, 'broken.eaf'), 'w') as outfile:
+                outfile.write('<ANNOTATION_DOCUMENT>')
+            paths = elan.find_eaf_files(tmpdir)
+            self.assertEqual([p.name for p in paths], ['a.eaf', 'b.eaf', 'broken.eaf', 'c.eaf'])
+            self.assertEqual(elan.find_eaf_files(os.path.join(tmpdir, '[ab].eaf'), paths[0]), paths[:2])
+            for jobs in (1, 2):
+                results = elan.process_corpus(paths, count_babyname, jobs=jobs, linguistic_types='Utterance')
+                self.assertEqual([r.path for r in results], paths)
+                self.assertEqual([r.value for r in results], [1, 1, None, 1])
+                self.assertEqual([r.ok for r in results], [True, True, False, True])
+
+
+class TestCache(unittest.TestCase):
+
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            eaf_path = os.path.join(tmpdir, 'test.eaf')
+            shutil.copy(TEST_EAF, eaf_path)
+            cache = elan.EAFCache(os.path.join(tmpdir, 'cache'))
+            self.assertIsNone(cache.get(eaf_path))
+            eaf = elan.open_eaf(eaf_path, cache=cache)
+            self.assertIsNotNone(cache.get(eaf_path))
+            cached = elan.open_eaf(eaf_path, cache=cache)
+            self.assertIsNot(cached, eaf)
+            self.assertEqual(summarise(cached), summarise(eaf))
+            self.assertEqual(cached['Person1 (Emotion)'].linguistic_type.vocab['cveid0'].description, 'Positive emotion')
+            # parsing options are part of the key
+            self.assertIsNone(cache.get(eaf_path, tiers=['Person2 (Utterance)']))
+            filtered = elan.open_eaf(eaf_path, tiers=['Person2 (Utterance)'], cache=cache)
+            self.assertEqual(len(filtered.tiers()), 1)
+            # equivalent filters share cache entries
+            for tiers in (('Person2 (Utterance)',), {'Person2 (Utterance)'}, 'Person2 (Utterance)'):
+                self.assertIsNotNone(cache.get(eaf_path, tiers=tiers))
+            self.assertEqual(cache.key(eaf_path, tiers=['a', 'b']), cache.key(eaf_path, tiers=('b', 'a')))
+            # modified files are parsed again
+            with open(eaf_path, 'a') as outfile:
+                outfile.write('\n')
+            os.utime(eaf_path, ns=(0, 0))
+            self.assertIsNone(cache.get(eaf_path))
+            # clear cache
+            elan.clear_cache(cache.cache_dir)
+            self.assertFalse(os.listdir(cache.cache_dir))
+
+    def test_cache_eviction(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            paths = []
+            for idx in range(3):
+                paths.append(os.path.join(tmpdir, '{}.eaf'.format(idx)))
+                shutil.copy(TEST_EAF, paths[-1])
+            cache = elan.EAFCache(os.path.join(tmpdir, 'cache'), max_size=1)
+            for path in paths:
+                cache.put(path, read_eaf())
+                self.assertEqual(len(os.listdir(cache.cache_dir)), 0)
+            cache.max_size = 10 ** 6
+            for path in paths:
+                cache.put(path, read_eaf())
+            self.assertEqual(len(os.listdir(cache.cache_dir)), 3)
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_iter_annotations(self):
+        with open(TEST_EAF, encoding='utf-8') as eaf_stream:
+            records = list(elan.iter_annotations(eaf_stream))
+        eaf = read_eaf()
+        self.assertEqual([r.ID for r in records], [a.ID for t in eaf for a in t])
+        self.assertEqual(records[0], ('Person1 (Utterance)', 'Person1', 0, 1000, 'Hello', None, None, 'a1'))
+        # ref annotations inherit time spans from their parents
+        by_id = {r.ID: r for r in records}
+        self.assertEqual((by_id['a7'].start, by_id['a7'].end, by_id['a7'].ref), (0, 1000, 'a1'))
+        self.assertEqual((by_id['a11'].start, by_id['a11'].end), (1500, 3000))
+        self.assertEqual(by_id['a12'].cve_ref, 'cveid0')
+        self.assertEqual(by_id['a7'].to_csv_row(), ('Person1 (Translation)', 'Person1', '0.000', '1.000', '1.000', 'Xin chào'))
+
+    def test_iter_annotations_filter(self):
+        with open(TEST_EAF, encoding='utf-8') as eaf_stream:
+            records = list(elan.iter_annotations(eaf_stream, linguistic_types='Translation'))
+        self.assertEqual([(r.ID, r.start, r.end) for r in records], [('a7', 0, 1000), ('a8', 1500, 3000)])
+
+    def test_iter_annotations_parent_spans(self):
+        with open(TEST_EAF, encoding='utf-8') as eaf_stream:
+            expected = list(elan.iter_annotations(eaf_stream))
+        # the stream is read only once, so it does not need to be seekable
+        with open(TEST_EAF, encoding='utf-8') as eaf_stream:
+            eaf_stream.seekable = lambda: False
+            eaf_stream.seek = None
+            self.assertEqual(list(elan.iter_annotations(eaf_stream)), expected)
+        # words (a9-a11) are resolved against their parent tier Person1 (Utterance)
+        self.assertEqual([(r.ID, r.ref, r.start, r.end) for r in expected if r.tier == 'Person1 (Words)'],
+                         [('a11', 'a2', 1500, 3000), ('a9', 'a2', 1500, 3000), ('a10', 'a2', 1500, 3000)])
+
+
+class TestTimeIndex(unittest.TestCase):
+
+    def test_filter(self):
+        tier = read_eaf()['Person1 (Utterance)']
+        self.assertEqual([a.ID for a in tier.filter(1000, 5000)], ['a2', 'a3'])
+        self.assertEqual([a.ID for a in tier.filter(from_ts=1500)], ['a2', 'a3'])
+        self.assertEqual([a.ID for a in tier.filter(to_ts='00:00:01.500')], ['a1', 'a2'])
+        # non time-alignable tiers return everything
+        words = read_eaf()['Person1 (Words)']
+        self.assertEqual(len(list(words.filter(1000, 2000))), 3)
+
+    def test_filter_order(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            eaf_path = os.path.join(tmpdir, 'unordered.eaf')
+            with elan.EAFWriter(eaf_path) as writer:
+                writer.add_linguistic_type('Utterance')
+                writer.add_tier('A', 'Utterance')
+                for ID, start, end in (('c', 2000, 3000), ('a', 0, 1000), ('d', 3000, 4000), ('b', 1000, 2000)):
+                    writer.add_annotation('A', start, end, ID, ID=ID)
+            tier = elan.open_eaf(eaf_path)['A']
+        # filtered annotations keep the order of the tier
+        self.assertEqual([a.ID for a in tier.filter(1000, 3000)], ['c', 'd', 'b'])
+        self.assertEqual([a.ID for a in tier.filter()], ['c', 'a', 'd', 'b'])
+        self.assertEqual([a.ID for a in tier.overlap(1500, 2500)], ['b', 'c'])
+
+    def test_overlap_query(self):
+        tier = read_eaf()['Person1 (Utterance)']
+        self.assertEqual([a.ID for a in tier.overlap(900, 1600)], ['a1', 'a2'])
+        self.assertEqual([a.ID for a in tier.overlap(3100, 4000)], [])
+        self.assertEqual([a.ID for a in tier.overlap(3000, 3000)], ['a2'])
+        self.assertEqual([a.ID for a in tier.at('00:00:05.500')], ['a3'])
+        self.assertEqual([a.ID for a in tier.overlap()], ['a1', 'a2', 'a3'])
+
+    def test_nested_intervals(self):
+        tier = elan.ELANTier('Utterance', 'P', 'T')
+        spans = [(0, 10000), (100, 200), (300, 400), (5000, 6000), (9000, 12000)]
+        for idx, (start, end) in enumerate(spans):
+            tier.annotations.append(elan.ELANTimeAnnotation(str(idx), elan.TimeSlot(f'ts{idx}a', start),
+                                                            elan.TimeSlot(f'ts{idx}b', end), str(idx)))
+        self.assertEqual([a.ID for a in tier.at(350)], ['0', '2'])
+        self.assertEqual([a.ID for a in tier.overlap(5500, 9500)], ['0', '3', '4'])
+        self.assertEqual([a.ID for a in tier.at(11000)], ['4'])
+        # index must be refreshed when new annotations are added
+        tier.annotations.append(elan.ELANTimeAnnotation('5', elan.TimeSlot('ts5a', 11500), elan.TimeSlot('ts5b', 13000), '5'))
+        self.assertEqual([a.ID for a in tier.at(11800)], ['4', '5'])
+
+    def test_overlap_brute_force(self):
+        # a long annotation in the middle of the start order must not be pruned
+        index = elan.TimeIndex(make_annotations(zip(range(8), [1, 2, 100, 8, 9, 10, 11, 12])))
+        self.assertEqual([(a.from_ts.value, a.to_ts.value) for a in index.overlap(5, 6)], [(2, 100), (3, 8), (4, 9), (5, 10), (6, 11)])
+        rand = random.Random(1)
+        for _ in range(500):
+            spans = []
+            for _ in range(rand.randint(0, 30)):
+                start = rand.randint(0, 100)
+                spans.append((start, start + rand.randint(0, 40)))
+            index = elan.TimeIndex(make_annotations(spans))
+            from_ms = rand.randint(-10, 150)
+            to_ms = from_ms + rand.randint(0, 30)
+            expected = [a for a in index.annotations if a.to_ts.value >= from_ms and a.from_ts.value <= to_ms]
+            self.assertEqual(index.overlap(from_ms, to_ms), expected)
+            self.assertEqual(index.at(from_ms), [a for a in index.annotations if a.from_ts.value <= from_ms <= a.to_ts.value])
+
+    def test_nearest(self):
+        tier = read_eaf()['Person2 (Utterance)']
+        self.assertEqual([a.ID for a in tier.nearest(1000)], ['a4'])
+        self.assertEqual([a.ID for a in tier.nearest(2000)], ['a4'])
+        self.assertEqual([a.ID for a in tier.nearest(3000, k=2)], ['a5', 'a4'])
+        self.assertEqual([a.ID for a in tier.nearest(9000, k=5)], ['a6', 'a5', 'a4'])
+
+    def test_doc_query(self):
+        eaf = read_eaf()
+        results = eaf.query(900, 1600)
+        self.assertEqual([(t.ID, a.ID) for t, a in results],
+                         [('Person1 (Utterance)', 'a1'), ('Person1 (Emotion)', 'a12'),
+                          ('Person2 (Utterance)', 'a4'), ('Person1 (Utterance)', 'a2')])
+        results = eaf.query(900, 1600, participants='Person2')
+        self.assertEqual([a.ID for t, a in results], ['a4'])
+        results = eaf.query(900, 1600, tiers=['Person1 (Utterance)'])
+        self.assertEqual([a.ID for t, a in results], ['a1', 'a2'])
+
+
+class TestReferences(unittest.TestCase):
+
+    def test_lookup(self):
+        eaf = read_eaf()
+        self.assertEqual(eaf.get_linguistic_type('Words').ID, 'Words')
+        self.assertIsNone(eaf.get_linguistic_type('Gloss'))
+        self.assertEqual(eaf.get_vocab('Emotions')['cveid2'].value, 'sad')
+        self.assertIsNone(eaf.get_vocab('Colours'))
+        self.assertEqual(eaf['Person1 (Utterance)'].get_child('Person1 (Words)').ID, 'Person1 (Words)')
+        self.assertIsNone(eaf['Person1 (Utterance)'].get_child('Person2 (Utterance)'))
+        self.assertEqual(eaf.get_annotation('a10').value, 'are')
+        self.assertIsNone(eaf.get_annotation('a100'))
+
+    def test_ref_annotations(self):
+        with open(TEST_EAF, encoding='utf-8') as eaf_stream:
+            person1 = elan.parse_eaf_stream(eaf_stream, participants='Person1')
+        for eaf in (read_eaf(), person1):
+            a2 = eaf.get_annotation('a2')
+            # children are ordered by PREVIOUS_ANNOTATION chains
+            self.assertEqual([c.ID for c in a2.children], ['a8', 'a9', 'a10', 'a11'])
+            self.assertEqual([c.value for c in a2.children if c.previous or c.ID == 'a9'], ['How', 'are', 'you'])
+            gloss = eaf.get_annotation('a11')
+            self.assertIs(gloss.parent, a2)
+            self.assertIsNone(a2.parent)
+            self.assertEqual(eaf.get_annotation('a3').children, ())
+            # ref annotations inherit time spans from their parents
+            self.assertEqual((gloss.from_ts.value, gloss.to_ts.value, gloss.duration), (1500, 3000, 1.5))
+            self.assertEqual(eaf.get_annotation('a7').from_ts.ts, '00:00:00.000')
+        # links are restored when loading from a compact form
+        eaf = elan._doc_from_compact(read_eaf()._to_compact())
+        self.assertIs(eaf.get_annotation('a7').parent, eaf.get_annotation('a1'))
+        ann = elan.ELANRefAnnotation('a1', 'a0', None, 'unresolved')
+        self.assertIsNone(ann.from_ts)
+        self.assertIsNone(ann.duration)
+
+    def test_linked_to_json(self):
+        eaf = read_eaf()
+        # links between annotations are not serialised
+        self.assertEqual(json.loads(eaf.get_annotation('a7').to_json()),
+                         {'_DataObject__extra_data': {}, 'ID': 'a7', 'value': 'Xin chào', 'cve_ref': None, 'ref': 'a1', 'previous': None})
+        self.assertNotIn('parent', eaf.get_annotation('a1').to_dict())
+        self.assertEqual(json.loads(eaf.get_annotation('a2').to_json())['from_ts'], {'ID': 'ts4', 'value': 1500})
+
+    def test_csv_rows(self):
+        rows = read_eaf().to_csv_rows()
+        self.assertIn(('Person1 (Words)', 'Person1', '1.500', '3.000', '1.500', 'you'), rows)
+
+
+class TestSearch(unittest.TestCase):
+
+    def test_index(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ('a.eaf', 'b.eaf'):
+                shutil.copy(TEST_EAF, os.path.join(tmpdir, name))
+            index = elan.EAFIndex(tmpdir)
+            self.assertEqual(index.update(jobs=1), (2, 0))
+            self.assertEqual(index.update(jobs=1), (0, 0))
+            # the index is persistent
+            index = elan.EAFIndex(tmpdir)
+            self.assertEqual(len(index), 2)
+            self.assertEqual(index.update(jobs=1), (0, 0))
+            # only modified files are re-indexed
+            b_path = os.path.join(tmpdir, 'b.eaf')
+            with open(TEST_EAF, encoding='utf-8') as infile, open(b_path, 'w', encoding='utf-8') as outfile:
+                outfile.write(infile.read().replace('BABYNAME', 'Mimi'))
+            self.assertEqual(index.update(jobs=1), (1, 0))
+            self.assertEqual([os.path.basename(h.path) for h in index.search('babyname')], ['a.eaf'])
+            self.assertEqual(len(index.search('mimi')), 1)
+            os.unlink(b_path)
+            self.assertEqual(index.update(jobs=1), (0, 1))
+            self.assertEqual(index.search('mimi'), [])
+            self.assertNotIn('mimi', index.postings)
+
+    def test_search(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            shutil.copy(TEST_EAF, tmpdir)
+            index = elan.index_eaf_dir(tmpdir, index_path=os.path.join(tmpdir, 'index', 'test.idx'), jobs=1)
+            self.assertTrue(os.path.isfile(index.index_path))
+            hits = index.search('BABYNAME')
+            self.assertEqual([(h.tier, h.participant, h.start, h.end, h.duration) for h in hits],
+                             [('Person1 (Utterance)', 'Person1', 5000, 6500, 1500)])
+            self.assertEqual([h.value for h in index.search('are')], ['How are you', 'are'])
+            self.assertEqual([(h.value, h.start) for h in index.search('are', tiers='Person1 (Words)')], [('are', 1500)])
+            self.assertEqual([h.value for h in index.search('you how')], ['How are you'])
+            self.assertEqual(index.search('you how xyz'), [])
+            self.assertEqual([h.value for h in index.search_phrase('how are')], ['How are you'])
+            self.assertEqual(index.search_phrase('are how'), [])
+            self.assertEqual([h.value for h in index.search_regex(r'^H', participants='Person1')], ['Hello', 'How are you', 'How'])
+            self.assertEqual([h.value for h in index.search_regex(r'^h', participants=['Person2'], flags=re.IGNORECASE)], ['Hi'])
+
+
+UTTERANCE_TIERS = ['Person1 (Utterance)', 'Person2 (Utterance)']
+
+
+class TestOverlaps(unittest.TestCase):
+
+    def test_overlaps(self):
+        report = read_eaf().overlaps(tiers=UTTERANCE_TIERS)
+        self.assertEqual([(o.a.ID, o.b.ID, o.start, o.end, o.duration) for o in report.overlaps],
+                         [('a1', 'a4', 800, 1000, 200), ('a4', 'a2', 1500, 1600, 100), ('a5', 'a3', 5000, 5200, 200)])
+        self.assertEqual([(g.a.ID, g.b.ID, g.duration) for g in report.gaps], [('a2', 'a5', 200), ('a3', 'a6', 500)])
+        self.assertEqual(report.pauses, [])
+        self.assertEqual([(t.a.ID, t.b.ID, t.offset) for t in report.transitions],
+                         [('a1', 'a4', -200), ('a4', 'a2', -100), ('a2', 'a5', 200), ('a5', 'a3', -200), ('a3', 'a6', 500)])
+        report = read_eaf().overlaps(tiers=UTTERANCE_TIERS, min_overlap=150)
+        self.assertEqual([(o.a.ID, o.b.ID) for o in report.overlaps], [('a1', 'a4'), ('a5', 'a3')])
+
+    def test_pauses(self):
+        report = read_eaf().overlaps(participants='Person1')
+        # emotion and utterance tiers belong to the same participant
+        self.assertEqual(report.overlaps, [])
+        self.assertEqual(report.transitions, [])
+        self.assertEqual([(p.start, p.end) for p in report.pauses], [(3000, 5000)])
+        report = read_eaf().overlaps(tiers='Person1 (Utterance)')
+        self.assertEqual([(p.start, p.end) for p in report.pauses], [(1000, 1500), (3000, 5000)])
+
+    def test_backchannel(self):
+        tier_a = elan.ELANTier('Utterance', 'A', 'A')
+        tier_b = elan.ELANTier('Utterance', 'B', 'B')
+        for tier, ID, start, end in [(tier_a, 'a1', 0, 5000), (tier_b, 'b1', 1000, 1500), (tier_b, 'b2', 4800, 7000)]:
+            tier.annotations.append(elan.ELANTimeAnnotation(ID, elan.TimeSlot(ID + 'a', start), elan.TimeSlot(ID + 'b', end), ID))
+        eaf = elan.ELANDoc()
+        eaf._add_tier(tier_a)
+        eaf._add_tier(tier_b)
+        report = eaf.overlaps()
+        self.assertEqual([(o.a.ID, o.b.ID) for o in report.overlaps], [('a1', 'b1'), ('a1', 'b2')])
+        self.assertEqual([(t.a.ID, t.b.ID, t.offset) for t in report.transitions], [('a1', 'b2', -200)])
+        self.assertEqual(report.gaps, [])
+
+    def test_overlaps_brute_force(self):
+        eaf = read_eaf()
+        rand = random.Random(1)
+        for _ in range(200):
+            tiers = []
+            for speaker in range(rand.randint(1, 4)):
+                spans = []
+                for _ in range(rand.randint(0, 12)):
+                    start = rand.randint(0, 100)
+                    spans.append((start, start + rand.randint(0, 30)))
+                # two tiers share some speakers
+                tier = elan.ELANTier('Utterance', 'P{}'.format(speaker % 3), 'T{}'.format(speaker))
+                tier.annotations.extend(make_annotations(spans))
+                tiers.append(tier)
+            min_overlap = rand.choice([0, 5, 15])
+            items = sorted(((a.from_ts.value, a.to_ts.value, idx, t.participant, a) for t in tiers for idx, a in enumerate(t.annotations)),
+                           key=lambda x: (x[0], x[1]))
+            expected = [(id(a), id(b), b_start, min(a_end, b_end))
+                        for i, (_, a_end, _, a_speaker, a) in enumerate(items)
+                        for b_start, b_end, _, b_speaker, b in items[i + 1:]
+                        if a_speaker != b_speaker and a_end > b_start and min(a_end, b_end) - b_start >= min_overlap]
+            report = eaf.overlaps(tiers=tiers, min_overlap=min_overlap)
+            self.assertEqual(sorted((id(o.a), id(o.b), o.start, o.end) for o in report.overlaps), sorted(expected))
+
+    def test_corpus_overlaps(self):
+        totals, results = elan.corpus_overlaps([TEST_EAF, TEST_EAF], tiers=UTTERANCE_TIERS, jobs=1)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(totals['overlaps'], 6)
+        self.assertEqual(totals['overlap_ms'], 1000)
+        self.assertEqual(totals['gap_ms'], 1400)
+        self.assertEqual(totals['transitions'], 10)
+        self.assertEqual(totals['overlapped_transitions'], 6)
+
+
+try:
+    import numpy  # noqa: F401
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+@unittest.skipIf(not NUMPY_AVAILABLE, "numpy is not available")
+class TestColumns(unittest.TestCase):
+
+    def test_to_arrays(self):
+        columns = read_eaf()['Person1 (Utterance)'].to_arrays()
+        self.assertEqual(columns.start.tolist(), [0, 1500, 5000])
+        self.assertEqual(columns.duration.tolist(), [1000, 1500, 1500])
+        self.assertEqual(columns.values, ('Hello', 'How are you', 'Fine thanks BABYNAME'))
+        # reference annotations take the times of their parents
+        columns = read_eaf()['Person1 (Words)'].to_arrays()
+        self.assertEqual(columns.start.tolist(), [1500, 1500, 1500])
+        self.assertEqual(columns.labels('value').tolist(), ['you', 'How', 'are'])
+
+    def test_statistics(self):
+        columns = read_eaf().to_columns(tiers=UTTERANCE_TIERS)
+        self.assertEqual(columns.size, 6)
+        self.assertEqual(columns.talk_time(), {'Person1': 4000, 'Person2': 3800})
+        self.assertEqual(columns.talk_time(by=None), 7800)
+        self.assertEqual(columns.mean_duration(), 1300.0)
+        self.assertEqual(columns.gaps().tolist(), [200, 500])
+        self.assertEqual(columns.gaps(by='participant').tolist(), [500, 2000, 1600, 1800])
+        counts, edges = columns.histogram(bins=3, range=(0, 1800))
+        self.assertEqual(counts.tolist(), [0, 3, 2])
+        counts, edges = columns.histogram(bins=3, range=(0, 1800), by='participant')
+        self.assertEqual(counts['Person1'].tolist(), [0, 1, 2])
+        self.assertRaises(ValueError, lambda: columns.talk_time(by='value'))
+
+    def test_corpus_columns(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            other_eaf = os.path.join(tmpdir, 'other.eaf')
+            shutil.copy(TEST_EAF, other_eaf)
+            columns, results = elan.corpus_columns([TEST_EAF, other_eaf], linguistic_types='Utterance', jobs=1)
+        self.assertTrue(all(r.ok for r in results))
+        self.assertEqual(columns.docs, (TEST_EAF, other_eaf))
+        self.assertEqual(columns.tier_ids, tuple(UTTERANCE_TIERS))
+        self.assertEqual(columns.talk_time(), {'Person1': 8000, 'Person2': 7600})
+        # silences do not span documents
+        self.assertEqual(columns.gaps().tolist(), [200, 500, 200, 500])
+
+
+@unittest.skipIf(not NUMPY_AVAILABLE, "numpy is not available")
+class TestFrames(unittest.TestCase):
+
+    def test_dense(self):
+        frames = read_eaf().to_frames(100, tiers=UTTERANCE_TIERS + ['Person1 (Emotion)'])
+        self.assertEqual(frames.labels.shape, (80, 3))
+        self.assertEqual(frames.tier_ids, tuple(UTTERANCE_TIERS) + ('Person1 (Emotion)',))
+        # tiers without vocabularies are labelled by their values
+        self.assertEqual(frames.classes[0], ('Hello', 'How are you', 'Fine thanks BABYNAME'))
+        self.assertEqual(frames.labels[:, 0].tolist()[:16], [0] * 10 + [-1] * 5 + [1])
+        # CVE-backed tiers are labelled by their vocabulary entries
+        self.assertEqual(frames.classes[2], ('happy', 'neutral', 'sad'))
+        self.assertEqual(frames.labels[:, 2].tolist()[28:52], [0] * 2 + [-1] * 20 + [1] * 2)
+
+    def test_rle(self):
+        eaf = read_eaf()
+        frames = eaf.to_frames(100, tiers=UTTERANCE_TIERS)
+        runs = eaf.to_frames(100, tiers=UTTERANCE_TIERS, rle=True, chunk_ms=700)
+        self.assertEqual(runs.frames, 80)
+        self.assertEqual(runs.runs[1].tolist(), [[8, 8, 0], [32, 20, 1], [70, 10, 2]])
+        self.assertTrue((runs.to_dense().labels == frames.labels).all())
+        self.assertEqual([len(c.labels) for c in eaf.iter_frames(100, tiers=UTTERANCE_TIERS, chunk_ms=3000)], [30, 30, 20])
+
+    def test_vocab(self):
+        eaf = read_eaf()
+        runs = eaf.to_frames(100, tiers='Person1 (Utterance)', vocab=['Fine thanks BABYNAME', 'Hello'], rle=True)
+        self.assertEqual(runs.classes, (('Fine thanks BABYNAME', 'Hello'),))
+        self.assertEqual(runs.runs[0].tolist(), [[0, 10, 1], [50, 15, 0]])
+        frames = eaf.to_frames(100, tiers='Person1 (Emotion)', vocab='Emotions')
+        self.assertEqual(frames.classes, (('happy', 'neutral', 'sad'),))
+        self.assertRaises(ValueError, lambda: eaf.to_frames(100, vocab='Colours'))
+
+
+class TestWriter(unittest.TestCase):
+
+    def test_round_trip(self):
+        eaf = read_eaf()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            eaf_path = os.path.join(tmpdir, 'test.eaf')
+            eaf.write_eaf(eaf_path)
+            written = elan.open_eaf(eaf_path)
+        self.assertEqual(written.to_csv_rows(), eaf.to_csv_rows())
+        self.assertEqual([[(a.ID, a.ref, a.previous, a.cve_ref) for a in t] for t in written], [[(a.ID, a.ref, a.previous, a.cve_ref) for a in t] for t in eaf])
+        self.assertEqual(written.properties, eaf.properties)
+        self.assertEqual(written.media_url, eaf.media_url)
+        self.assertEqual([lt._to_xml_attrib() for lt in written.linguistic_types], [lt._to_xml_attrib() for lt in eaf.linguistic_types])
+        self.assertEqual([(c.stereotype, c.description) for c in written.constraints], [(c.stereotype, c.description) for c in eaf.constraints])
+        self.assertEqual([repr(e) for e in written.get_vocab('Emotions')], ['[happy | Positive emotion]', '[neutral]', '[sad | Negative emotion]'])
+        self.assertEqual([c.value for c in written.get_annotation('a2').children], ['Bạn khoẻ không', 'How', 'are', 'you'])
+        # time slots with the same value are merged
+        self.assertEqual(len(written.time_order), 12)
+
+    def test_round_trip_unaligned(self):
+        with open(TEST_EAF, encoding='utf-8') as infile:
+            content = infile.read()
+        # a1 and a2 share an unaligned time slot
+        content = content.replace('<TIME_SLOT TIME_SLOT_ID="ts1" TIME_VALUE="0"/>', '<TIME_SLOT TIME_SLOT_ID="ts1" TIME_VALUE="0"/><TIME_SLOT TIME_SLOT_ID="tsU"/>')
+        content = content.replace('TIME_SLOT_REF1="ts1" TIME_SLOT_REF2="ts3"', 'TIME_SLOT_REF1="ts1" TIME_SLOT_REF2="tsU"')
+        content = content.replace('TIME_SLOT_REF1="ts4" TIME_SLOT_REF2="ts6"', 'TIME_SLOT_REF1="tsU" TIME_SLOT_REF2="ts6"')
+        eaf = elan.parse_eaf_stream(io.StringIO(content))
+        self.assertIs(eaf.get_annotation('a1').to_ts, eaf.get_annotation('a2').from_ts)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            eaf_path = os.path.join(tmpdir, 'unaligned.eaf')
+            eaf.write_eaf(eaf_path)
+            written = elan.open_eaf(eaf_path)
+        self.assertIs(written.get_annotation('a1').to_ts, written.get_annotation('a2').from_ts)
+        self.assertIsNone(written.get_annotation('a1').to_ts.value)
+        self.assertEqual(len(written.time_order), 11)  # ts3, ts4 are not used anymore, equal values are merged
+
+    def test_writer(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            eaf_path = os.path.join(tmpdir, 'asr.eaf')
+            with elan.EAFWriter(eaf_path, author='ASR') as writer:
+                writer.add_linguistic_type('Utterance')
+                writer.add_linguistic_type('Translation', time_alignable=False, constraints='Symbolic_Association')
+                writer.add_constraint('Symbolic_Association', '1-1 association with a parent annotation')
+                writer.add_tier('A', 'Utterance', participant='A')
+                writer.add_tier('B', 'Utterance', participant='B')
+                writer.add_tier('A (Translation)', 'Translation', participant='A', parent_ref='A')
+                # annotations of different tiers can be interleaved
+                a1 = writer.add_annotation('A', 0, 1500, 'fish & <chips>')
+                writer.add_annotation('B', '00:00:01.000', 2000, 'yes "please"')
+                writer.add_ref_annotation('A (Translation)', a1, 'cá và khoai tây')
+                writer.add_annotation('A', 1500, None, 'unaligned end')
+                self.assertRaises(ValueError, lambda: writer.add_annotation('C', 0, 1, 'no tier'))
+            written = elan.open_eaf(eaf_path)
+        self.assertEqual(written.author, 'ASR')
+        self.assertEqual(written.properties['lastUsedAnnotationId'], '4')
+        self.assertEqual([(a.ID, a.value, a.from_ts.value, a.to_ts.value) for a in written['A']],
+                         [('a1', 'fish & <chips>', 0, 1500), ('a4', 'unaligned end', 1500, None)])
+        self.assertEqual(written['B'][0].value, 'yes "please"')
+        self.assertEqual(written['A (Translation)'][0].parent.ID, 'a1')
+        self.assertEqual(len(written.time_order), 5)
+
+    def test_writer_mixed_ids(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            eaf_path = os.path.join(tmpdir, 'mixed.eaf')
+            with elan.EAFWriter(eaf_path) as writer:
+                writer.add_linguistic_type('Utterance')
+                writer.add_tier('A', 'Utterance')
+                self.assertEqual(writer.add_annotation('A', 0, 1000, 'one', ID='a2'), 'a2')
+                self.assertEqual(writer.add_annotation('A', 1000, 2000, 'two'), 'a3')  # a2 is taken
+                self.assertEqual(writer.add_annotation('A', 2000, 3000, 'three', ID='a5'), 'a5')
+                self.assertEqual(writer.add_annotation('A', 3000, 4000, 'four'), 'a6')
+                self.assertRaises(ValueError, lambda: writer.add_annotation('A', 4000, 5000, 'five', ID='a3'))
+            written = elan.open_eaf(eaf_path)
+            self.assertEqual(elan.validate_eaf(eaf_path), [])
+        self.assertEqual([a.ID for a in written['A']], ['a2', 'a3', 'a5', 'a6'])
+
+
+class TestWindow(unittest.TestCase):
+
+    def test_window(self):
+        eaf = read_eaf()
+        clip = eaf.window(900, '00:00:03.100')
+        self.assertEqual(clip.duration, 2200)
+        tier = clip['Person1 (Utterance)']
+        # annotations that reach into the window are included
+        self.assertEqual([a.ID for a in tier], ['a1', 'a2'])
+        self.assertEqual(len(tier), 2)
+        self.assertEqual(tier[-1].ID, 'a2')
+        self.assertEqual([a.ID for a in tier[0:1]], ['a1'])
+        self.assertEqual([(a.ID, start, end) for a, start, end in tier.spans()], [('a1', 0, 100), ('a2', 600, 2100)])
+        self.assertEqual([(a.ID, start, end) for a, start, end in tier.spans(clip=False)], [('a1', -900, 100), ('a2', 600, 2100)])
+        # ref annotations are selected through their parents
+        self.assertEqual([a.value for a in clip['Person1 (Words)']], ['How', 'are', 'you'])
+        self.assertEqual([a.ID for a in clip['Person2 (Utterance)']], ['a4'])
+        self.assertEqual([a.ID for a in eaf.window(5200, 9000)['Person2 (Utterance)']], ['a6'])
+        self.assertEqual(len(eaf.window(9000, 10000)['Person1 (Words)']), 0)
+        self.assertRaises(ValueError, lambda: eaf.window(1000, 1000))
+        # the document is not modified
+        self.assertEqual(eaf['Person1 (Utterance)'][0].from_ts.value, 0)
+
+    def test_window_brute_force(self):
+        eaf = read_eaf()
+        rand = random.Random(1)
+        for _ in range(300):
+            spans = []
+            for _ in range(rand.randint(0, 30)):
+                start = rand.randint(0, 100)
+                spans.append((start, start + rand.randint(0, 40)))
+            tier = elan.ELANTier('Utterance', 'P', 'T')
+            tier.annotations.extend(make_annotations(spans))
+            from_ms = rand.randint(-10, 150)
+            to_ms = from_ms + rand.randint(1, 30)
+            view = elan.ELANTierWindow(eaf.window(from_ms, to_ms), tier)
+            anns = tier.span_index.annotations
+            expected = [a for a in anns if a.from_ts.value < from_ms < a.to_ts.value]
+            expected += [a for a in anns if from_ms <= a.from_ts.value < to_ms]
+            self.assertEqual(list(view), expected)
+            self.assertEqual(len(view), len(expected))
+
+    def test_export(self):
+        clip = read_eaf().window(900, 3100)
+        rows = clip.to_csv_rows()
+        self.assertEqual(rows[0], ('Person1 (Utterance)', 'Person1', '0.000', '0.100', '0.100', 'Hello'))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            eaf_path = os.path.join(tmpdir, 'clip.eaf')
+            clip.write_eaf(eaf_path)
+            written = elan.open_eaf(eaf_path)
+        self.assertEqual(written.to_csv_rows(), rows)
+        self.assertEqual([t.ID for t in written], [t.ID for t in clip])
+
+
+class TestAlign(unittest.TestCase):
+
+    def test_align(self):
+        eaf = read_eaf()
+
+        def ids(pairs):
+            return [(ann.ID, [m.ID for m in matches]) for ann, matches in pairs]
+        self.assertEqual(ids(eaf.align('Person1 (Utterance)', 'Person2 (Utterance)')),
+                         [('a1', ['a4']), ('a2', ['a4']), ('a3', ['a5'])])
+        self.assertEqual(ids(eaf.align('Person1 (Utterance)', 'Person2 (Utterance)', min_overlap=150)),
+                         [('a1', ['a4']), ('a2', []), ('a3', ['a5'])])
+        self.assertEqual(ids(eaf.align('Person1 (Emotion)', eaf['Person1 (Utterance)'], how='contains')),
+                         [('a12', ['a1', 'a2']), ('a13', ['a3'])])
+        # a2 overlaps a4 by 100ms, a5 is the closest annotation to Bye (a6)
+        self.assertEqual(ids(eaf.align('Person1 (Utterance)', 'Person2 (Utterance)', how='nearest')),
+                         [('a1', ['a4']), ('a2', ['a4']), ('a3', ['a5'])])
+        self.assertEqual(ids(eaf.align('Person2 (Utterance)', 'Person1 (Utterance)', how='nearest')),
+                         [('a4', ['a1']), ('a5', ['a3']), ('a6', ['a3'])])
+        self.assertRaises(ValueError, lambda: list(eaf.align('Person1 (Utterance)', 'Person2 (Utterance)', how='near')))
+
+    def test_align_nearest_brute_force(self):
+        def make_tier(tier_id, spans):
+            tier = elan.ELANTier('Utterance', 'P', tier_id)
+            tier.annotations.extend(make_annotations(spans))
+            return tier
+
+        def nearest(anns, start, end):
+            overlaps = [(min(end, a.to_ts.value) - max(start, a.from_ts.value), -idx) for idx, a in enumerate(anns)]
+            if overlaps and max(overlaps)[0] > 0:
+                return [anns[-max(overlaps)[1]]]
+            distances = [(start - a.to_ts.value if a.to_ts.value <= start else a.from_ts.value - end, idx) for idx, a in enumerate(anns)]
+            return [anns[min(distances)[1]]] if distances else []
+
+        eaf = read_eaf()
+        # (3, 17) ends right where the anchor starts, although (7, 16) starts later
+        anchors, tier = make_tier('A', [(17, 22)]), make_tier('B', [(3, 17), (7, 16)])
+        self.assertEqual([(m.from_ts.value, m.to_ts.value) for _, matches in eaf.align(anchors, tier, how='nearest') for m in matches], [(3, 17)])
+        rand = random.Random(1)
+        for _ in range(300):
+            spans = []
+            for _ in range(rand.randint(0, 15)):
+                start = rand.randint(0, 100)
+                spans.append((start, start + rand.randint(1, 30)))
+            tier = make_tier('B', spans)
+            anchors = make_tier('A', [(start, start + rand.randint(1, 20)) for start in (rand.randint(0, 120) for _ in range(10))])
+            for ann, matches in eaf.align(anchors, tier, how='nearest'):
+                self.assertEqual(matches, nearest(tier.span_index.annotations, ann.from_ts.value, ann.to_ts.value))
+
+    def test_align_many(self):
+        eaf = read_eaf()
+        rows = [(ann.value, [[m.value for m in matches] for matches in row])
+                for ann, row in eaf.align_many('Person1 (Utterance)', ['Person1 (Translation)', 'Person1 (Words)', 'Person1 (Emotion)'])]
+        self.assertEqual(rows, [('Hello', [['Xin chào'], [], ['happy']]),
+                                ('How are you', [['Bạn khoẻ không'], ['How', 'are', 'you'], ['happy']]),
+                                ('Fine thanks BABYNAME', [[], [], ['neutral']])])
+
+
+class TestValidation(unittest.TestCase):
+
+    def test_valid(self):
+        self.assertEqual(elan.validate_eaf(TEST_EAF), [])
+
+    def test_problems(self):
+        with open(TEST_EAF, encoding='utf-8') as infile:
+            content = infile.read()
+        for old, new in [('TIME_SLOT_REF1="ts8" TIME_SLOT_REF2="ts10"', 'TIME_SLOT_REF1="ts10" TIME_SLOT_REF2="ts8"'),
+                         ('TIME_SLOT_REF2="ts12"', 'TIME_SLOT_REF2="ts99"'),
+                         ('PARENT_REF="Person1 (Utterance)" PARTICIPANT="Person1" TIER_ID="Person1 (Words)"',
+                          'PARENT_REF="Person9" PARTICIPANT="Person1" TIER_ID="Person1 (Words)"'),
+                         ('TIER_ID="Person2 (Utterance)"', 'TIER_ID="Person1 (Utterance)"'),
+                         ('CVE_REF="cveid1"', 'CVE_REF="cveid9"'),
+                         ('ANNOTATION_REF="a1"', 'ANNOTATION_REF="a100"')]:
+            content = content.replace(old, new)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            bad_eaf = os.path.join(tmpdir, 'bad.eaf')
+            broken_eaf = os.path.join(tmpdir, 'broken.eaf')
+            with open(bad_eaf, 'w', encoding='utf-8') as outfile:
+                outfile.write(content)
+            with open(broken_eaf, 'w', encoding='utf-8') as outfile:
+                outfile.write(content[:3000])
+            results = elan.validate([TEST_EAF, bad_eaf, broken_eaf], jobs=1)
+        self.assertEqual(results[0].value, [])
+        self.assertEqual([(p.line, p.code) for p in results[1].value],
+                         [(36, 'invalid_span'), (41, 'duplicate_tier'), (53, 'missing_slot'), (60, 'unknown_ref'),
+                          (70, 'dangling_parent'), (94, 'unknown_cve')])
+        # problems found before a parse error are kept
+        self.assertEqual([p.code for p in results[2].value], ['invalid_span', 'duplicate_tier', 'missing_slot', 'xml'])
+
+
+# -------------------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    unittest.main()
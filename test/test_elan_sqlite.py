@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+'''
+Test ELAN SQLite
+Latest version can be found at https://github.com/letuananh/texttaglib
+
+References:
+    Python unittest documentation:
+        https://docs.python.org/3/library/unittest.html
+
+@author: Le Tuan Anh <tuananh.ke@gmail.com>
+@license: MIT
+'''
+
+# Copyright (c) 2020, Le Tuan Anh <tuananh.ke@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+
+########################################################################
+
+import os
+import shutil
+import tempfile
+import unittest
+import logging
+
+from texttaglib import elan
+from texttaglib.sqlite import ELANSQLite
+
+
+# -------------------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------------------
+
+TEST_DIR = os.path.dirname(os.path.realpath(__file__))
+TEST_EAF = os.path.join(TEST_DIR, 'data', 'test.eaf')
+
+
+def getLogger():
+    return logging.getLogger(__name__)
+
+
+# -------------------------------------------------------------------------------
+# Tests
+# -------------------------------------------------------------------------------
+
+class TestELANSQLite(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.eaf_paths = []
+        for name in ('a.eaf', 'b.eaf'):
+            self.eaf_paths.append(os.path.join(self.tmpdir, name))
+            shutil.copy(TEST_EAF, self.eaf_paths[-1])
+        self.db = ELANSQLite(os.path.join(self.tmpdir, 'elan.db'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_ingest(self):
+        results = self.db.ingest(self.eaf_paths, jobs=1)
+        self.assertTrue(all(r.ok for r in results))
+        with self.db.ctx() as ctx:
+            self.assertEqual(ctx.select_scalar('SELECT COUNT(*) FROM eaf_doc'), 2)
+            self.assertEqual(ctx.select_scalar('SELECT COUNT(*) FROM eaf_tier'), 10)
+            self.assertEqual(ctx.select_scalar('SELECT COUNT(*) FROM eaf_timeslot'), 28)
+            self.assertEqual(ctx.select_scalar('SELECT COUNT(*) FROM eaf_annotation'), 26)
+            self.assertEqual(ctx.select_scalar('SELECT COUNT(*) FROM eaf_vocab_entry'), 6)
+            a11 = ctx.eaf_annotation.select_single('annID = ?', ('a11',))
+            self.assertEqual((a11.ref, a11.previous, a11.start, a11.end), ('a2', 'a10', 1500, 3000))
+        # unchanged files are skipped
+        self.assertEqual(self.db.ingest(self.eaf_paths, jobs=1), [])
+        # modified files are replaced
+        with open(self.eaf_paths[1], 'a') as outfile:
+            outfile.write('\n')
+        results = self.db.ingest(self.eaf_paths, jobs=2)
+        self.assertEqual([r.path for r in results], [self.eaf_paths[1]])
+        with self.db.ctx() as ctx:
+            self.assertEqual(ctx.select_scalar('SELECT COUNT(*) FROM eaf_annotation'), 26)
+            if self.db._has_rtree(ctx):
+                self.assertEqual(ctx.select_scalar('SELECT COUNT(*) FROM eaf_annotation_span'), 26)
+
+    def test_query(self):
+        self.db.add_eaf(self.eaf_paths[0])
+        anns = self.db.query(from_ts=900, to_ts=1600, linguistic_types='Utterance')
+        self.assertEqual([(a.ID, a.participant) for a in anns], [('a1', 'Person1'), ('a4', 'Person2'), ('a2', 'Person1')])
+        self.assertIsInstance(anns[0], elan.ELANTimeAnnotation)
+        self.assertEqual((anns[0].from_ts.value, anns[0].to_ts.ts, anns[0].duration), (0, '00:00:01.000', 1.0))
+        self.assertEqual(anns[0].path, self.eaf_paths[0])
+        anns = self.db.query(from_ts='00:00:05.100', participants='Person1', tiers=['Person1 (Utterance)', 'Person1 (Emotion)'])
+        self.assertEqual([(a.tier, a.value) for a in anns], [('Person1 (Utterance)', 'Fine thanks BABYNAME'), ('Person1 (Emotion)', 'neutral')])
+        self.assertEqual((anns[0].start, anns[0].end), (5000, 6500))
+        # ref annotations inherit time spans
+        anns = self.db.query(to_ts=2000, tiers='Person1 (Words)')
+        self.assertEqual([(a.value, a.ref, a.start, a.end) for a in anns], [('you', 'a2', 1500, 3000), ('How', 'a2', 1500, 3000), ('are', 'a2', 1500, 3000)])
+        self.assertIsInstance(anns[0], elan.ELANRefAnnotation)
+        self.assertEqual((anns[0].previous, anns[0].from_ts), ('a10', None))
+        self.assertEqual([a.ID for a in self.db.query(value='%BABYNAME%')], ['a3'])
+        self.assertEqual(self.db.query(paths=['missing.eaf']), [])
+
+
+# -------------------------------------------------------------------------------
+# MAIN
+# -------------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    unittest.main()
@@ -37,6 +37,8 @@ References:
 
 import os
 import io
+import shutil
+import tempfile
 import unittest
 import logging
 from collections import OrderedDict
@@ -99,6 +101,17 @@ class TestTokenizer(unittest.TestCase):
         # last char is delimiter
         self.assertRaises(Exception, lambda: ttlig.tokenize('this is wrong\\'))
 
+    def test_tokenize_many(self):
+        lines = ['It       works   .    ', 'some\\ thing \\\\ a\\  word\\ ', '', '   ']
+        self.assertEqual(ttlig.tokenize_many(lines),
+                         [['It', 'works', '.'], ['some thing', '\\', 'a ', 'word '], [], []])
+        # same tokens as the character-by-character parser
+        parser = TTLTokensParser()
+        self.assertEqual(parser.parse_many(lines), [parser._parse_chars(line) for line in lines])
+        with self.assertLogs('texttaglib.ttlig', level='WARNING') as logs:
+            self.assertEqual(ttlig.tokenize('a\\b c'), ['ab', 'c'])
+        self.assertIn('normal character (b)', logs.output[0])
+
 
 class TestFurigana(unittest.TestCase):
 
@@ -151,6 +164,60 @@ class TestFurigana(unittest.TestCase):
         self.assertEqual(expected, actual)
 
 
+class TestFuriganaCache(unittest.TestCase):
+
+    def setUp(self):
+        ttlig.enable_cache(maxsize=2)
+
+    def tearDown(self):
+        ttlig.disable_cache()
+
+    def test_cache(self):
+        neko = ttlig.parse_furigana('{猫/ねこ}')
+        self.assertIs(ttlig.parse_furigana('{猫/ねこ}'), neko)
+        ttlig.parse_furigana('{好/す}き')
+        ttlig.parse_furigana('です')  # evicts {猫/ねこ}
+        self.assertIsNot(ttlig.parse_furigana('{猫/ねこ}'), neko)
+        self.assertEqual(ttlig.cache_info()['parse_furigana'], ttlig.CacheInfo(hits=1, misses=4, maxsize=2, currsize=2))
+        # from_furi results are cached per aligner
+        token = ttlig.RubyToken.from_furi('言い尽くす', 'いいつくす')
+        self.assertIs(ttlig.RubyToken.from_furi('言い尽くす', 'いいつくす'), token)
+        self.assertIsNot(ttlig.RubyToken.from_furi('言い尽くす', 'いいつくす', aligner='kana'), token)
+        self.assertEqual(token.to_code(), '{言/い}い{尽/つ}くす')
+        self.assertEqual(ttlig.make_ruby_html('ケーキ を {食/た}べた 。'), 'ケーキ を <ruby><rb>食</rb><rt>た</rt></ruby>べた 。')
+        self.assertEqual(ttlig.make_ruby_html('ケーキ を {食/た}べた 。'), 'ケーキ を <ruby><rb>食</rb><rt>た</rt></ruby>べた 。')
+        self.assertEqual(ttlig.cache_info()['make_ruby_html'].hits, 1)
+        ttlig.clear_cache()
+        self.assertEqual(ttlig.cache_info()['make_ruby_html'], ttlig.CacheInfo(hits=0, misses=0, maxsize=2, currsize=0))
+
+    def test_frozen(self):
+        token = ttlig.parse_furigana('{好/す}き')
+        self.assertTrue(token.frozen)
+        self.assertEqual(token.to_html(), '<ruby><rb>好</rb><rt>す</rt></ruby>き')
+        self.assertEqual(token.to_html(), '<ruby><rb>好</rb><rt>す</rt></ruby>き')
+        self.assertRaises(AttributeError, lambda: token.append('よ'))
+        self.assertRaises(AttributeError, lambda: setattr(token, 'surface', '好き'))
+        self.assertRaises(AttributeError, lambda: setattr(token.groups[0], 'furi', 'この'))
+        # results are not frozen when caching is disabled
+        ttlig.disable_cache()
+        token = ttlig.parse_furigana('{好/す}き')
+        self.assertFalse(token.frozen)
+        token.append('よ')
+        self.assertEqual(token.text(), '好きよ')
+        self.assertRaises(ValueError, lambda: ttlig.enable_cache(0))
+
+    def test_frozen_to_dict(self):
+        ttlig.disable_cache()
+        plain = ttlig.parse_furigana('{好/す}き')
+        ttlig.enable_cache()
+        cached = ttlig.parse_furigana('{好/す}き')
+        cached.to_html()  # cache the html
+        self.assertTrue(cached.frozen)
+        self.assertEqual(cached.to_json(), plain.to_json())
+        self.assertEqual(cached.to_dict().keys(), plain.to_dict().keys())
+        self.assertEqual(cached.groups[0].to_dict(), plain.groups[0].to_dict())
+
+
 class TestTTLIG(unittest.TestCase):
 
     def test_iter_stream(self):
@@ -242,6 +309,22 @@ I have two cat-s.
         f = ttlig.RubyToken.from_furi(s[0].surface, s[0].reading_hira())
         self.assertEqual(f.to_code(), '0')
 
+    def test_furi_aligners(self):
+        pairs = [('友達', 'ともだち'), ('0', '0'), ('言い尽くす', 'いいつくす'), ('言いなさい', 'いいなさい'),
+                 ('巡り', 'めぐり'), ('会っ', 'あっ'), ('お父さん', 'おとうさん'), ('落とし物', 'おとしもの'),
+                 ('聞き取り', 'ききとり'), ('行き来', 'いきき'), ('くり返す', 'くりかえす'), ('時', 'じ'), ('猫', '')]
+        for surface, kana in pairs:
+            expected = ttlig.RubyToken.from_furi(surface, kana)
+            actual = ttlig.RubyToken.from_furi(surface, kana, aligner='kana')
+            self.assertEqual(repr(actual.groups), repr(expected.groups))
+        self.assertEqual(ttlig.RubyToken.from_furi('言い尽くす', 'いいつくす', aligner='kana').to_code(), '{言/い}い{尽/つ}くす')
+        # kana runs in the surface may be written in katakana
+        self.assertEqual(ttlig.RubyToken.from_furi('ボール箱', 'ぼーるばこ', aligner='kana').to_code(), 'ボール{箱/ばこ}')
+        # ambiguous anchors fall back to ndiff
+        self.assertEqual(repr(ttlig.RubyToken.from_furi('押し', 'おしし', aligner='kana').groups),
+                         repr(ttlig.RubyToken.from_furi('押し', 'おしし').groups))
+        self.assertRaises(ValueError, lambda: ttlig.RubyToken.from_furi('猫', 'ねこ', aligner='lcs'))
+
     def test_parsing(self):
         igrow = ttlig.text_to_igrow('友達と巡り会った。')
         self.assertEqual(igrow.text, '友達と巡り会った。')
@@ -262,6 +345,84 @@ I have two cat-s.
         self.assertEqual(igrow.text, '0時だ。')
         self.assertEqual(igrow.tokens, '0 {時/じ} だ 。')
 
+    def test_open_indexed(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tig_path = os.path.join(tmpdir, 'manual.tig')
+            shutil.copy(JP_MANUAL, tig_path)
+            with ttlig.open_indexed(tig_path) as ig:
+                self.assertTrue(os.path.isfile(tig_path + ttlig.INDEX_EXT))
+                self.assertEqual(len(ig), 2)
+                self.assertEqual(ig.meta['Author'], 'Le Tuan Anh')
+                self.assertEqual(ig['01a_02'].text, '雨が降る。')
+                self.assertEqual(ig[0].tokens, '{猫/ねこ} が {好/す}き です 。')
+                self.assertEqual([s.ident for s in ig[-1:]], ['01a_02'])
+                self.assertEqual([s.ident for s in ig], [s.ident for s in ttlig.read(tig_path)])
+                self.assertEqual(sorted(s.ident for s in ig.sample(2, seed=1)), ['01a_01', '01a_02'])
+                self.assertIn('01a_01', ig)
+                self.assertIsNone(ig.get('01a_03'))
+                self.assertRaises(KeyError, lambda: ig['01a_03'])
+            # the sidecar index is rebuilt when the file changes
+            with open(tig_path, 'a', encoding='utf-8') as outfile:
+                outfile.write('\nident: 01a_03\ntext: 猫\n')
+            self.assertFalse(ttlig.IGIndex.load(tig_path + ttlig.INDEX_EXT).is_valid(tig_path))
+            with ttlig.open_indexed(tig_path) as ig:
+                self.assertEqual(len(ig), 3)
+                self.assertEqual(ig['01a_03'].text, '猫')
+            self.assertTrue(ttlig.IGIndex.load(tig_path + ttlig.INDEX_EXT).is_valid(tig_path))
+
+    def test_index_blocks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tig_path = os.path.join(tmpdir, 'implicit.tig')
+            with open(tig_path, 'w', encoding='utf-8', newline='') as outfile:
+                outfile.write('# TTLIG\r\nLines: ident text translat\r\n\r\n# comment\r\ns1\r\n猫\r\n# inner comment\r\nCat\r\n\r\n\r\ns2\r\nDog\r\nDog')
+            index = ttlig.build_index(tig_path)
+            self.assertEqual([(b.ident, b.length) for b in index.blocks], [('s1', 31), ('s2', 12)])
+            with ttlig.open_indexed(tig_path) as ig:
+                self.assertEqual([s.to_dict() for s in ig], [s.to_dict() for s in ttlig.read(tig_path)])
+                self.assertEqual(ig['s2'].translat, 'Dog')
+
+    def test_block_splitter(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tig_path = os.path.join(tmpdir, 'implicit.tig')
+            with open(tig_path, 'w', encoding='utf-8', newline='') as outfile:
+                outfile.write('# TTLIG\r\nLines: ident text translat\r\n\r\n# comment\r\ns1\r\n猫\r\n# inner comment\r\nCat\r\n\r\n\r\ns2\r\nDog\r\nDog\r\n\r\n')
+            with ttlig.IGBlockSplitter(tig_path) as splitter:
+                self.assertEqual(splitter.meta['Lines'], 'ident text translat')
+                self.assertEqual(splitter.count(), 2)
+                blocks = list(splitter)
+                self.assertEqual([b.offset for b in blocks], [b.offset for b in ttlig.build_index(tig_path).blocks])
+                self.assertEqual(blocks[0].lines(), ['s1', '猫', 'Cat'])
+                self.assertEqual(blocks[1].text(), 's2\nDog\nDog\n')
+            # blocks are still readable after the splitter is closed
+            self.assertEqual(bytes(blocks[1].data), b's2\r\nDog\r\nDog\r\n')
+            gz_path = os.path.join(tmpdir, 'implicit.tig.gz')
+            self.assertRaises(ValueError, lambda: ttlig.IGBlockSplitter(gz_path))
+
+    def test_map_chunks(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            tig_path = os.path.join(tmpdir, 'manual.tig')
+            shutil.copy(JP_MANUAL, tig_path)
+            expected = ttlig.chunk_to_ttl(list(enumerate(ttlig.read(tig_path))))
+            self.assertEqual(expected[0].splitlines()[1], '2\t雨が降る。\t\t')
+            for jobs in (1, 2):
+                chunks = list(ttlig.map_chunks(tig_path, ttlig.chunk_to_ttl, jobs=jobs, chunk_size=1))
+                self.assertEqual(len(chunks), 2)
+                self.assertEqual(tuple(''.join(c) for c in zip(*chunks)), expected)
+                expex = ''.join(ttlig.map_chunks(tig_path, ttlig.chunk_to_expex, jobs=jobs, chunk_size=1, max_pending=1))
+                self.assertEqual(expex.count('\\ex \\label{01a_0'), 2)
+            self.assertRaises(ValueError, lambda: list(ttlig.map_chunks(tig_path, ttlig.chunk_to_ttl, chunk_size=0)))
+            # the index can be kept in memory only
+            os.remove(tig_path + ttlig.INDEX_EXT)
+            chunks = list(ttlig.map_chunks(tig_path, ttlig.chunk_to_ttl, jobs=2, chunk_size=1, save_index=False))
+            self.assertEqual(tuple(''.join(c) for c in zip(*chunks)), expected)
+            self.assertFalse(os.path.exists(tig_path + ttlig.INDEX_EXT))
+            # compressed files cannot be split and are read sequentially
+            gz_path = os.path.join(tmpdir, 'manual.tig.gz')
+            chio.write_file(gz_path, chio.read_file(JP_MANUAL))
+            chunks = list(ttlig.map_chunks(gz_path, ttlig.chunk_to_ttl, jobs=2, chunk_size=1))
+            self.assertEqual(tuple(''.join(c) for c in zip(*chunks)), expected)
+            self.assertFalse(os.path.exists(gz_path + ttlig.INDEX_EXT))
+
     def test_parsing_aligned_text(self):
         print("Testing TTLIG with multiple spaces")
 
@@ -37,7 +37,7 @@ from .__version__ import __credits__, __license__, __description__, __url__
 from .__version__ import __version_major__, __version_long__, __version__, __status__
 
 from .chirptext import texttaglib as ttl
-from texttaglib.sqlite import TTLSQLite
+from texttaglib.sqlite import TTLSQLite, ELANSQLite
 
 
-__all__ = ['ttl', 'TTLSQLite']
+__all__ = ['ttl', 'TTLSQLite', 'ELANSQLite']
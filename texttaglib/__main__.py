@@ -32,14 +32,18 @@ Latest version can be found at https://github.com/letuananh/texttaglib
 ########################################################################
 
 import os
+import csv
 import logging
+from functools import partial
+from collections import defaultdict as dd
 
 from .chirptext import TextReport, FileHelper
 from .chirptext import chio
 from .chirptext.cli import CLIApp, setup_logging
 
 from texttaglib import ttl, TTLSQLite, ttlig, orgmode
-from texttaglib.elan import parse_eaf_stream
+from texttaglib.sqlite import ELANSQLite
+from texttaglib.elan import iter_annotations, find_eaf_files, process_corpus, validate
 
 # ----------------------------------------------------------------------
 # Configuration
@@ -96,34 +100,38 @@ def make_db(cli, args):
 
 def process_tig(cli, args):
     ''' Convert TTLIG file to TTL format '''
+    if args.cache:
+        ttlig.enable_cache(args.cache)
+    # the index is only written when --index is given, otherwise it is kept in memory
+    chunks = partial(ttlig.map_chunks, args.ttlig, jobs=args.jobs, chunk_size=args.chunk_size, cache=args.cache,
+                     index_path=args.index if args.index else None, save_index=args.index is not None)
     if args.format == FORMAT_TTL:
         sc = 0
         ttl_writer = ttl.TxtWriter.from_path(args.output) if args.output else None
-        with chio.open(args.ttlig) as infile:
-            for sent in ttlig.read_stream_iter(infile):
-                sc += 1
-                if ttl_writer is not None:
-                    ttl_sent = sent.to_ttl()
-                    ttl_writer.write_sent(ttl_sent)
-        if ttl_writer is not None:
+        if ttl_writer is None:
+            with chio.open(args.ttlig) as infile:
+                sc = sum(1 for _ in ttlig.read_stream_iter(infile))
+        else:
+            streams = (ttl_writer.sent_stream, ttl_writer.token_stream, ttl_writer.concept_stream, ttl_writer.link_stream, ttl_writer.tag_stream)
+            for lines in chunks(ttlig.chunk_to_ttl):
+                for stream, content in zip(streams, lines):
+                    stream.write(content)
+                sc += lines[0].count('\n')
+            ttl_writer.close()
             print("Output file: {}".format(args.output))
         print("Processed {} sentence(s).".format(sc))
     elif args.format == FORMAT_EXPEX:
-        sc = 0
         output = TextReport(args.output)
         output.print("\\newcommand{\\lit}[1]{``#1''}     %%% literal meaning")
         output.print()
         output.print()
         output.print()
-        with chio.open(args.ttlig) as infile:
-            for idx, sent in enumerate(ttlig.read_stream_iter(infile)):
-                sc += 1
-                output.print(sent.to_expex(default_ident=idx + 1))
-                output.print()
-                output.print()
-                output.print()
+        for content in chunks(ttlig.chunk_to_expex):
+            output.write(content)
+        output.close()
     else:
         print("Format {} is not supported".format(args.format))
+    getLogger().debug("Furigana cache: {}".format(ttlig.cache_info()))
 
 
 def jp_line_proc(line, iglines):
@@ -173,8 +181,8 @@ def make_text(sent, delimiter=' '):
     frags = []
     if sent.tokens:
         for tk in sent:
-            furi = tk.find('furi', default=None)
-            if furi:
+            furi = tk.get_tag('furi', default=None)
+            if furi.label:
                 frags.append(ttlig.make_ruby_html(furi.label))
             else:
                 frags.append(tk.text)
@@ -191,6 +199,8 @@ def make_html(cli, args):
     except Exception:
         print("lxml is required for this function")
     if _LXML_AVAILABLE:
+        if args.cache:
+            ttlig.enable_cache(args.cache)
         print("Reading document ...")
         ttl_doc = ttl.Document.read_ttl(args.ttl)
         output = TextReport(args.output)
@@ -206,6 +216,7 @@ def make_html(cli, args):
             etree.SubElement(sent_node, 'br')
             etree.SubElement(sent_node, 'br')
         output.write(etree.tostring(doc_node, encoding='unicode', pretty_print=not args.compact))
+        getLogger().debug("Furigana cache: {}".format(ttlig.cache_info()))
 
 
 def sec_str(a_float):
@@ -213,16 +224,87 @@ def sec_str(a_float):
 
 
 def convert_eaf_to_csv(eaf_path, csv_path):
-    with chio.open(eaf_path) as eaf_stream:
-        elan = parse_eaf_stream(eaf_stream)
-        rows = elan.to_csv_rows()
-        chio.write_tsv(csv_path, rows, quoting=chio.QUOTE_MINIMAL)
+    ''' Stream annotations from an EAF file to a TSV file without building an ELANDoc '''
+    with chio.open(eaf_path) as eaf_stream, chio.open(csv_path, mode='wt', newline='') as csv_file:
+        writer = csv.writer(csv_file, dialect='excel-tab', quoting=csv.QUOTE_MINIMAL, lineterminator='\n')
+        for record in iter_annotations(eaf_stream):
+            writer.writerow(record.to_csv_row())
+
+
+def _csv_name(eaf_path):
+    ''' [Internal function] Output file name of an EAF file in batch mode '''
+    return FileHelper.replace_ext(os.path.basename(str(eaf_path)), 'csv')
+
+
+def convert_eaf_to_csv_dir(output_dir, eaf_path):
+    ''' Convert an EAF file to a TSV file with the same name in output_dir '''
+    csv_path = os.path.join(output_dir, _csv_name(eaf_path))
+    try:
+        convert_eaf_to_csv(eaf_path, csv_path)
+    except Exception:
+        # do not leave incomplete output files behind
+        if os.path.exists(csv_path):
+            os.remove(csv_path)
+        raise
+    return csv_path
 
 
 def eaf_to_csv(cli, args):
     ''' Convert ELAN file (*.eaf) to TSV (Tab-separated Values) format '''
-    convert_eaf_to_csv(args.eaf, args.output)
-    print("Output has been written to: {}".format(args.output))
+    if len(args.eaf) == 1 and os.path.isfile(args.eaf[0]):
+        # single file mode
+        convert_eaf_to_csv(args.eaf[0], args.output)
+        print("Output has been written to: {}".format(args.output))
+        return
+    # batch mode (directories and/or glob patterns)
+    if not args.output:
+        cli.parser.error("Output directory is required for batch mode")
+    eaf_files = find_eaf_files(*args.eaf)
+    # all output files are written to one directory, files with the same name would overwrite each other
+    names = dd(list)
+    for eaf_path in eaf_files:
+        names[_csv_name(eaf_path)].append(str(eaf_path))
+    collisions = ["{} <- {}".format(name, ', '.join(paths)) for name, paths in names.items() if len(paths) > 1]
+    if collisions:
+        cli.parser.error("Input files would be written to the same output file(s): {}".format('; '.join(collisions)))
+    if not os.path.exists(args.output):
+        print("Make directory: {}".format(args.output))
+        os.makedirs(args.output)
+    print("Converting {} file(s) using {} job(s) ...".format(len(eaf_files), args.jobs if args.jobs else os.cpu_count()))
+    results = process_corpus(eaf_files, partial(convert_eaf_to_csv_dir, args.output), jobs=args.jobs, loader=None)
+    failed = [r for r in results if not r.ok]
+    for r in failed:
+        print("Failed: {} ({})".format(r.path, r.error))
+    print("Converted {} file(s) to {}".format(len(results) - len(failed), args.output))
+
+
+def eaf_to_db(cli, args):
+    ''' Store ELAN files (*.eaf) in an ELAN SQLite database '''
+    eaf_files = find_eaf_files(*args.eaf, recursive=args.recursive)
+    db = ELANSQLite(args.db)
+    print("Ingesting {} file(s) using {} job(s) ...".format(len(eaf_files), args.jobs if args.jobs else os.cpu_count()))
+    results = db.ingest(eaf_files, jobs=args.jobs, force=args.force)
+    failed = [r for r in results if not r.ok]
+    for r in failed:
+        print("Failed: {} ({})".format(r.path, r.error))
+    print("Stored {} file(s) in {} ({} file(s) were up to date)".format(len(results) - len(failed), args.db, len(eaf_files) - len(results)))
+
+
+def eaf_check(cli, args):
+    ''' Check ELAN files (*.eaf) for problems '''
+    eaf_files = find_eaf_files(*args.eaf, recursive=args.recursive)
+    print("Checking {} file(s) using {} job(s) ...".format(len(eaf_files), args.jobs if args.jobs else os.cpu_count()))
+    results = validate(eaf_files, jobs=args.jobs)
+    invalid = 0
+    for r in results:
+        if not r.ok:
+            print("Failed: {} ({})".format(r.path, r.error))
+            invalid += 1
+        elif r.value:
+            for problem in r.value:
+                print(problem)
+            invalid += 1
+    print("Checked {} file(s), {} file(s) have problems".format(len(results), invalid))
 
 # -------------------------------------------------------------------------------
 # Main
@@ -243,6 +325,11 @@ def main():
     task.add_argument('ttlig', help='TTLIG file')
     task.add_argument('-o', '--output', help='Output TTL file')
     task.add_argument('-f', '--format', help='Output format', choices=[FORMAT_EXPEX, FORMAT_TTL], default=FORMAT_TTL)
+    task.add_argument('--cache', help='Number of parsed furigana tokens to keep in memory (0 to disable caching)', type=int, default=100000)
+    task.add_argument('-j', '--jobs', help='Number of worker processes (the input file is indexed in memory when more than 1, .gz files are always read sequentially)', type=int, default=1)
+    task.add_argument('--chunk-size', help='Number of sentences per chunk', type=int, default=500)
+    task.add_argument('--index', help='Keep the sidecar index of the input file at this path (next to the input file when no path is given)',
+                      nargs='?', const='', default=None)
 
     task = app.add_task('org', func=org_to_ttlig)
     task.add_argument('-f', '--orgfile', help='ORG file')
@@ -254,10 +341,24 @@ def main():
     task.add_argument('-o', '--output', help='path to output HTML file')
     task.add_argument('-c', '--compact', help='Do not use pretty print', action='store_true')
     task.add_argument('-d', '--delimiter', help='Token delimiter', default=' ')
+    task.add_argument('--cache', help='Number of ruby HTML results to keep in memory (0 to disable caching)', type=int, default=100000)
 
     task = app.add_task('eaf2csv', func=eaf_to_csv)
-    task.add_argument('eaf', help='Input EAF file')
-    task.add_argument('-o', '--output', help='path to output CSV file')
+    task.add_argument('eaf', help='Input EAF file(s), directories, or glob patterns', nargs='+')
+    task.add_argument('-o', '--output', help='path to output CSV file (or output directory in batch mode)')
+    task.add_argument('-j', '--jobs', help='Number of worker processes for batch mode (defaults to number of CPUs)', type=int, default=None)
+
+    task = app.add_task('eaf2db', func=eaf_to_db)
+    task.add_argument('eaf', help='Input EAF file(s), directories, or glob patterns', nargs='+')
+    task.add_argument('-d', '--db', help='path to ELAN SQLite database', required=True)
+    task.add_argument('-j', '--jobs', help='Number of worker processes for reading files (defaults to number of CPUs)', type=int, default=None)
+    task.add_argument('-r', '--recursive', help='Look for EAF files in sub directories', action='store_true')
+    task.add_argument('--force', help='Store files even when they have not been modified', action='store_true')
+
+    task = app.add_task('eafcheck', func=eaf_check)
+    task.add_argument('eaf', help='Input EAF file(s), directories, or glob patterns', nargs='+')
+    task.add_argument('-j', '--jobs', help='Number of worker processes (defaults to number of CPUs)', type=int, default=None)
+    task.add_argument('-r', '--recursive', help='Look for EAF files in sub directories', action='store_true')
   
     # run app
     app.run()
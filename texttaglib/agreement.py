@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+
+'''
+Inter-annotator agreement between ELAN tiers
+
+Latest version can be found at https://github.com/letuananh/texttaglib
+
+@author: Le Tuan Anh <tuananh.ke@gmail.com>
+@license: MIT
+'''
+
+# Copyright (c) 2020, Le Tuan Anh <tuananh.ke@gmail.com>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Latest version can be found at https://github.com/letuananh/texttaglib
+
+
+########################################################################
+
+import math
+import time
+import logging
+from collections import OrderedDict, namedtuple
+from collections import defaultdict as dd
+from functools import partial
+from typing import List, Tuple
+
+from . import elan
+
+
+# ----------------------------------------------------------------------
+# Configuration
+# ----------------------------------------------------------------------
+
+def getLogger():
+    return logging.getLogger(__name__)
+
+
+# ----------------------------------------------------------------------
+# Models
+# ----------------------------------------------------------------------
+
+class Span(namedtuple('Span', ['start', 'end', 'label', 'annotation'])):
+    """ A time span (in milliseconds) of an annotation with its label """
+
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class AgreementReport(namedtuple('AgreementReport', ['labels', 'confusion'])):
+    """ Agreement between two tiers, based on the time (in milliseconds) that each pair of labels shares
+
+    labels is a tuple of all known labels and confusion maps (label_a, label_b) pairs to durations.
+    None stands for unlabelled time, so (label, None) is time that only tier A labelled.
+    """
+
+    __slots__ = ()
+
+    def _total(self, accept):
+        return sum(ms for (label_a, label_b), ms in self.confusion.items() if accept(label_a, label_b))
+
+    @property
+    def a_ms(self):
+        ''' Total labelled time of tier A '''
+        return self._total(lambda a, b: a is not None)
+
+    @property
+    def b_ms(self):
+        ''' Total labelled time of tier B '''
+        return self._total(lambda a, b: b is not None)
+
+    @property
+    def overlap_ms(self):
+        ''' Time that both tiers labelled '''
+        return self._total(lambda a, b: a is not None and b is not None)
+
+    @property
+    def agree_ms(self):
+        ''' Time that both tiers labelled with the same label '''
+        return self._total(lambda a, b: a is not None and a == b)
+
+    def precision(self, match_labels=True):
+        ''' Proportion of the labelled time of tier B that agrees with tier A (tier A is the reference) '''
+        b_ms = self.b_ms
+        return (self.agree_ms if match_labels else self.overlap_ms) / b_ms if b_ms else 0.0
+
+    def recall(self, match_labels=True):
+        ''' Proportion of the labelled time of tier A that is found in tier B '''
+        a_ms = self.a_ms
+        return (self.agree_ms if match_labels else self.overlap_ms) / a_ms if a_ms else 0.0
+
+    def f1(self, match_labels=True):
+        p, r = self.precision(match_labels), self.recall(match_labels)
+        return 2 * p * r / (p + r) if p + r else 0.0
+
+    def kappa(self, include_blank=True):
+        ''' Cohen's kappa over labelled time
+
+        :param include_blank: Treat unlabelled time as a category (i.e. time that only one tier labelled
+                              counts as disagreement). Otherwise only time that both tiers labelled is used.
+        '''
+        cells = {k: v for k, v in self.confusion.items() if include_blank or (k[0] is not None and k[1] is not None)}
+        total = sum(cells.values())
+        if not total:
+            return 0.0
+        rows, cols = dd(int), dd(int)
+        for (label_a, label_b), ms in cells.items():
+            rows[label_a] += ms
+            cols[label_b] += ms
+        observed = sum(ms for (label_a, label_b), ms in cells.items() if label_a == label_b) / total
+        expected = sum(rows[label] * cols[label] for label in rows) / (total * total)
+        return (observed - expected) / (1 - expected) if expected < 1 else 1.0
+
+    def matrix(self, include_blank=True):
+        ''' Confusion matrix as a list of rows (labels of tier A) and columns (labels of tier B)
+
+        :return: A tuple of (labels, rows), unlabelled time (None) comes last when include_blank is True
+        '''
+        labels = list(self.labels) + ([None] if include_blank else [])
+        return tuple(labels), [[self.confusion.get((a, b), 0) for b in labels] for a in labels]
+
+    def merge(self, other) -> 'AgreementReport':
+        ''' Combine two reports (e.g. of different files) '''
+        labels = OrderedDict.fromkeys(self.labels)
+        labels.update(OrderedDict.fromkeys(other.labels))
+        confusion = dd(int, self.confusion)
+        for key, ms in other.confusion.items():
+            confusion[key] += ms
+        return AgreementReport(tuple(labels), dict(confusion))
+
+    def summary(self):
+        ''' Summarise this report as a dict '''
+        return {'a_ms': self.a_ms, 'b_ms': self.b_ms, 'overlap_ms': self.overlap_ms, 'agree_ms': self.agree_ms,
+                'precision': self.precision(), 'recall': self.recall(), 'f1': self.f1(), 'kappa': self.kappa()}
+
+
+class FileAgreement(namedtuple('FileAgreement', ['report', 'load_time', 'compare_time'])):
+    """ Agreement of a file in a corpus with its processing times (in seconds) """
+
+    __slots__ = ()
+
+
+# ----------------------------------------------------------------------
+# Functions
+# ----------------------------------------------------------------------
+
+def tier_spans(tier) -> Tuple[List[Span], Tuple]:
+    ''' Collect the time spans of a tier sorted by start time
+
+    Annotations of tiers with a controlled vocabulary are labelled by the values of their CV entries
+    (found via CVE_REF), other annotations are labelled by their values.
+
+    :return: A tuple of (spans, labels) where labels contains all CV entry values (in vocabulary order)
+             followed by other labels in order of appearance
+    '''
+    vocab = tier.linguistic_type.vocab if tier.linguistic_type is not None else None
+    entries = {e.ID: e.value for e in vocab.entries} if vocab is not None else {}
+    labels = OrderedDict.fromkeys(entries.values())
+    spans = []
+    for ann in tier.span_index.annotations:
+        label = entries.get(ann.cve_ref, ann.value) if ann.cve_ref else ann.value
+        labels[label] = None
+        spans.append(Span(ann.from_ts.value, ann.to_ts.value, label, ann))
+    return spans, tuple(labels)
+
+
+def segments(spans_a, spans_b):
+    ''' Split the time covered by two start-sorted span lists into segments with constant labels
+
+    Both lists are walked once with a pointer each (a merge-join) and the spans of each list that contain the current
+    time point are kept in an active list, the next segment ends at the nearest start or end of these spans.
+    When spans within a list overlap each other, the span that started last (e.g. a nested span) gives the label
+    of that list. The cost is linear when spans within each list do not overlap (as on most annotation tiers),
+    plus the number of spans that are active at the same time for each segment otherwise.
+
+    :return: A generator of (start, end, label_a, label_b) tuples, labels are None for unlabelled time
+    '''
+    i = j = 0
+    len_a, len_b = len(spans_a), len(spans_b)
+    if not len_a and not len_b:
+        return
+    active_a, active_b = [], []  # spans that contain the current time point, in start order
+    end_a = end_b = math.inf  # the earliest end of the active spans
+    time = min(s[0].start for s in (spans_a, spans_b) if s)
+    while True:
+        while i < len_a and spans_a[i].start <= time:
+            active_a.append(spans_a[i])
+            end_a = min(end_a, spans_a[i].end)
+            i += 1
+        while j < len_b and spans_b[j].start <= time:
+            active_b.append(spans_b[j])
+            end_b = min(end_b, spans_b[j].end)
+            j += 1
+        # drop spans that ended before the current time point
+        if end_a <= time:
+            active_a = [s for s in active_a if s.end > time]
+            end_a = min((s.end for s in active_a), default=math.inf)
+        if end_b <= time:
+            active_b = [s for s in active_b if s.end > time]
+            end_b = min((s.end for s in active_b), default=math.inf)
+        end = min(end_a, end_b, spans_a[i].start if i < len_a else math.inf, spans_b[j].start if j < len_b else math.inf)
+        if end == math.inf:
+            break
+        label_a = active_a[-1].label if active_a else None
+        label_b = active_b[-1].label if active_b else None
+        if label_a is not None or label_b is not None:
+            yield time, end, label_a, label_b
+        time = end
+
+
+def compare_tiers(tier_a, tier_b) -> AgreementReport:
+    ''' Measure the agreement between two tiers (e.g. of two annotators), tier A is used as the reference
+
+    >>> report = compare_tiers(eaf['Emotion (Annotator1)'], eaf['Emotion (Annotator2)'])
+    >>> report.kappa(), report.precision(), report.recall(), report.f1()
+    >>> labels, rows = report.matrix()
+
+    :param tier_a: An ELANTier object (the reference)
+    :param tier_b: An ELANTier object
+    :return: An AgreementReport object
+    '''
+    spans_a, labels_a = tier_spans(tier_a)
+    spans_b, labels_b = tier_spans(tier_b)
+    confusion = dd(int)
+    for start, end, label_a, label_b in segments(spans_a, spans_b):
+        confusion[(label_a, label_b)] += end - start
+    labels = OrderedDict.fromkeys(labels_a)
+    labels.update(OrderedDict.fromkeys(labels_b))
+    return AgreementReport(tuple(labels), dict(confusion))
+
+
+def _file_agreement(eaf_path, tier_a, tier_b):
+    ''' [Internal function] Load an EAF file and compare two of its tiers (used by :func:`corpus_agreement`) '''
+    start = time.perf_counter()
+    elan_doc = elan.open_eaf(eaf_path)
+    loaded = time.perf_counter()
+    report = compare_tiers(elan_doc[tier_a], elan_doc[tier_b])
+    return FileAgreement(report, loaded - start, time.perf_counter() - loaded)
+
+
+def corpus_agreement(paths, tier_a, tier_b, jobs=None) -> Tuple[AgreementReport, List[elan.CorpusResult]]:
+    ''' Measure the agreement between two tiers across EAF files in parallel (see :func:`texttaglib.elan.process_corpus`)
+
+    >>> total, results = corpus_agreement(elan.find_eaf_files('data/'), 'Emotion (Annotator1)', 'Emotion (Annotator2)', jobs=8)
+    >>> print(total.kappa())
+    >>> for r in results:
+    ...     print(r.path, r.value.report.kappa(), r.value.load_time, r.value.compare_time) if r.ok else print(r.path, r.error)
+
+    :param paths: A list of paths to EAF files
+    :param tier_a: ID of the reference tier
+    :param tier_b: ID of the other tier
+    :param jobs: Number of worker processes, defaults to the number of CPUs. Use jobs=1 to process files serially
+    :return: A tuple of (total, results), where total is an AgreementReport of all files
+             and each result contains a FileAgreement object
+    '''
+    results = elan.process_corpus(paths, partial(_file_agreement, tier_a=tier_a, tier_b=tier_b), jobs=jobs, loader=None)
+    total = AgreementReport((), {})
+    for result in results:
+        if result.ok:
+            total = total.merge(result.value.report)
+    return total, results
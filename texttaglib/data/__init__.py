@@ -2,3 +2,5 @@ import os
 
 MY_DIR = os.path.dirname(os.path.realpath(__file__))
 INIT_TTL_SQLITE = os.path.join(MY_DIR, 'scripts', 'init_corpus.sql')
+INIT_ELAN_SQLITE = os.path.join(MY_DIR, 'scripts', 'init_elan.sql')
+INIT_ELAN_RTREE = os.path.join(MY_DIR, 'scripts', 'init_elan_rtree.sql')
@@ -0,0 +1,80 @@
+/**
+ * Copyright 2020, Le Tuan Anh (tuananh.ke@gmail.com)
+ * ELAN corpus database (see texttaglib.sqlite.ELANSQLite)
+ * Time values are stored in milliseconds
+ **/
+
+CREATE TABLE IF NOT EXISTS "eaf_doc" (
+    "ID" INTEGER PRIMARY KEY AUTOINCREMENT
+    , "path" TEXT NOT NULL UNIQUE
+    , "size" INTEGER
+    , "mtime_ns" INTEGER
+    , "author" TEXT
+    , "date" TEXT
+    , "fileformat" TEXT
+    , "version" TEXT
+    , "media_file" TEXT
+    , "time_units" TEXT
+    , "media_url" TEXT
+    , "mime_type" TEXT
+    , "relative_media_url" TEXT
+);
+
+CREATE TABLE IF NOT EXISTS "eaf_tier" (
+    "ID" INTEGER PRIMARY KEY AUTOINCREMENT
+    , "docID" INTEGER NOT NULL
+    , "tierID" TEXT NOT NULL
+    , "participant" TEXT
+    , "type_ref" TEXT
+    , "parent_ref" TEXT
+    , "default_locale" TEXT
+    , FOREIGN KEY(docID) REFERENCES eaf_doc(ID) ON DELETE CASCADE ON UPDATE CASCADE
+    , UNIQUE ("docID", "tierID")
+);
+
+CREATE TABLE IF NOT EXISTS "eaf_timeslot" (
+    "docID" INTEGER NOT NULL
+    , "slotID" TEXT NOT NULL
+    , "value" INTEGER
+    , FOREIGN KEY(docID) REFERENCES eaf_doc(ID) ON DELETE CASCADE ON UPDATE CASCADE
+    , PRIMARY KEY ("docID", "slotID")
+);
+
+-- start and end of ref annotations are inherited from the annotations they refer to
+CREATE TABLE IF NOT EXISTS "eaf_annotation" (
+    "ID" INTEGER PRIMARY KEY AUTOINCREMENT
+    , "docID" INTEGER NOT NULL
+    , "tid" INTEGER NOT NULL
+    , "annID" TEXT NOT NULL
+    , "value" TEXT
+    , "cve_ref" TEXT
+    , "from_slot" TEXT
+    , "to_slot" TEXT
+    , "ref" TEXT
+    , "previous" TEXT
+    , "start" INTEGER
+    , "end" INTEGER
+    , FOREIGN KEY(docID) REFERENCES eaf_doc(ID) ON DELETE CASCADE ON UPDATE CASCADE
+    , FOREIGN KEY(tid) REFERENCES eaf_tier(ID) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+CREATE TABLE IF NOT EXISTS "eaf_vocab_entry" (
+    "docID" INTEGER NOT NULL
+    , "vocabID" TEXT NOT NULL
+    , "entryID" TEXT NOT NULL
+    , "lang_ref" TEXT
+    , "value" TEXT
+    , "description" TEXT
+    , FOREIGN KEY(docID) REFERENCES eaf_doc(ID) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- Indices
+------------------------------------------
+CREATE INDEX IF NOT EXISTS "eaf_tier_|_docID" ON "eaf_tier" ("docID");
+CREATE INDEX IF NOT EXISTS "eaf_tier_|_participant" ON "eaf_tier" ("participant");
+CREATE INDEX IF NOT EXISTS "eaf_tier_|_type_ref" ON "eaf_tier" ("type_ref");
+CREATE INDEX IF NOT EXISTS "eaf_annotation_|_docID" ON "eaf_annotation" ("docID");
+CREATE INDEX IF NOT EXISTS "eaf_annotation_|_tid" ON "eaf_annotation" ("tid");
+CREATE INDEX IF NOT EXISTS "eaf_annotation_|_span" ON "eaf_annotation" ("start", "end");
+CREATE INDEX IF NOT EXISTS "eaf_annotation_|_value" ON "eaf_annotation" ("value");
+CREATE INDEX IF NOT EXISTS "eaf_vocab_entry_|_docID" ON "eaf_vocab_entry" ("docID");
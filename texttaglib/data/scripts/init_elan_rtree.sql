@@ -0,0 +1,6 @@
+/**
+ * Copyright 2020, Le Tuan Anh (tuananh.ke@gmail.com)
+ * R*Tree index of annotation time spans (requires SQLite with the R*Tree module)
+ **/
+
+CREATE VIRTUAL TABLE IF NOT EXISTS "eaf_annotation_span" USING rtree_i32("ID", "start", "end");
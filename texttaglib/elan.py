@@ -28,11 +28,28 @@ ELAN module for manipulating ELAN transcript files (\*.eaf, \*.pfsx)
 
 ########################################################################
 
+import os
+import re
+import math
+import gc
+import glob
+import heapq
+import pickle
+import hashlib
+import shutil
 import logging
-from collections import OrderedDict
+import tempfile
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, namedtuple
 from collections import defaultdict as dd
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
 from typing import List, Tuple
 import xml.etree.ElementTree as ET
+from xml.parsers import expat
+from xml.sax.saxutils import escape
 
 from .chirptext import DataObject
 from .chirptext import chio
@@ -57,34 +74,53 @@ CSVTable = List[CSVRow]
 
 
 class TimeSlot():
+
+    __slots__ = ('ID', 'value', '_ts_cache')
+
     def __init__(self, ID, value=None):
         """ An ELAN timestamp (with ID)
+
+        value is an integer number of milliseconds (or None for unaligned time slots)
         """
         self.ID = ID
         self.value = value
+        self._ts_cache = None  # (value, formatted timestamp)
+
+    def to_dict(self):
+        return {'ID': self.ID, 'value': self.value}
+
+    # chirptext JSON helpers serialise objects through their __dict__
+    __dict__ = property(to_dict)
 
     @property
     def ts(self):
-        return sec2ts(self.sec) if self.value is not None else None
+        if self.value is None:
+            return None
+        if self._ts_cache is None or self._ts_cache[0] != self.value:
+            self._ts_cache = (self.value, sec2ts(self.value / 1000))
+        return self._ts_cache[1]
 
     @property
     def sec(self):
         return self.value / 1000 if self.value is not None else None
 
     def __lt__(self, other):
-        if other is None or (isinstance(other, TimeSlot) and other.value is None):
+        other_value = other.value if isinstance(other, TimeSlot) else other
+        if other_value is None:
             return False
-        return self.value < other.value if isinstance(other, TimeSlot) else self.value < other
+        return self.value < other_value
 
     def __eq__(self, other):
-        if other is None or (isinstance(other, TimeSlot) and other.value is None):
+        other_value = other.value if isinstance(other, TimeSlot) else other
+        if other_value is None:
             return False
-        return self.value == other.value if isinstance(other, TimeSlot) else self.value == other
+        return self.value == other_value
 
     def __gt__(self, other):
-        if other is None or (isinstance(other, TimeSlot) and other.value is None):
+        other_value = other.value if isinstance(other, TimeSlot) else other
+        if other_value is None:
             return True
-        return self.value > other.value if isinstance(other, TimeSlot) else self.value > other
+        return self.value > other_value
 
     def __le__(self, other):
         return self < other or self == other
@@ -101,6 +137,9 @@ class TimeSlot():
     def __hash__(self):
         return id(self)
 
+    def __repr__(self):
+        return "TimeSlot(ID={}, value={})".format(repr(self.ID), repr(self.value))
+
     def __str__(self):
         val = self.ts
         return val if val else self.ID
@@ -110,25 +149,109 @@ class TimeSlot():
         slotID = node.get('TIME_SLOT_ID')
         value = node.get('TIME_VALUE')
         if value is not None:
-            return TimeSlot(slotID, int(node.get('TIME_VALUE')))
+            return TimeSlot(slotID, int(value))
         else:
             return TimeSlot(slotID)
 
     @staticmethod
     def from_ts(ts, ID=None):
-        value = ts2sec(ts) * 1000
+        value = int(round(ts2sec(ts) * 1000))
         return TimeSlot(ID=ID, value=value)
 
 
+class TimeOrder(OrderedDict):
+
+    ''' Time slots of an ELAN document (a map from time slot IDs to TimeSlot objects)
+
+    A sorted array of time values is built lazily so that time slots can be looked up by time
+    using binary search. The array is rebuilt when time slots are added or removed.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        self.__sorted_slots = None
+        self.__sorted_values = None
+        self.__sorted_size = 0
+        super().__init__(*args, **kwargs)
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.__sorted_values = None
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.__sorted_values = None
+
+    def _sorted(self):
+        ''' [Internal function] Sorted time slots (aligned ones only) and their values '''
+        if self.__sorted_values is None or self.__sorted_size != len(self):
+            self.__sorted_slots = sorted((ts for ts in self.values() if ts.value is not None), key=lambda ts: ts.value)
+            self.__sorted_values = [ts.value for ts in self.__sorted_slots]
+            self.__sorted_size = len(self)
+        return self.__sorted_slots, self.__sorted_values
+
+    def at(self, ts) -> List[TimeSlot]:
+        ''' Find all time slots at a given time (a TimeSlot, a VTT timestamp string or milliseconds) '''
+        return self.between(ts, ts)
+
+    def between(self, from_ts=None, to_ts=None) -> List[TimeSlot]:
+        ''' Find all time slots within [from_ts, to_ts], sorted by time '''
+        slots, values = self._sorted()
+        _from, _to = _to_ms(from_ts), _to_ms(to_ts)
+        lo = bisect_left(values, _from) if _from is not None else 0
+        hi = bisect_right(values, _to) if _to is not None else len(values)
+        return slots[lo:hi]
+
+    def nearest(self, ts) -> TimeSlot:
+        ''' Find the time slot that is nearest to a given time, return None if there is no aligned time slot '''
+        slots, values = self._sorted()
+        if not values:
+            return None
+        ms = _to_ms(ts)
+        idx = bisect_left(values, ms)
+        if idx == 0:
+            return slots[0]
+        elif idx == len(values):
+            return slots[-1]
+        return slots[idx] if values[idx] - ms < ms - values[idx - 1] else slots[idx - 1]
+
+
+def _to_ms(ts):
+    ''' [Internal function] Convert a TimeSlot, a VTT timestamp string or a number (in milliseconds) to milliseconds '''
+    if ts is None:
+        return None
+    elif isinstance(ts, TimeSlot):
+        return ts.value
+    elif isinstance(ts, str):
+        return int(round(ts2sec(ts) * 1000))
+    else:
+        return ts
+
+
 class ELANAnnotation(DataObject):
     """ An ELAN abstract annotation (for both alignable and non-alignable annotations)
     """
 
+    # links are kept in slots instead of __dict__, so that to_dict() and to_json() do not follow them
+    __slots__ = ('parent', '__children')
+
     def __init__(self, ID, value, cve_ref=None, **kwargs):
         super().__init__(**kwargs)
         self.ID = ID
         self.value = value
         self.cve_ref = cve_ref
+        self.parent = None  # the referenced annotation (for ref annotations)
+        self.__children = None
+
+    @property
+    def children(self):
+        ''' Annotations that refer to this annotation (ordered by their PREVIOUS_ANNOTATION chains) '''
+        return tuple(self.__children) if self.__children else ()
+
+    def _add_child(self, child):
+        ''' [Internal function] Link a ref annotation to this annotation '''
+        if self.__children is None:
+            self.__children = []
+        self.__children.append(child)
 
     def __repr__(self):
         return "[{}]".format(self.value)
@@ -171,6 +294,348 @@ class ELANRefAnnotation(ELANAnnotation):
         self.ref = ref  # ANNOTATION_REF
         self.previous = previous  # PREVIOUS_ANNOTATION
 
+    @property
+    def from_ts(self):
+        ''' Start time slot inherited from the referenced annotation (None if it has not been resolved) '''
+        return self.parent.from_ts if self.parent is not None else None
+
+    @property
+    def to_ts(self):
+        ''' End time slot inherited from the referenced annotation (None if it has not been resolved) '''
+        return self.parent.to_ts if self.parent is not None else None
+
+    @property
+    def duration(self):
+        from_ts, to_ts = self.from_ts, self.to_ts
+        if from_ts is None or to_ts is None or from_ts.value is None or to_ts.value is None:
+            return None
+        return to_ts.sec - from_ts.sec
+
+
+class AnnotationRecord(namedtuple('AnnotationRecord', ['tier', 'participant', 'start', 'end', 'value', 'cve_ref', 'ref', 'ID'])):
+    """ A flat annotation record (produced by :func:`iter_annotations`)
+
+    start and end are in milliseconds. For ref annotations they are inherited from the referenced annotations.
+    """
+
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.start is not None and self.end is not None else None
+
+    def to_csv_row(self) -> CSVRow:
+        ''' Convert this record into a CSV row (tier, participant, from, to, duration, value) with times in seconds '''
+        _from_ts = f"{self.start / 1000:.3f}" if self.start is not None else None
+        _to_ts = f"{self.end / 1000:.3f}" if self.end is not None else None
+        _duration = f"{self.duration / 1000:.3f}" if self.duration else None
+        return (self.tier, self.participant, _from_ts, _to_ts, _duration, self.value)
+
+
+class Overlap(namedtuple('Overlap', ['tier_a', 'a', 'tier_b', 'b', 'start', 'end'])):
+    """ Two annotations from different participants that overlap in [start, end] (in milliseconds) """
+
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class Silence(namedtuple('Silence', ['tier_a', 'a', 'tier_b', 'b', 'start', 'end'])):
+    """ A stretch of silence in [start, end] (in milliseconds) after annotation a and before annotation b
+
+    A silence between two participants is a gap, a silence between annotations of the same participant is a pause.
+    """
+
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+
+class Transition(namedtuple('Transition', ['tier_a', 'a', 'tier_b', 'b', 'offset'])):
+    """ A turn transition from annotation a to annotation b of another participant
+
+    offset is the floor transfer offset in milliseconds (start of b - end of a),
+    a negative offset means an overlap and a positive offset means a gap.
+    """
+
+    __slots__ = ()
+
+
+class OverlapReport(namedtuple('OverlapReport', ['overlaps', 'gaps', 'pauses', 'transitions'])):
+    """ Result of :meth:`ELANDoc.overlaps` """
+
+    __slots__ = ()
+
+    def summary(self):
+        ''' Summarise this report as a dict of counts and total durations (in milliseconds) '''
+        return {'overlaps': len(self.overlaps), 'overlap_ms': sum(o.duration for o in self.overlaps),
+                'gaps': len(self.gaps), 'gap_ms': sum(g.duration for g in self.gaps),
+                'pauses': len(self.pauses), 'pause_ms': sum(p.duration for p in self.pauses),
+                'transitions': len(self.transitions),
+                'overlapped_transitions': sum(1 for t in self.transitions if t.offset < 0)}
+
+
+def _get_numpy():
+    ''' [Internal function] Import numpy or raise an ImportError with a helpful message '''
+    try:
+        import numpy
+        return numpy
+    except ImportError:
+        raise ImportError("numpy is required for columnar and frame export (pip install numpy)")
+
+
+class AnnotationColumns(namedtuple('AnnotationColumns', ['start', 'end', 'doc', 'tier', 'participant', 'value',
+                                                         'docs', 'tier_ids', 'participants', 'values'])):
+    """ Time-resolved annotations stored as NumPy arrays (see :meth:`ELANDoc.to_columns`)
+
+    start and end are int64 arrays (in milliseconds). doc, tier, participant and value are
+    int32 code arrays that index into the string tables docs, tier_ids, participants and values.
+    """
+
+    __slots__ = ()
+    GROUPS = {'doc': ('doc', 'docs'), 'tier': ('tier', 'tier_ids'), 'participant': ('participant', 'participants')}
+
+    @property
+    def size(self):
+        ''' Number of annotations '''
+        return len(self.start)
+
+    @property
+    def duration(self):
+        ''' Durations of all annotations (in milliseconds) '''
+        return self.end - self.start
+
+    def labels(self, field):
+        ''' Decode a code array (doc, tier, participant or value) into an array of strings '''
+        np = _get_numpy()
+        table = {'doc': self.docs, 'tier': self.tier_ids, 'participant': self.participants, 'value': self.values}[field]
+        return np.array(table, dtype=object)[getattr(self, field)]
+
+    def _groups(self, by):
+        ''' [Internal function] Return the code array and the label table used for grouping '''
+        if by not in self.GROUPS:
+            raise ValueError("Invalid group {} (must be one of {})".format(repr(by), ', '.join(self.GROUPS)))
+        code_field, table_field = self.GROUPS[by]
+        return getattr(self, code_field), getattr(self, table_field)
+
+    def talk_time(self, by='participant'):
+        ''' Total annotated time (in milliseconds) by doc, tier or participant, or in total when by is None
+
+        Overlapping annotations within a group are counted separately.
+        '''
+        np = _get_numpy()
+        if by is None:
+            return int(self.duration.sum())
+        codes, labels = self._groups(by)
+        totals = np.bincount(codes, weights=self.duration, minlength=len(labels))
+        counts = np.bincount(codes, minlength=len(labels))
+        return {label: int(totals[i]) for i, label in enumerate(labels) if counts[i]}
+
+    def mean_duration(self, by=None):
+        ''' Mean annotation duration (in milliseconds) by doc, tier or participant, or in total when by is None '''
+        np = _get_numpy()
+        if by is None:
+            return float(self.duration.mean()) if self.size else 0.0
+        codes, labels = self._groups(by)
+        totals = np.bincount(codes, weights=self.duration, minlength=len(labels))
+        counts = np.bincount(codes, minlength=len(labels))
+        return {label: float(totals[i] / counts[i]) for i, label in enumerate(labels) if counts[i]}
+
+    def gaps(self, by=None, min_gap=1):
+        ''' Durations of silences between consecutive annotations (in milliseconds)
+
+        Annotations are sorted by start time and a silence is the time between the latest end so far
+        and the next start. Silences never span different documents. When by is given (doc, tier or
+        participant), silences are computed within each group separately.
+
+        :param min_gap: Ignore silences shorter than this (in milliseconds)
+        :return: An int64 array of silence durations, ordered by group and time
+        '''
+        np = _get_numpy()
+        if not self.size:
+            return np.empty(0, dtype=np.int64)
+        key = self.doc.astype(np.int64)
+        if by is not None:
+            codes, labels = self._groups(by)
+            key = key * max(len(labels), 1) + codes
+        order = np.lexsort((self.end, self.start, key))
+        key, start, end = key[order], self.start[order], self.end[order]
+        # shift each group past the previous one so that a single running maximum never crosses groups
+        offset = key * (int(end.max()) - int(start.min()) + 1)
+        floor = np.maximum.accumulate(end + offset) - offset
+        gaps = start[1:] - floor[:-1]
+        return gaps[(key[1:] == key[:-1]) & (gaps >= min_gap)]
+
+    def histogram(self, bins=10, range=None, by=None):
+        ''' Histogram of annotation durations (see numpy.histogram)
+
+        :return: A tuple of (counts, bin_edges). When by is given, counts is a dict that maps
+                 each group label to an array of counts, all groups share the same bin edges
+        '''
+        np = _get_numpy()
+        duration = self.duration
+        if by is None:
+            return np.histogram(duration, bins=bins, range=range)
+        edges = np.histogram_bin_edges(duration, bins=bins, range=range)
+        codes, labels = self._groups(by)
+        counts = np.bincount(codes, minlength=len(labels))
+        return {label: np.histogram(duration[codes == i], bins=edges)[0]
+                for i, label in enumerate(labels) if counts[i]}, edges
+
+
+def _make_columns(tiers, doc_name='') -> AnnotationColumns:
+    ''' [Internal function] Build an AnnotationColumns object from a list of tiers '''
+    np = _get_numpy()
+    starts, ends, value_codes, counts = [], [], [], []
+    values, participants = {}, {}
+    for tier in tiers:
+        n = len(starts)
+        for ann in tier.annotations:
+            from_ts, to_ts = ann.from_ts, ann.to_ts
+            if from_ts is None or to_ts is None or from_ts.value is None or to_ts.value is None:
+                continue
+            starts.append(from_ts.value)
+            ends.append(to_ts.value)
+            value_codes.append(values.setdefault(ann.value, len(values)))
+        counts.append(len(starts) - n)
+    tier_codes = np.repeat(np.arange(len(counts), dtype=np.int32), counts)
+    participant_map = np.array([participants.setdefault(t.participant, len(participants)) for t in tiers], dtype=np.int32)
+    return AnnotationColumns(start=np.array(starts, dtype=np.int64), end=np.array(ends, dtype=np.int64),
+                             doc=np.zeros(len(starts), dtype=np.int32), tier=tier_codes,
+                             participant=participant_map[tier_codes] if len(tiers) else tier_codes.copy(),
+                             value=np.array(value_codes, dtype=np.int32),
+                             docs=(doc_name,), tier_ids=tuple(t.ID for t in tiers),
+                             participants=tuple(participants), values=tuple(values))
+
+
+def _runs(column, offset=0, blank=-1):
+    ''' [Internal function] Run-length encode a label column as an array of (first frame, length, class ID) rows '''
+    np = _get_numpy()
+    if not len(column):
+        return np.empty((0, 3), dtype=np.int64)
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(column)) + 1))
+    lengths = np.diff(np.concatenate((starts, [len(column)])))
+    runs = np.stack((starts + offset, lengths, column[starts]), axis=1).astype(np.int64)
+    return runs[runs[:, 2] != blank]
+
+
+class FrameLabels(namedtuple('FrameLabels', ['frame_ms', 'offset', 'labels', 'tier_ids', 'classes'])):
+    """ Dense frame-level labels of ELAN tiers (see :meth:`ELANDoc.to_frames`)
+
+    labels is an int32 matrix of shape (frames, tiers). Each cell is a class ID that indexes into
+    classes[tier], or -1 when no annotation covers the frame. offset is the index of the first frame.
+    """
+
+    __slots__ = ()
+
+    def to_rle(self) -> 'FrameRuns':
+        ''' Run-length encode these labels '''
+        return FrameRuns(self.frame_ms, self.offset + len(self.labels),
+                         tuple(_runs(self.labels[:, i], self.offset) for i in range(len(self.tier_ids))),
+                         self.tier_ids, self.classes)
+
+
+class FrameRuns(namedtuple('FrameRuns', ['frame_ms', 'frames', 'runs', 'tier_ids', 'classes'])):
+    """ Run-length encoded frame-level labels of ELAN tiers (see :meth:`ELANDoc.to_frames`)
+
+    runs contains an int64 array of (first frame, length, class ID) rows for each tier.
+    Frames that are not covered by any run are not labelled (i.e. -1).
+    """
+
+    __slots__ = ()
+
+    def to_dense(self) -> FrameLabels:
+        ''' Expand these runs into a dense label matrix '''
+        np = _get_numpy()
+        labels = np.full((self.frames, len(self.tier_ids)), -1, dtype=np.int32)
+        for i, runs in enumerate(self.runs):
+            for first, length, class_id in runs:
+                labels[first:first + length, i] = class_id
+        return FrameLabels(self.frame_ms, 0, labels, self.tier_ids, self.classes)
+
+
+def _tier_spans(tier, vocab=None):
+    ''' [Internal function] Collect starts, ends and class IDs of the time-resolved annotations of a tier
+
+    Without a vocabulary, class IDs are assigned to annotation values in order of first appearance.
+
+    :return: A tuple of (starts, ends, class_ids, classes)
+    '''
+    np = _get_numpy()
+    if vocab is None and tier.linguistic_type is not None:
+        vocab = tier.linguistic_type.vocab
+    if vocab is None:
+        entry_map, value_map = {}, {}
+    elif isinstance(vocab, ELANVocab):
+        entry_map = {e.ID: i for i, e in enumerate(vocab.entries)}
+        value_map = {}
+        for i, e in enumerate(vocab.entries):
+            value_map.setdefault(e.value, i)
+    else:
+        entry_map, value_map = {}, {}
+        for i, label in enumerate(vocab):
+            value_map.setdefault(label, i)
+    starts, ends, class_ids = [], [], []
+    unknown = 0
+    for ann in tier.annotations:
+        from_ts, to_ts = ann.from_ts, ann.to_ts
+        if from_ts is None or to_ts is None or from_ts.value is None or to_ts.value is None:
+            continue
+        if vocab is None:
+            class_id = value_map.setdefault(ann.value, len(value_map))
+        else:
+            class_id = entry_map.get(ann.cve_ref) if ann.cve_ref in entry_map else value_map.get(ann.value)
+            if class_id is None:
+                unknown += 1
+                continue
+        starts.append(from_ts.value)
+        ends.append(to_ts.value)
+        class_ids.append(class_id)
+    if unknown:
+        getLogger().warning("{} annotation(s) in tier {} are not in the vocabulary and were not labelled".format(unknown, tier.ID))
+    if vocab is None:
+        classes = tuple(value_map)
+    elif isinstance(vocab, ELANVocab):
+        classes = tuple(e.value for e in vocab.entries)
+    else:
+        classes = tuple(vocab)
+    return np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64), np.array(class_ids, dtype=np.int32), classes
+
+
+def _paint_frames(column, first, last, class_ids):
+    ''' [Internal function] Label frames [first, last) of each span in a column, later spans take precedence '''
+    np = _get_numpy()
+    lengths = last - first
+    total = int(lengths.sum())
+    if not total:
+        return
+    # positions of all covered frames, computed without looping over spans
+    frames = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths - first, lengths)
+    winner = np.full(len(column), -1, dtype=np.int64)
+    np.maximum.at(winner, frames, np.repeat(np.arange(len(lengths)), lengths))
+    covered = winner >= 0
+    column[covered] = class_ids[winner[covered]]
+
+
+def _frame_chunks(frame_ms, tier_ids, classes, spans, frames, chunk_ms=3600000):
+    ''' [Internal function] Label frames chunk by chunk (see :meth:`ELANDoc.iter_frames`) '''
+    np = _get_numpy()
+    if chunk_ms <= 0:
+        raise ValueError("chunk_ms must be positive")
+    chunk_frames = max(1, chunk_ms // frame_ms)
+    for offset in range(0, frames, chunk_frames):
+        end = min(frames, offset + chunk_frames)
+        labels = np.full((end - offset, len(spans)), -1, dtype=np.int32)
+        for i, (first, last, class_ids) in enumerate(spans):
+            lo, hi = np.maximum(first, offset), np.minimum(last, end)
+            inside = hi > lo
+            _paint_frames(labels[:, i], lo[inside] - offset, hi[inside] - offset, class_ids[inside])
+        yield FrameLabels(frame_ms, offset, labels, tier_ids, classes)
+
 
 class LinguisticType(DataObject):
     def __init__(self, xml_node=None):
@@ -188,10 +653,108 @@ class LinguisticType(DataObject):
     def ID(self):
         return self.linguistic_type_id
 
+    def _to_xml_attrib(self):
+        ''' [Internal function] Convert this linguistic type back into LINGUISTIC_TYPE XML attributes '''
+        attrib = {}
+        for k, v in vars(self).items():
+            if k in ('vocab', 'tiers') or k.startswith('_') or v is None:
+                continue
+            attrib[k.upper()] = ('true' if v else 'false') if isinstance(v, bool) else v
+        return attrib
+
     def __repr__(self):
         return f"LinguisticType(ID={repr(self.ID)}, constraints={repr(self.constraints)}"
 
 
+class TimeIndex():
+
+    ''' A static interval index over time-alignable annotations
+
+    Annotations are kept in arrays sorted by start time and by end time. The start-sorted
+    array is used as an implicit balanced binary tree where each node stores the maximum
+    end time of its subtree, so that range queries only visit relevant branches.
+    All times are in milliseconds.
+    '''
+
+    def __init__(self, annotations):
+        indexed = sorted(enumerate(annotations), key=lambda p: (p[1].from_ts.value, p[1].to_ts.value))
+        self.annotations = [a for _, a in indexed]
+        # input positions of the sorted annotations
+        self.positions = [i for i, _ in indexed]
+        self.ordered = all(i < j for i, j in zip(self.positions, self.positions[1:]))
+        self.starts = [a.from_ts.value for a in self.annotations]
+        self.ends = [a.to_ts.value for a in self.annotations]
+        # annotation positions ordered by end time (for backward nearest search)
+        self.end_order = sorted(range(len(self.ends)), key=lambda i: self.ends[i])
+        self.sorted_ends = [self.ends[i] for i in self.end_order]
+        self.max_ends = list(self.ends)
+        self.__build_max_ends(0, len(self.ends))
+
+    def __build_max_ends(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        max_end = self.ends[mid]
+        for child_max in (self.__build_max_ends(lo, mid), self.__build_max_ends(mid + 1, hi)):
+            if child_max is not None and child_max > max_end:
+                max_end = child_max
+        self.max_ends[mid] = max_end
+        return max_end
+
+    def __len__(self):
+        return len(self.annotations)
+
+    def overlap(self, from_ms=None, to_ms=None):
+        ''' Find all annotations that overlap (or touch) [from_ms, to_ms], sorted by start time '''
+        if from_ms is None:
+            from_ms = float('-inf')
+        if to_ms is None:
+            to_ms = float('inf')
+        results = []
+        # walk the same (0, n) tree that max_ends was built over
+        stack = [(0, len(self.starts), False)]
+        while stack:
+            lo, hi, visited = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if visited:
+                if self.starts[mid] > to_ms:
+                    # this node and its right subtree start after the range
+                    continue
+                if self.ends[mid] >= from_ms:
+                    results.append(self.annotations[mid])
+                stack.append((mid + 1, hi, False))
+            elif self.max_ends[mid] >= from_ms:
+                # in-order traversal: left subtree, then node, then right subtree
+                stack.append((lo, hi, True))
+                stack.append((lo, mid, False))
+        return results
+
+    def at(self, ms):
+        ''' Find all annotations that contain the time point ms '''
+        return self.overlap(ms, ms)
+
+    def nearest(self, ms, k=1):
+        ''' Find k annotations nearest to the time point ms
+
+        Annotations that contain ms come first, the rest are ordered by their distance to ms.
+        '''
+        results = self.at(ms)[:k]
+        after = bisect_right(self.starts, ms)  # first annotation that starts after ms
+        before = bisect_left(self.sorted_ends, ms) - 1  # last annotation that ends before ms
+        while len(results) < k and (after < len(self.starts) or before >= 0):
+            dist_after = self.starts[after] - ms if after < len(self.starts) else None
+            dist_before = ms - self.sorted_ends[before] if before >= 0 else None
+            if dist_before is None or (dist_after is not None and dist_after < dist_before):
+                results.append(self.annotations[after])
+                after += 1
+            else:
+                results.append(self.annotations[self.end_order[before]])
+                before -= 1
+        return results
+
+
 class ELANTier(DataObject):
     """ Represents an ELAN annotation tier """
 
@@ -215,7 +778,13 @@ class ELANTier(DataObject):
         self.parent = None
         self.doc = doc
         self.children = []
+        self.__children_map = {}
         self.annotations = []
+        self.__time_index = None
+        self.__time_index_size = 0
+        self.__span_index = None
+        self.__span_index_size = 0
+        self.__annotation_count = None
 
     @property
     def time_alignable(self):
@@ -235,6 +804,15 @@ class ELANTier(DataObject):
     def _type_ref_id(self):
         return self.__type_ref_id
 
+    @property
+    def annotation_count(self):
+        ''' Number of annotations in this tier (also available when only the inventory of an EAF file was read) '''
+        return self.__annotation_count if self.__annotation_count is not None else len(self.annotations)
+
+    def _set_annotation_count(self, count):
+        ''' [Internal function] Update annotation count of this Tier (for inventory mode) '''
+        self.__annotation_count = count
+
     def __getitem__(self, key):
         return self.annotations[key]
 
@@ -243,23 +821,101 @@ class ELANTier(DataObject):
 
     def get_child(self, ID):
         ''' Get a child tier by ID, return None if nothing is found '''
-        for child in self.children:
-            if child.ID == ID:
-                return child
-        return None
+        if len(self.__children_map) != len(self.children):
+            self.__children_map = {}
+            for child in self.children:
+                self.__children_map.setdefault(child.ID, child)
+        return self.__children_map.get(ID)
 
     def filter(self, from_ts=None, to_ts=None):
-        ''' Filter utterances by from_ts or to_ts or both
+        ''' Filter utterances by from_ts or to_ts or both, annotations are yielded in tier order
         If this tier is not a time-based tier everything will be returned
         '''
+        index = self.time_index
+        if len(index) == len(self.annotations):
+            # every annotation is indexed, use binary search instead of a linear scan
+            _from, _to = _to_ms(from_ts), _to_ms(to_ts)
+            lo = bisect_left(index.starts, _from) if _from is not None else 0
+            hi = bisect_right(index.starts, _to) if _to is not None else len(index)
+            if index.ordered:
+                yield from index.annotations[lo:hi]
+            else:
+                # annotations were not added in time order
+                for i in sorted(range(lo, hi), key=index.positions.__getitem__):
+                    yield index.annotations[i]
+            return
         for ann in self.annotations:
-            if from_ts is not None and ann.from_ts is not None and ann.from_ts < from_ts:
+            if not isinstance(ann, ELANTimeAnnotation):
+                yield ann
+            elif from_ts is not None and ann.from_ts is not None and ann.from_ts < from_ts:
                 continue
             elif to_ts is not None and ann.to_ts is not None and ann.from_ts > to_ts:
                 continue
             else:
                 yield ann
 
+    @property
+    def time_index(self) -> TimeIndex:
+        ''' Time index of time-alignable annotations in this tier
+
+        The index is built lazily on first use and rebuilt after annotations are added.
+        '''
+        if self.__time_index is None or self.__time_index_size != len(self.annotations):
+            self.__time_index = TimeIndex(a for a in self.annotations
+                                          if isinstance(a, ELANTimeAnnotation)
+                                          and a.from_ts is not None and a.from_ts.value is not None
+                                          and a.to_ts is not None and a.to_ts.value is not None)
+            self.__time_index_size = len(self.annotations)
+        return self.__time_index
+
+    @property
+    def span_index(self) -> TimeIndex:
+        ''' Time index of all annotations with known times
+
+        For tiers of reference annotations, annotations take the times of their parents and
+        annotations that share a parent are kept in their PREVIOUS_ANNOTATION order.
+        For other tiers this is the same as :attr:`time_index`.
+        '''
+        if self.parent is None or self.time_alignable:
+            return self.time_index
+        if self.__span_index is None or self.__span_index_size != len(self.annotations):
+            members = {id(a) for a in self.annotations}
+            parents = OrderedDict((id(a.parent), a.parent) for a in self.annotations if a.parent is not None)
+            self.__span_index = TimeIndex(c for p in parents.values() for c in p.children
+                                          if id(c) in members and c.from_ts is not None and c.from_ts.value is not None
+                                          and c.to_ts is not None and c.to_ts.value is not None)
+            self.__span_index_size = len(self.annotations)
+        return self.__span_index
+
+    def _invalidate_index(self):
+        ''' [Internal function] Drop the current time index, it will be rebuilt on the next query '''
+        self.__time_index = None
+        self.__span_index = None
+
+    def overlap(self, from_ts=None, to_ts=None):
+        ''' Find all time-alignable annotations that overlap [from_ts, to_ts]
+
+        :param from_ts: A TimeSlot, a VTT timestamp string or a number (in milliseconds)
+        :param to_ts: A TimeSlot, a VTT timestamp string or a number (in milliseconds)
+        :return: A list of annotations sorted by start time
+        '''
+        return self.time_index.overlap(_to_ms(from_ts), _to_ms(to_ts))
+
+    def at(self, ts):
+        ''' Find all time-alignable annotations at a time point '''
+        return self.time_index.at(_to_ms(ts))
+
+    def nearest(self, ts, k=1):
+        ''' Find k time-alignable annotations nearest to a time point '''
+        return self.time_index.nearest(_to_ms(ts), k=k)
+
+    def to_arrays(self) -> AnnotationColumns:
+        ''' Export the time-resolved annotations of this tier as NumPy arrays (requires numpy)
+
+        See :meth:`ELANDoc.to_columns`
+        '''
+        return _make_columns([self])
+
     def __len__(self):
         return len(self.annotations)
 
@@ -282,7 +938,7 @@ class ELANTier(DataObject):
             raise ValueError("Time slot ID not found ({})".format(to_ts_id))
         else:
             to_ts = self.doc.time_order[to_ts_id]
-        # [TODO] ensure that from_ts < to_ts
+        # from_ts < to_ts is not enforced here, use validate() to find such annotations
         value_node = alignable.find('ANNOTATION_VALUE')
         if value_node is None:
             raise ValueError("ALIGNABLE_ANNOTATION node must contain an ANNOTATION_VALUE node")
@@ -290,6 +946,7 @@ class ELANTier(DataObject):
             value = value_node.text if value_node.text else ''
             anno = ELANTimeAnnotation(ann_id, from_ts, to_ts, value, cve_ref=cve_ref)
             self.annotations.append(anno)
+            self._invalidate_index()
             return anno
 
     def add_ref_annotation_xml(self, ref_node):
@@ -304,6 +961,7 @@ class ELANTier(DataObject):
             value = value_node.text if value_node.text else ''
             anno = ELANRefAnnotation(ann_id, ref, previous, value, cve_ref=cve_ref)
             self.annotations.append(anno)
+            self._invalidate_index()
             return anno
 
     def _add_annotation_xml(self, annotation_node) -> ELANAnnotation:
@@ -407,13 +1065,17 @@ class ELANDoc(DataObject):
     
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.inventory = False  # True when annotations and time slots were not loaded
         self.properties = OrderedDict()
-        self.time_order = OrderedDict()
+        self.time_order = TimeOrder()
         self.__tiers_map = OrderedDict()  # internal - map tierIDs to tier objects
         self.__linguistic_types = []
+        self.__linguistic_types_map = {}
         self.__constraints = []
         self.__vocabs = []
+        self.__vocabs_map = {}
         self.__roots = []
+        self.__annotations_map = {}  # map annotation IDs to annotation objects
 
     @property
     def roots(self) -> TierTuple:
@@ -437,17 +1099,15 @@ class ELANDoc(DataObject):
 
     def get_linguistic_type(self, type_id):
         ''' Get linguistic type by ID. Return None if can not be found '''
-        for lingtype in self.__linguistic_types:
-            if lingtype.linguistic_type_id == type_id:
-                return lingtype
-        return None
+        return self.__linguistic_types_map.get(type_id)
 
     def get_vocab(self, vocab_id):
         ''' Get controlled vocab list by ID '''
-        for vocab in self.__vocabs:
-            if vocab.ID == vocab_id:
-                return vocab
-        return None
+        return self.__vocabs_map.get(vocab_id)
+
+    def get_annotation(self, ann_id) -> ELANAnnotation:
+        ''' Get an annotation by ID. Return None if can not be found '''
+        return self.__annotations_map.get(ann_id)
 
     def get_participant_map(self):
         ''' Map participants to tiers
@@ -471,6 +1131,197 @@ class ELANDoc(DataObject):
         """
         return tuple(self.__tiers_map.values())
 
+    def _select_tiers(self, tiers=None, participants=None) -> TierTuple:
+        ''' [Internal function] Select tiers by tier objects or tier IDs and/or by participant names '''
+        if isinstance(tiers, (str, ELANTier)):
+            tiers = [tiers]
+        if isinstance(participants, str):
+            participants = [participants]
+        selected = self.tiers() if tiers is None else tuple(t if isinstance(t, ELANTier) else self[t] for t in tiers)
+        if participants is not None:
+            participants = set(participants)
+            selected = tuple(t for t in selected if t.participant in participants)
+        return selected
+
+    def query(self, from_ts=None, to_ts=None, tiers=None, participants=None):
+        ''' Find all time-alignable annotations that overlap [from_ts, to_ts] across tiers
+
+        :param from_ts: A TimeSlot, a VTT timestamp string or a number (in milliseconds)
+        :param to_ts: A TimeSlot, a VTT timestamp string or a number (in milliseconds)
+        :param tiers: Tier objects or tier IDs to search, all tiers will be searched by default
+        :param participants: Only search tiers of these participants
+        :return: A list of (tier, annotation) tuples sorted by start time
+        '''
+        _from, _to = _to_ms(from_ts), _to_ms(to_ts)
+        streams = [[(tier, ann) for ann in tier.time_index.overlap(_from, _to)]
+                   for tier in self._select_tiers(tiers, participants)]
+        return list(heapq.merge(*streams, key=lambda x: (x[1].from_ts.value, x[1].to_ts.value)))
+
+    def overlaps(self, tiers=None, participants=None, min_overlap=0) -> OverlapReport:
+        ''' Find overlaps, gaps, pauses and turn transitions between participants
+
+        All time-alignable annotations of the selected tiers are sorted once by start time and
+        processed in a single sweep. Annotations that are still open are kept per participant, sorted by end time,
+        so only annotations of other participants that overlap long enough are visited. The cost is
+        O(n log n + n * p + k) for n annotations, p participants and k overlaps found, plus the cost of
+        inserting into the sorted active lists (linear in the number of open annotations of one participant).
+        Tiers without a participant name are treated as separate speakers.
+
+        - overlaps: pairs of annotations from different participants that overlap each other
+        - gaps and pauses: silences between participants (gaps) or within a participant (pauses)
+        - transitions: changes of the participant who holds the floor. Annotations that lie
+          entirely within an annotation of another participant (e.g. backchannels) are not transitions
+
+        >>> report = eaf.overlaps(tiers=['Person1 (Utterance)', 'Person2 (Utterance)'], min_overlap=100)
+        >>> for o in report.overlaps:
+        ...     print(o.tier_a.participant, o.tier_b.participant, o.duration)
+
+        :param tiers: Tier objects or tier IDs to analyse, all root tiers will be used by default
+        :param participants: Only analyse tiers of these participants
+        :param min_overlap: Minimum overlap duration (a TimeSlot, a VTT timestamp string or a number in milliseconds)
+        :return: An OverlapReport (overlaps, gaps, pauses, transitions)
+        '''
+        min_overlap = _to_ms(min_overlap) or 0
+        if tiers is None:
+            tiers = self.roots
+        items = []
+        for tier in self._select_tiers(tiers, participants):
+            speaker = tier.participant if tier.participant else tier.ID
+            for ann in tier.annotations:
+                if ann.from_ts is not None and ann.to_ts is not None and ann.from_ts.value is not None and ann.to_ts.value is not None:
+                    items.append((ann.from_ts.value, ann.to_ts.value, len(items), speaker, tier, ann))
+        items.sort(key=lambda x: (x[0], x[1], x[2]))
+        overlaps, gaps, pauses, transitions = [], [], [], []
+        active = {}  # speaker -> [(end, seq, tier, ann), ...] of annotations that are still open, sorted by end
+        floor = None  # the item with the latest end so far (i.e. the floor holder)
+        for start, end, seq, speaker, tier, ann in items:
+            # an open annotation overlaps this one by at least min_overlap if both end at or after start + min_overlap
+            threshold = start + min_overlap
+            for a_speaker in list(active):
+                entries = active[a_speaker]
+                del entries[:bisect_right(entries, (start, math.inf))]  # drop annotations that have ended
+                if not entries:
+                    del active[a_speaker]
+                elif a_speaker != speaker and end >= threshold:
+                    for a_end, _, a_tier, a_ann in entries[bisect_left(entries, (threshold,)):]:
+                        overlaps.append(Overlap(a_tier, a_ann, tier, ann, start, min(a_end, end)))
+            insort(active.setdefault(speaker, []), (end, seq, tier, ann))
+            if floor is None:
+                floor = (end, speaker, tier, ann)
+                continue
+            f_end, f_speaker, f_tier, f_ann = floor
+            if start > f_end:
+                silence = Silence(f_tier, f_ann, tier, ann, f_end, start)
+                (pauses if f_speaker == speaker else gaps).append(silence)
+            if end > f_end:
+                if f_speaker != speaker:
+                    transitions.append(Transition(f_tier, f_ann, tier, ann, start - f_end))
+                floor = (end, speaker, tier, ann)
+        return OverlapReport(overlaps, gaps, pauses, transitions)
+
+    def to_columns(self, tiers=None, participants=None) -> AnnotationColumns:
+        ''' Export time-resolved annotations as NumPy arrays (requires numpy)
+
+        Reference annotations take the times of their parent annotations and annotations
+        without time values are skipped. Statistics can then be computed without Python loops:
+
+        >>> columns = eaf.to_columns(tiers=['Person1 (Utterance)', 'Person2 (Utterance)'])
+        >>> columns.talk_time(by='participant')
+        {'Person1': 4000, 'Person2': 3800}
+        >>> columns.gaps()
+        array([200, 500])
+
+        :param tiers: Tier objects or tier IDs to export, all tiers will be exported by default
+        :param participants: Only export tiers of these participants
+        :return: An AnnotationColumns object
+        '''
+        return _make_columns(self._select_tiers(tiers, participants))
+
+    def _frame_vocab(self, tier, vocab):
+        ''' [Internal function] Find the vocabulary used to label a tier in :meth:`iter_frames` '''
+        if isinstance(vocab, dict):
+            vocab = vocab.get(tier.ID)
+        if isinstance(vocab, str):
+            vocab_id, vocab = vocab, self.get_vocab(vocab)
+            if vocab is None:
+                raise ValueError("Controlled vocabulary {} does not exist".format(repr(vocab_id)))
+        return vocab
+
+    def _frame_spans(self, frame_ms, tiers=None, vocab=None):
+        ''' [Internal function] Compute the frame ranges and class IDs of annotations for :meth:`iter_frames`
+
+        :return: A tuple of (tier_ids, classes, spans, frames), where spans contains (first, last, class_ids) arrays for each tier
+        '''
+        if frame_ms <= 0:
+            raise ValueError("frame_ms must be positive")
+        _get_numpy()
+        tier_ids, classes, spans = [], [], []
+        for tier in self._select_tiers(tiers):
+            starts, ends, class_ids, tier_classes = _tier_spans(tier, self._frame_vocab(tier, vocab))
+            # first and last (exclusive) frames whose centres are covered, i.e. ceil((t - frame_ms / 2) / frame_ms)
+            first = -((frame_ms - 2 * starts) // (2 * frame_ms))
+            last = -((frame_ms - 2 * ends) // (2 * frame_ms))
+            tier_ids.append(tier.ID)
+            classes.append(tier_classes)
+            spans.append((first, last, class_ids))
+        frames = max((int(last.max()) for _, last, _ in spans if len(last)), default=0)
+        return tuple(tier_ids), tuple(classes), spans, frames
+
+    def iter_frames(self, frame_ms=10, tiers=None, vocab=None, chunk_ms=3600000):
+        ''' Generate frame-level labels of tiers in chunks of at most chunk_ms (requires numpy)
+
+        Frame i covers [i * frame_ms, (i + 1) * frame_ms) and is labelled with the annotation
+        that covers its centre. When annotations of a tier overlap, the later one takes the frame.
+        Annotations of tiers with a controlled vocabulary are labelled with the index of their
+        entry in the vocabulary (i.e. their class ID), other annotations are labelled with the index
+        of their value in order of first appearance.
+
+        :param frame_ms: Frame length (in milliseconds)
+        :param tiers: Tier objects or tier IDs to label, all tiers will be labelled by default
+        :param vocab: An ELANVocab object, a vocabulary ID or a list of labels to label all tiers with,
+                      or a dict that maps tier IDs to these. Annotations that are not in the vocabulary are ignored
+        :param chunk_ms: Maximum duration of each chunk (in milliseconds)
+        :return: A generator of FrameLabels objects
+        '''
+        return _frame_chunks(frame_ms, *self._frame_spans(frame_ms, tiers, vocab), chunk_ms=chunk_ms)
+
+    def to_frames(self, frame_ms=10, tiers=None, vocab=None, rle=False, chunk_ms=3600000):
+        ''' Convert tiers into a frame-level label matrix (requires numpy)
+
+        Labels are computed in chunks of chunk_ms (see :meth:`iter_frames`). With rle=True the chunks
+        are run-length encoded as they are produced, so a dense matrix of the whole recording is never built.
+
+        >>> frames = eaf.to_frames(10, tiers=['Person1 (Emotion)'])
+        >>> frames.labels.shape
+        (650, 1)
+        >>> frames.classes[0]
+        ('happy', 'neutral', 'sad')
+
+        :return: A FrameLabels object, or a FrameRuns object when rle is True
+        '''
+        np = _get_numpy()
+        tier_ids, classes, spans, frames = self._frame_spans(frame_ms, tiers, vocab)
+        chunks = _frame_chunks(frame_ms, tier_ids, classes, spans, frames, chunk_ms=chunk_ms)
+        if not rle:
+            labels = [chunk.labels for chunk in chunks]
+            labels = np.concatenate(labels) if labels else np.empty((0, len(tier_ids)), dtype=np.int32)
+            return FrameLabels(frame_ms, 0, labels, tier_ids, classes)
+        frames, runs = 0, [[] for _ in tier_ids]
+        for chunk in chunks:
+            chunk_runs = chunk.to_rle()
+            frames = chunk_runs.frames
+            for tier_runs, cur in zip(runs, chunk_runs.runs):
+                # merge runs that continue across the chunk boundary
+                if tier_runs and len(tier_runs[-1]) and len(cur):
+                    prev = tier_runs[-1]
+                    if prev[-1, 0] + prev[-1, 1] == cur[0, 0] and prev[-1, 2] == cur[0, 2]:
+                        cur = cur.copy()
+                        cur[0, 0], cur[0, 1] = prev[-1, 0], prev[-1, 1] + cur[0, 1]
+                        tier_runs[-1] = prev[:-1]
+                tier_runs.append(cur)
+        runs = tuple(np.concatenate(r) if r else np.empty((0, 3), dtype=np.int64) for r in runs)
+        return FrameRuns(frame_ms, frames, runs, tier_ids, classes)
+
     def _update_info_xml(self, node):
         ''' [Internal function] Update ELAN file metadata from an XML node 
         
@@ -509,9 +1360,16 @@ class ELANDoc(DataObject):
         parent_ref = tier_node.get('PARENT_REF')
         default_locale = tier_node.get('DEFAULT_LOCALE')
         tier = ELANTier(type_ref, participant, tier_id, doc=self, default_locale=default_locale, parent_ref=parent_ref)
-        if tier_id in self.__tiers_map:
-            raise ValueError("Duplicated tier ID ({})".format(tier_id))
-        self.__tiers_map[tier_id] = tier
+        return self._add_tier(tier)
+
+    def _add_tier(self, tier) -> ELANTier:
+        ''' [Internal function] Link an ELANTier object to this ELANDoc
+
+        General users should not use this function.
+        '''
+        if tier.ID in self.__tiers_map:
+            raise ValueError("Duplicated tier ID ({})".format(tier.ID))
+        self.__tiers_map[tier.ID] = tier
         if tier.parent_ref is None:
             self.__roots.append(tier)
         return tier
@@ -529,7 +1387,9 @@ class ELANDoc(DataObject):
 
         General users should not use this function.
         '''
-        self.__linguistic_types.append(LinguisticType(elem))
+        lingtype = LinguisticType(elem)
+        self.__linguistic_types.append(lingtype)
+        self.__linguistic_types_map.setdefault(lingtype.linguistic_type_id, lingtype)
 
     def _add_constraint_xml(self, elem):
         ''' [Internal function] Parse a CONSTRAINT XML node and link it to current ELANDoc
@@ -543,7 +1403,196 @@ class ELANDoc(DataObject):
 
         General users should not use this function.
         '''
-        self.__vocabs.append(ELANVocab.from_xml(elem))
+        self._add_vocab(ELANVocab.from_xml(elem))
+
+    def _add_vocab(self, vocab) -> ELANVocab:
+        ''' [Internal function] Link an ELANVocab object to this ELANDoc
+
+        General users should not use this function.
+        '''
+        self.__vocabs.append(vocab)
+        self.__vocabs_map.setdefault(vocab.ID, vocab)
+        return vocab
+
+    def _add_annotation(self, ann) -> ELANAnnotation:
+        ''' [Internal function] Add an annotation to the annotation ID map of this ELANDoc
+
+        General users should not use this function.
+        '''
+        self.__annotations_map[ann.ID] = ann
+        return ann
+
+    def _resolve_annotations(self):
+        ''' [Internal function] Link ref annotations to the annotations they refer to
+
+        Children of each annotation are ordered by following their PREVIOUS_ANNOTATION chains.
+        General users should not use this function.
+        '''
+        for tier in self.tiers():
+            if tier.parent_ref is None:
+                continue
+            groups = OrderedDict()  # parent ID -> ref annotations in document order
+            for ann in tier.annotations:
+                if isinstance(ann, ELANRefAnnotation):
+                    groups.setdefault(ann.ref, []).append(ann)
+            for ref, group in groups.items():
+                parent = self.__annotations_map.get(ref)
+                if parent is None:
+                    getLogger().warning("Annotation {} refers to an unknown annotation ({})".format(group[0].ID, ref))
+                    continue
+                for ann in _order_by_previous(group):
+                    ann.parent = parent
+                    parent._add_child(ann)
+
+    def _to_compact(self):
+        ''' [Internal function] Convert this ELANDoc into a compact structure of builtin types (for caching)
+
+        General users should not use this function.
+        '''
+        info = (self.author, self.date, self.fileformat, self.version, self.media_file, self.time_units,
+                self.media_url, self.mime_type, self.relative_media_url, list(self.properties.items()), self.inventory)
+        slots = [(ts.ID, ts.value) for ts in self.time_order.values()]
+        tiers = []
+        for tier in self.tiers():
+            anns = []
+            for ann in tier.annotations:
+                if isinstance(ann, ELANTimeAnnotation):
+                    anns.append((True, ann.ID, ann.value, ann.cve_ref, ann.from_ts.ID, ann.to_ts.ID))
+                else:
+                    anns.append((False, ann.ID, ann.value, ann.cve_ref, ann.ref, ann.previous))
+            count = tier.annotation_count if self.inventory else None
+            tiers.append((tier._type_ref_id, tier.participant, tier.ID, tier.default_locale, tier.parent_ref, count, anns))
+        lingtypes = [lt._to_xml_attrib() for lt in self.__linguistic_types]
+        constraints = [(c.description, c.stereotype) for c in self.__constraints]
+        vocabs = [(v.ID, v.description, v.lang_ref, [(e.ID, e.lang_ref, e.value, e.description) for e in v.entries])
+                  for v in self.__vocabs]
+        return (info, slots, tiers, lingtypes, constraints, vocabs)
+
+    @staticmethod
+    def _from_compact(data) -> 'ELANDoc':
+        ''' [Internal function] Create an (unresolved) ELANDoc object from a compact structure
+
+        General users should not use this function.
+        '''
+        info, slots, tiers, lingtypes, constraints, vocabs = data
+        doc = ELANDoc()
+        (doc.author, doc.date, doc.fileformat, doc.version, doc.media_file, doc.time_units,
+         doc.media_url, doc.mime_type, doc.relative_media_url, properties, doc.inventory) = info
+        doc.properties.update(properties)
+        for slot_id, value in slots:
+            doc.time_order[slot_id] = TimeSlot(slot_id, value)
+        time_order = doc.time_order
+        for type_ref, participant, tier_id, default_locale, parent_ref, count, anns in tiers:
+            tier = doc._add_tier(ELANTier(type_ref, participant, tier_id, doc=doc, default_locale=default_locale, parent_ref=parent_ref))
+            if count is not None:
+                tier._set_annotation_count(count)
+            for alignable, ann_id, value, cve_ref, ref1, ref2 in anns:
+                if alignable:
+                    ann = ELANTimeAnnotation(ann_id, time_order[ref1], time_order[ref2], value, cve_ref=cve_ref)
+                else:
+                    ann = ELANRefAnnotation(ann_id, ref1, ref2, value, cve_ref=cve_ref)
+                tier.annotations.append(ann)
+                doc._add_annotation(ann)
+        for attrib in lingtypes:
+            doc._add_linguistic_type_xml(ET.Element('LINGUISTIC_TYPE', attrib))
+        for description, stereotype in constraints:
+            constraint = ELANContraint()
+            constraint.description, constraint.stereotype = description, stereotype
+            doc.__constraints.append(constraint)
+        for vocab_id, description, lang_ref, entries in vocabs:
+            entries = [ELANCVEntry(e_id, e_lang_ref, e_value, description=e_desc) for e_id, e_lang_ref, e_value, e_desc in entries]
+            doc._add_vocab(ELANVocab(vocab_id, description, lang_ref, entries=entries))
+        return doc
+
+    def _eaf_writer(self, path, encoding='utf-8', **kwargs) -> 'EAFWriter':
+        ''' [Internal function] Create an EAFWriter with the metadata and properties of this ELANDoc '''
+        writer = EAFWriter(path, author=self.author, date=self.date, fileformat=self.fileformat or '3.0',
+                           version=self.version or '3.0', media_file=self.media_file, time_units=self.time_units or 'milliseconds',
+                           media_url=self.media_url, mime_type=self.mime_type, relative_media_url=self.relative_media_url,
+                           encoding=encoding, **kwargs)
+        for name, value in self.properties.items():
+            writer.add_property(name, value)
+        return writer
+
+    def _write_eaf_types(self, writer):
+        ''' [Internal function] Write linguistic types, constraints and vocabularies of this ELANDoc '''
+        for lingtype in self.__linguistic_types:
+            attrib = {k.lower(): v for k, v in lingtype._to_xml_attrib().items()}
+            type_id = attrib.pop('linguistic_type_id')
+            writer.add_linguistic_type(type_id, **attrib)
+        for constraint in self.__constraints:
+            writer.add_constraint(constraint.stereotype, constraint.description)
+        for vocab in self.__vocabs:
+            writer.add_vocab(vocab)
+
+    def write_eaf(self, path, encoding='utf-8'):
+        ''' Write this ELANDoc to an EAF file (see :class:`EAFWriter`)
+
+        Time slots with the same value are merged and their IDs are reassigned, annotation IDs are kept.
+        '''
+        with self._eaf_writer(path, encoding) as writer:
+            for tier in self.tiers():
+                writer.add_tier(tier.ID, tier._type_ref_id, participant=tier.participant,
+                                parent_ref=tier.parent_ref, default_locale=tier.default_locale)
+                for ann in tier.annotations:
+                    if isinstance(ann, ELANTimeAnnotation):
+                        writer.add_annotation(tier.ID, ann.from_ts, ann.to_ts, ann.value, ID=ann.ID, cve_ref=ann.cve_ref)
+                    else:
+                        writer.add_ref_annotation(tier.ID, ann.ref, ann.value, previous=ann.previous, ID=ann.ID, cve_ref=ann.cve_ref)
+            self._write_eaf_types(writer)
+
+    def align_many(self, tier_a, tiers, how='overlap', min_overlap=0):
+        ''' Pair each annotation of tier_a with the annotations of several other tiers in a single pass
+
+        All tiers are walked through as a sorted merge-join, so the cost is linear in the number of annotations
+        (plus the number of matches) when annotations within each tier do not overlap each other.
+
+        :param tier_a: The anchor tier (an ELANTier object or a tier ID)
+        :param tiers: Tier objects or tier IDs to align with the anchor tier
+        :param how: 'overlap' (annotations that overlap the anchor by at least min_overlap),
+                    'contains' (annotations that lie within the anchor), or
+                    'nearest' (the annotation with the largest overlap, or the closest one when nothing overlaps)
+        :param min_overlap: Minimum overlap for how='overlap' (a TimeSlot, a VTT timestamp string or a number in milliseconds)
+        :return: A generator of (annotation, matches) tuples where matches contains a list of annotations
+                 for each tier in tiers. Anchors are yielded in time order, even when nothing matches them.
+        '''
+        if how not in ALIGN_METHODS:
+            raise ValueError("Invalid alignment method {} (must be one of {})".format(repr(how), ', '.join(ALIGN_METHODS)))
+        tier_a = self._select_tiers(tier_a)[0]
+        min_overlap = _to_ms(min_overlap) or 0
+        cursors = [_AlignCursor(tier, how, min_overlap) for tier in self._select_tiers(tiers)]
+        index = tier_a.span_index
+        for ann, start, end in zip(index.annotations, index.starts, index.ends):
+            yield ann, tuple(cursor.match(start, end) for cursor in cursors)
+
+    def align(self, tier_a, tier_b, how='overlap', min_overlap=0):
+        ''' Pair each annotation of tier_a with the annotations of tier_b in a sorted merge-join (see :meth:`align_many`)
+
+        >>> for utterance, translations in eaf.align('Person1 (Utterance)', 'Person1 (Translation)'):
+        ...     print(utterance.value, [t.value for t in translations])
+
+        :return: A generator of (annotation, matches) tuples where matches is a list of annotations of tier_b
+        '''
+        for ann, (matches,) in self.align_many(tier_a, [tier_b], how=how, min_overlap=min_overlap):
+            yield ann, matches
+
+    def window(self, from_ts, to_ts) -> 'ELANDocWindow':
+        ''' Create a read-only view of the annotations that overlap [from_ts, to_ts)
+
+        Views only store index ranges into the time indices of tiers, so creating many
+        windows over one document costs very little memory.
+
+        >>> clip = eaf.window('00:05:00', '00:06:30')
+        >>> for tier in clip:
+        ...     for ann, start, end in tier.spans():  # times relative to the window start
+        ...         print(tier.ID, start, end, ann.value)
+        >>> clip.write_eaf('clip.eaf')
+
+        :param from_ts: A TimeSlot, a VTT timestamp string or a number (in milliseconds)
+        :param to_ts: A TimeSlot, a VTT timestamp string or a number (in milliseconds)
+        :return: An ELANDocWindow object
+        '''
+        return ELANDocWindow(self, _to_ms(from_ts), _to_ms(to_ts))
 
     def to_csv_rows(self) -> CSVTable:
         ''' Convert this ELANDoc into a CSV-friendly structure (i.e. list of list of strings) 
@@ -561,6 +1610,194 @@ class ELANDoc(DataObject):
         return rows
 
 
+ALIGN_METHODS = ('overlap', 'contains', 'nearest')
+
+
+class _AlignCursor():
+    ''' [Internal function] Walk through the start-sorted annotations of a tier while anchors move forward in time '''
+
+    def __init__(self, tier, how='overlap', min_overlap=0):
+        index = tier.span_index
+        self.index = index
+        self.annotations, self.starts, self.ends = index.annotations, index.starts, index.ends
+        self.how = how
+        self.min_overlap = min_overlap
+        self.lo = 0  # annotations before lo end before the current anchor starts
+
+    def match(self, start, end):
+        starts, ends = self.starts, self.ends
+        # anchors are sorted by start time, so annotations that end before this anchor starts can be skipped for good
+        while self.lo < len(starts) and ends[self.lo] <= start:
+            self.lo += 1
+        matches = []
+        best = None
+        i = self.lo
+        while i < len(starts) and starts[i] < end:
+            if self.how == 'contains':
+                if start <= starts[i] and ends[i] <= end:
+                    matches.append(self.annotations[i])
+            else:
+                overlap = min(end, ends[i]) - max(start, starts[i])
+                if self.how == 'overlap':
+                    if overlap > 0 and overlap >= self.min_overlap:
+                        matches.append(self.annotations[i])
+                elif overlap > 0 and (best is None or overlap > best[0]):
+                    best = (overlap, i)
+            i += 1
+        if self.how != 'nearest':
+            return matches
+        if best is not None:
+            return [self.annotations[best[1]]]
+        # nothing overlaps, pick the closest of the annotation that ends last before the anchor
+        # (annotations may overlap each other, so this is not always lo - 1) and the first one after it
+        candidates = []
+        sorted_ends = self.index.sorted_ends
+        before = bisect_right(sorted_ends, start) - 1
+        if before >= 0:
+            before = bisect_left(sorted_ends, sorted_ends[before])  # the first one in start order among equal ends
+            candidates.append((start - sorted_ends[before], self.index.end_order[before]))
+        if i < len(starts):
+            candidates.append((starts[i] - end, i))
+        return [self.annotations[min(candidates)[1]]] if candidates else []
+
+
+class ELANTierWindow():
+    ''' A read-only view of the annotations of a tier within a time window (see :meth:`ELANDoc.window`)
+
+    Annotations are not copied, the view keeps an index range into the span index of the tier
+    (see :attr:`ELANTier.span_index`) and the few annotations that start before the window.
+    '''
+
+    def __init__(self, window, tier):
+        self.window = window
+        self.tier = tier
+        index = tier.span_index
+        self.__lo = bisect_left(index.starts, window.from_ms)
+        self.__hi = bisect_left(index.starts, window.to_ms)
+        # annotations that start before the window but reach into it
+        self.__head = tuple(a for a in index.at(window.from_ms) if a.from_ts.value < window.from_ms < a.to_ts.value)
+
+    @property
+    def ID(self):
+        return self.tier.ID
+
+    @property
+    def participant(self):
+        return self.tier.participant
+
+    @property
+    def parent_ref(self):
+        return self.tier.parent_ref
+
+    @property
+    def linguistic_type(self) -> LinguisticType:
+        return self.tier.linguistic_type
+
+    def __iter__(self):
+        yield from self.__head
+        annotations = self.tier.span_index.annotations
+        for i in range(self.__lo, self.__hi):
+            yield annotations[i]
+
+    def __len__(self):
+        return len(self.__head) + self.__hi - self.__lo
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if idx < 0 or idx >= len(self):
+            raise IndexError("Annotation index out of range")
+        if idx < len(self.__head):
+            return self.__head[idx]
+        return self.tier.span_index.annotations[self.__lo + idx - len(self.__head)]
+
+    def spans(self, clip=True):
+        ''' Iterate through (annotation, start, end) tuples where times (in milliseconds) are relative to the window start
+
+        :param clip: Clip times to the window boundaries
+        '''
+        window = self.window
+        for ann in self:
+            yield ann, window.shift(ann.from_ts, clip=clip), window.shift(ann.to_ts, clip=clip)
+
+    def __repr__(self):
+        return 'TierWindow(ID={}, from_ms={}, to_ms={})'.format(self.ID, self.window.from_ms, self.window.to_ms)
+
+
+class ELANDocWindow():
+    ''' A read-only view of an ELANDoc within a time window [from_ms, to_ms) (see :meth:`ELANDoc.window`) '''
+
+    def __init__(self, doc, from_ms, to_ms):
+        if from_ms is None or to_ms is None or from_ms >= to_ms:
+            raise ValueError("Invalid time window ({}, {})".format(from_ms, to_ms))
+        self.doc = doc
+        self.from_ms = from_ms
+        self.to_ms = to_ms
+        self.__tiers = {}  # tier windows are created on first use
+
+    @property
+    def duration(self):
+        ''' Duration of this window (in milliseconds) '''
+        return self.to_ms - self.from_ms
+
+    def shift(self, ts, clip=True):
+        ''' Convert a time point into milliseconds relative to the window start
+
+        :param ts: A TimeSlot, a VTT timestamp string or a number (in milliseconds)
+        :param clip: Clip the result to the window boundaries
+        '''
+        ms = _to_ms(ts)
+        if ms is None:
+            return None
+        ms -= self.from_ms
+        return min(max(ms, 0), self.duration) if clip else ms
+
+    def __getitem__(self, tierID) -> ELANTierWindow:
+        tier_window = self.__tiers.get(tierID)
+        if tier_window is None:
+            tier_window = self.__tiers[tierID] = ELANTierWindow(self, self.doc[tierID])
+        return tier_window
+
+    def __iter__(self):
+        return (self[t.ID] for t in self.doc.tiers())
+
+    def tiers(self):
+        return tuple(self)
+
+    def to_csv_rows(self, clip=True) -> CSVTable:
+        ''' Convert this window into a CSV-friendly structure with times relative to the window start (see :meth:`ELANDoc.to_csv_rows`) '''
+        rows = []
+        for tier in self:
+            for ann, start, end in tier.spans(clip=clip):
+                _from_ts = f"{start / 1000:.3f}" if start is not None else None
+                _to_ts = f"{end / 1000:.3f}" if end is not None else None
+                _duration = f"{(end - start) / 1000:.3f}" if start is not None and end is not None and end > start else None
+                rows.append((tier.ID, tier.participant, _from_ts, _to_ts, _duration, ann.value))
+        return rows
+
+    def write_eaf(self, path, encoding='utf-8'):
+        ''' Write this window to an EAF file with times relative to the window start
+
+        Times are clipped to the window and the window start is recorded as the time origin
+        of the media so that the clip stays aligned with the original recording.
+        '''
+        with self.doc._eaf_writer(path, encoding, time_origin=self.from_ms if self.doc.media_url else None) as writer:
+            for tier in self:
+                writer.add_tier(tier.ID, tier.tier._type_ref_id, participant=tier.participant,
+                                parent_ref=tier.parent_ref, default_locale=tier.tier.default_locale)
+                for ann, start, end in tier.spans():
+                    if isinstance(ann, ELANTimeAnnotation):
+                        writer.add_annotation(tier.ID, start, end, ann.value, ID=ann.ID, cve_ref=ann.cve_ref)
+                    else:
+                        writer.add_ref_annotation(tier.ID, ann.ref, ann.value, previous=ann.previous, ID=ann.ID, cve_ref=ann.cve_ref)
+            self.doc._write_eaf_types(writer)
+
+    def __repr__(self):
+        return 'ELANDocWindow(from_ms={}, to_ms={})'.format(self.from_ms, self.to_ms)
+
+
 def __resolve(elan_doc):
     ''' Ensure that everything is linked together (e.g. tiers, vocabs, etc.) '''
     # link linguistic_types -> vocabs
@@ -577,55 +1814,1214 @@ def __resolve(elan_doc):
         if tier.parent_ref is not None:
             tier.parent = elan_doc[tier.parent_ref]
             elan_doc[tier.parent_ref].children.append(tier)
+    # link ref annotations -> referenced annotations
+    elan_doc._resolve_annotations()
+
 
+def _order_by_previous(annotations):
+    ''' [Internal function] Order sibling ref annotations by following their PREVIOUS_ANNOTATION chains
 
-def parse_eaf_stream(eaf_stream):
+    Annotations that are not reachable from the start of a chain keep their document order (at the end).
+    '''
+    if all(ann.previous is None for ann in annotations):
+        return annotations
+    next_map = {ann.previous: ann for ann in annotations if ann.previous is not None}
+    ids = {ann.ID for ann in annotations}
+    ordered = []
+    seen = set()
+    for head in annotations:
+        if head.previous is not None and head.previous in ids:
+            continue
+        ann = head
+        while ann is not None and ann.ID not in seen:
+            seen.add(ann.ID)
+            ordered.append(ann)
+            ann = next_map.get(ann.ID)
+    if len(ordered) < len(annotations):
+        ordered.extend(ann for ann in annotations if ann.ID not in seen)
+    return ordered
+
+
+def _make_tier_filter(tiers=None, participants=None, linguistic_types=None):
+    ''' [Internal function] Create a predicate that selects TIER XML nodes by tier IDs, participants and linguistic types
+
+    Return None when everything should be selected
+    '''
+    if tiers is None and participants is None and linguistic_types is None:
+        return None
+    tiers = {tiers} if isinstance(tiers, str) else set(tiers) if tiers is not None else None
+    participants = {participants} if isinstance(participants, str) else set(participants) if participants is not None else None
+    linguistic_types = {linguistic_types} if isinstance(linguistic_types, str) else set(linguistic_types) if linguistic_types is not None else None
+
+    def _accept(tier_node):
+        if tiers is not None and tier_node.get('TIER_ID') not in tiers:
+            return False
+        if participants is not None and (tier_node.get('PARTICIPANT') or '') not in participants:
+            return False
+        if linguistic_types is not None and tier_node.get('LINGUISTIC_TYPE_REF') not in linguistic_types:
+            return False
+        return True
+    return _accept
+
+
+# tags that parse_eaf_stream() needs events for
+EAF_PARSE_TAGS = ('ANNOTATION_DOCUMENT', 'HEADER', 'TIME_ORDER', 'TIME_SLOT', 'TIER', 'ANNOTATION',
+                  'LINGUISTIC_TYPE', 'CONSTRAINT', 'CONTROLLED_VOCABULARY')
+# lxml parses faster but accessing its elements from Python is slower than xml.etree.ElementTree,
+# so 'auto' only uses lxml for inventory scans and filtered parses where most elements are skipped
+XML_BACKENDS = ('auto', 'lxml', 'etree')
+
+
+@contextmanager
+def _gc_paused():
+    ''' [Internal function] Pause cyclic garbage collection while millions of small objects are being created '''
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+
+def _get_lxml_etree():
+    ''' [Internal function] Return lxml.etree module if lxml is available, otherwise None '''
+    try:
+        from lxml import etree
+        return etree
+    except ImportError:
+        return None
+
+
+class _UTF8Reader():
+    ''' [Internal function] Wrap a text stream as a UTF-8 encoded byte stream (lxml can only read bytes) '''
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def read(self, size=-1):
+        return self.stream.read(size).encode('utf-8')
+
+
+def _iterparse_eaf(eaf_stream, backend='auto'):
+    ''' [Internal function] Iterate through (event, element) pairs of an EAF stream using the selected XML backend
+
+    When backend is 'auto', lxml will be used if it is available. When lxml is not available,
+    xml.etree.ElementTree will be used instead.
+    '''
+    if backend not in XML_BACKENDS:
+        raise ValueError("Invalid XML backend ({}), must be one of {}".format(backend, ', '.join(XML_BACKENDS)))
+    if backend != 'etree':
+        lxml_etree = _get_lxml_etree()
+        if lxml_etree is not None:
+            kwargs = {}
+            if hasattr(eaf_stream, 'read') and isinstance(eaf_stream.read(0), str):
+                # the text has been decoded already, the encoding declaration must be ignored
+                eaf_stream = _UTF8Reader(eaf_stream)
+                kwargs['encoding'] = 'utf-8'
+            return lxml_etree.iterparse(eaf_stream, events=('start', 'end'), tag=EAF_PARSE_TAGS, huge_tree=True, **kwargs)
+        elif backend == 'lxml':
+            getLogger().warning("lxml is not available, xml.etree.ElementTree will be used instead")
+    return ET.iterparse(eaf_stream, events=('start', 'end'))
+
+
+def parse_eaf_stream(eaf_stream, tiers=None, participants=None, linguistic_types=None, inventory=False, backend='auto'):
     ''' Parse an EAF text stream and return an ELAN object
 
+    When any of tiers, participants, or linguistic_types is provided, only tiers that match all of
+    the given filters will be loaded. Annotations of excluded tiers are skipped without being converted
+    into annotation objects. A selected tier whose parent tier is excluded is rejected with a ValueError.
+
+    When inventory is True, time slots and annotations will not be loaded, annotations are only counted per tier
+    (see :attr:`ELANTier.annotation_count`).
+
     :param eaf_stream: a text-based stream object
     :type eaf_stream: Text I/O
+    :param tiers: Only load tiers with these IDs
+    :param participants: Only load tiers of these participants
+    :param linguistic_types: Only load tiers of these linguistic types (LINGUISTIC_TYPE_REF)
+    :param inventory: Only read metadata, tiers, linguistic types, constraints and vocabularies
+    :param backend: XML parser, 'lxml', 'etree' (xml.etree.ElementTree), or 'auto'.
+                    'auto' uses lxml (when it is installed) for inventory scans and filtered parses
+                    and xml.etree.ElementTree otherwise. lxml falls back to xml.etree.ElementTree when it is not installed.
     :return: an ELANDoc object
     :rtype: texttaglib.elan.ELANDoc
     '''
     elan_doc = ELANDoc()
+    elan_doc.inventory = inventory
     current_tier = None
-    for event, elem in ET.iterparse(eaf_stream, events=('start', 'end')):
-        if event == 'start':
-            if elem.tag == 'ANNOTATION_DOCUMENT':
-                elan_doc._update_info_xml(elem)
-            elif elem.tag == 'TIER':
-                current_tier = elan_doc._add_tier_xml(elem)
-        elif event == 'end':
-            if elem.tag == 'HEADER':
-                elan_doc._update_header_xml(elem)
-                elem.clear()  # no need to keep header node in memory
-            elif elem.tag == 'TIME_SLOT':
-                elan_doc._add_timeslot_xml(elem)
-                elem.clear()
-            elif elem.tag == 'ANNOTATION':
-                current_tier._add_annotation_xml(elem)
-                elem.clear()
-            elif elem.tag == 'LINGUISTIC_TYPE':
-                elan_doc._add_linguistic_type_xml(elem)
-                elem.clear()
-            elif elem.tag == 'CONSTRAINT':
-                elan_doc._add_constraint_xml(elem)
-                elem.clear()
-            elif elem.tag == 'CONTROLLED_VOCABULARY':
-                elan_doc._add_vocab_xml(elem)
-                elem.clear()
-    __resolve(elan_doc)  # link parts together
+    current_count = 0
+    accept_tier = _make_tier_filter(tiers, participants, linguistic_types)
+    skipped_tiers = set()
+    if backend == 'auto' and not inventory and accept_tier is None:
+        backend = 'etree'  # see XML_BACKENDS, lxml is slower when every element is converted
+    with _gc_paused():
+        for event, elem in _iterparse_eaf(eaf_stream, backend=backend):
+            tag = elem.tag  # lxml creates a new string each time tag is accessed
+            if event == 'end':
+                # most frequent elements first
+                if tag == 'ANNOTATION':
+                    if current_tier is not None:
+                        if inventory:
+                            current_count += 1
+                        else:
+                            elan_doc._add_annotation(current_tier._add_annotation_xml(elem))
+                    elem.clear()
+                elif tag == 'TIME_SLOT':
+                    if not inventory:
+                        elan_doc._add_timeslot_xml(elem)
+                    elem.clear()
+                elif tag == 'TIME_ORDER':
+                    elem.clear()
+                elif tag == 'TIER':
+                    if inventory and current_tier is not None:
+                        current_tier._set_annotation_count(current_count)
+                    elem.clear()
+                elif tag == 'HEADER':
+                    elan_doc._update_header_xml(elem)
+                    elem.clear()  # no need to keep header node in memory
+                elif tag == 'LINGUISTIC_TYPE':
+                    elan_doc._add_linguistic_type_xml(elem)
+                    elem.clear()
+                elif tag == 'CONSTRAINT':
+                    elan_doc._add_constraint_xml(elem)
+                    elem.clear()
+                elif tag == 'CONTROLLED_VOCABULARY':
+                    elan_doc._add_vocab_xml(elem)
+                    elem.clear()
+            elif event == 'start':
+                if tag == 'ANNOTATION_DOCUMENT':
+                    elan_doc._update_info_xml(elem)
+                elif tag == 'TIER':
+                    if accept_tier is None or accept_tier(elem):
+                        if elem.get('PARENT_REF') in skipped_tiers:
+                            raise ValueError("Tier {} cannot be loaded because its parent tier ({}) was excluded".format(elem.get('TIER_ID'), elem.get('PARENT_REF')))
+                        current_tier = elan_doc._add_tier_xml(elem)
+                        current_count = 0
+                    else:
+                        skipped_tiers.add(elem.get('TIER_ID'))
+                        current_tier = None
+        if skipped_tiers:
+            for tier in elan_doc.tiers():
+                if tier.parent_ref in skipped_tiers:
+                    raise ValueError("Tier {} cannot be loaded because its parent tier ({}) was excluded".format(tier.ID, tier.parent_ref))
+        __resolve(elan_doc)  # link parts together
+    return elan_doc
+
+
+# ----------------------------------------------------------------------
+# Writer
+# ----------------------------------------------------------------------
+
+EAF_XSD = 'http://www.mpi.nl/tools/elan/EAFv3.0.xsd'
+
+
+def _xml_attrs(**attrib):
+    ''' [Internal function] Format XML attributes, attributes with None values are skipped '''
+    return ''.join(' {}="{}"'.format(k, escape(str(v), {'"': '&quot;'})) for k, v in attrib.items() if v is not None)
+
+
+class EAFWriter():
+    ''' Write an EAF file incrementally
+
+    Annotations of each tier are spooled to a temporary file as they are added and the
+    EAF file is assembled when the writer is closed, so the XML tree is never held in memory
+    (only a map of distinct time values and the set of used annotation IDs are kept).
+    Time slots are deduplicated by value and their IDs are assigned as they are first used.
+
+    >>> with EAFWriter('output.eaf', author='ASR') as writer:
+    ...     writer.add_linguistic_type('Utterance')
+    ...     writer.add_tier('Speaker1', 'Utterance', participant='Speaker1')
+    ...     writer.add_annotation('Speaker1', 0, 1500, 'hello')
+    '''
+
+    ALIGNABLE_TEMPLATE = ('        <ANNOTATION>\n            <ALIGNABLE_ANNOTATION{} TIME_SLOT_REF1="{}" TIME_SLOT_REF2="{}">\n'
+                          '                <ANNOTATION_VALUE>{}</ANNOTATION_VALUE>\n'
+                          '            </ALIGNABLE_ANNOTATION>\n        </ANNOTATION>\n')
+    REF_TEMPLATE = ('        <ANNOTATION>\n            <REF_ANNOTATION{}>\n'
+                    '                <ANNOTATION_VALUE>{}</ANNOTATION_VALUE>\n'
+                    '            </REF_ANNOTATION>\n        </ANNOTATION>\n')
+
+    def __init__(self, path, author='', date=None, fileformat='3.0', version='3.0', media_file='', time_units='milliseconds',
+                 media_url=None, mime_type=None, relative_media_url=None, time_origin=None, encoding='utf-8'):
+        self.path = path
+        self.encoding = encoding
+        self.author = author
+        self.date = date
+        self.fileformat = fileformat
+        self.version = version
+        self.media_file = media_file
+        self.time_units = time_units
+        self.media_url = media_url
+        self.mime_type = mime_type
+        self.relative_media_url = relative_media_url
+        self.time_origin = time_origin
+        self.properties = OrderedDict()
+        self.closed = False
+        self.__slots = {}  # time value -> slot number
+        self.__unaligned_slots = []  # numbers of slots without time values
+        self.__shared_slots = {}  # id of an unaligned TimeSlot -> (TimeSlot, slot number)
+        self.__slot_count = 0
+        self.__annotation_count = 0
+        self.__last_generated_id = None
+        self.__annotation_ids = set()
+        self.__tiers = OrderedDict()  # tier ID -> (attributes, spool file)
+        self.__linguistic_types = []
+        self.__constraints = []
+        self.__vocabs = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._discard()
+
+    def _slot(self, ts):
+        ''' [Internal function] Get the slot ID of a time value, a new slot is created when needed
+
+        Unaligned TimeSlot objects are keyed by identity, so annotations that share one (e.g. in Time_Subdivision chains)
+        still share it in the output. Other unaligned times (None) always get a new slot.
+        '''
+        ms = _to_ms(ts)
+        if ms is not None:
+            slot_number = self.__slots.get(ms)
+            if slot_number is not None:
+                return 'ts{}'.format(slot_number)
+        elif isinstance(ts, TimeSlot) and id(ts) in self.__shared_slots:
+            return 'ts{}'.format(self.__shared_slots[id(ts)][1])
+        self.__slot_count += 1
+        if ms is None:
+            self.__unaligned_slots.append(self.__slot_count)
+            if isinstance(ts, TimeSlot):
+                self.__shared_slots[id(ts)] = (ts, self.__slot_count)  # keep ts alive so that its id is not reused
+        else:
+            self.__slots[ms] = self.__slot_count
+        return 'ts{}'.format(self.__slot_count)
+
+    def _spool(self, tier_id):
+        ''' [Internal function] Get the spool file of a tier '''
+        if self.closed:
+            raise ValueError("EAFWriter is already closed")
+        if tier_id not in self.__tiers:
+            raise ValueError("Tier {} does not exist".format(repr(tier_id)))
+        return self.__tiers[tier_id][1]
+
+    def _new_annotation_id(self, ID):
+        ''' [Internal function] Generate an annotation ID when none is given, generated IDs skip IDs that are already used '''
+        self.__annotation_count += 1
+        if ID is None:
+            while 'a{}'.format(self.__annotation_count) in self.__annotation_ids:
+                self.__annotation_count += 1
+            ID = 'a{}'.format(self.__annotation_count)
+            self.__last_generated_id = self.__annotation_count
+        elif ID in self.__annotation_ids:
+            raise ValueError("Duplicated annotation ID ({})".format(ID))
+        self.__annotation_ids.add(ID)
+        return ID
+
+    def add_property(self, name, value):
+        self.properties[name] = value
+
+    def add_tier(self, tier_id, linguistic_type, participant=None, parent_ref=None, default_locale=None):
+        ''' Add a new tier, tiers are written in the order they are added '''
+        if tier_id in self.__tiers:
+            raise ValueError("Duplicated tier ID ({})".format(tier_id))
+        attrib = _xml_attrs(DEFAULT_LOCALE=default_locale, LINGUISTIC_TYPE_REF=linguistic_type,
+                            PARENT_REF=parent_ref, PARTICIPANT=participant, TIER_ID=tier_id)
+        self.__tiers[tier_id] = (attrib, tempfile.TemporaryFile('w+', encoding=self.encoding))
+
+    def add_annotation(self, tier_id, from_ts, to_ts, value, ID=None, cve_ref=None):
+        ''' Add a time-alignable annotation to a tier
+
+        :param from_ts: A TimeSlot, a VTT timestamp string, a number (in milliseconds) or None for unaligned slots
+        :param to_ts: A TimeSlot, a VTT timestamp string, a number (in milliseconds) or None for unaligned slots
+        :return: The annotation ID
+        '''
+        spool = self._spool(tier_id)
+        ID = self._new_annotation_id(ID)
+        spool.write(self.ALIGNABLE_TEMPLATE.format(_xml_attrs(ANNOTATION_ID=ID, CVE_REF=cve_ref), self._slot(from_ts),
+                                                   self._slot(to_ts), escape(value) if value else ''))
+        return ID
+
+    def add_ref_annotation(self, tier_id, ref, value, previous=None, ID=None, cve_ref=None):
+        ''' Add a reference annotation to a tier
+
+        :param ref: ID of the parent annotation
+        :param previous: ID of the previous annotation (for symbolic subdivisions)
+        :return: The annotation ID
+        '''
+        spool = self._spool(tier_id)
+        ID = self._new_annotation_id(ID)
+        spool.write(self.REF_TEMPLATE.format(_xml_attrs(ANNOTATION_ID=ID, ANNOTATION_REF=ref, CVE_REF=cve_ref, PREVIOUS_ANNOTATION=previous),
+                                             escape(value) if value else ''))
+        return ID
+
+    def add_linguistic_type(self, type_id, time_alignable=True, constraints=None, controlled_vocabulary_ref=None, **kwargs):
+        ''' Add a linguistic type, extra keyword arguments are written as attributes (e.g. graphic_references=False) '''
+        attrib = {'constraints': constraints, 'controlled_vocabulary_ref': controlled_vocabulary_ref,
+                  'linguistic_type_id': type_id, 'time_alignable': time_alignable}
+        attrib.update(kwargs)
+        attrib = {k.upper(): (('true' if v else 'false') if isinstance(v, bool) else v) for k, v in sorted(attrib.items())}
+        self.__linguistic_types.append(_xml_attrs(**attrib))
+
+    def add_constraint(self, stereotype, description=None):
+        self.__constraints.append(_xml_attrs(DESCRIPTION=description, STEREOTYPE=stereotype))
+
+    def add_vocab(self, vocab):
+        ''' Add a controlled vocabulary (an ELANVocab object) '''
+        lines = ['    <CONTROLLED_VOCABULARY{}>\n'.format(_xml_attrs(CV_ID=vocab.ID))]
+        if vocab.description is not None or vocab.lang_ref:
+            lines.append('        <DESCRIPTION{}>{}</DESCRIPTION>\n'.format(_xml_attrs(LANG_REF=vocab.lang_ref), escape(vocab.description or '')))
+        for entry in vocab.entries:
+            lines.append('        <CV_ENTRY_ML{}>\n            <CVE_VALUE{}>{}</CVE_VALUE>\n        </CV_ENTRY_ML>\n'.format(
+                _xml_attrs(CVE_ID=entry.ID), _xml_attrs(DESCRIPTION=entry.description, LANG_REF=entry.lang_ref),
+                escape(entry.value if entry.value else '')))
+        lines.append('    </CONTROLLED_VOCABULARY>\n')
+        self.__vocabs.append(''.join(lines))
+
+    def close(self):
+        ''' Assemble the EAF file from the header, time order and tier spools '''
+        if self.closed:
+            return
+        if self.__last_generated_id is not None and 'lastUsedAnnotationId' not in self.properties:
+            self.properties['lastUsedAnnotationId'] = self.__last_generated_id
+        with open(self.path, 'w', encoding=self.encoding) as outfile:
+            outfile.write('<?xml version="1.0" encoding="{}"?>\n'.format(self.encoding.upper()))
+            outfile.write('<ANNOTATION_DOCUMENT{}>\n'.format(_xml_attrs(**{
+                'AUTHOR': self.author if self.author is not None else '', 'DATE': self.date,
+                'FORMAT': self.fileformat, 'VERSION': self.version,
+                'xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance', 'xsi:noNamespaceSchemaLocation': EAF_XSD})))
+            outfile.write('    <HEADER{}>\n'.format(_xml_attrs(MEDIA_FILE=self.media_file if self.media_file is not None else '',
+                                                               TIME_UNITS=self.time_units)))
+            if self.media_url:
+                outfile.write('        <MEDIA_DESCRIPTOR{}/>\n'.format(_xml_attrs(
+                    MEDIA_URL=self.media_url, MIME_TYPE=self.mime_type, RELATIVE_MEDIA_URL=self.relative_media_url,
+                    TIME_ORIGIN=self.time_origin)))
+            for name, value in self.properties.items():
+                outfile.write('        <PROPERTY{}>{}</PROPERTY>\n'.format(_xml_attrs(NAME=name), escape(str(value) if value is not None else '')))
+            outfile.write('    </HEADER>\n    <TIME_ORDER>\n')
+            for ms in sorted(self.__slots):
+                outfile.write('        <TIME_SLOT TIME_SLOT_ID="ts{}" TIME_VALUE="{}"/>\n'.format(self.__slots[ms], ms))
+            for slot_number in self.__unaligned_slots:
+                outfile.write('        <TIME_SLOT TIME_SLOT_ID="ts{}"/>\n'.format(slot_number))
+            outfile.write('    </TIME_ORDER>\n')
+            for attrib, spool in self.__tiers.values():
+                outfile.write('    <TIER{}>\n'.format(attrib))
+                spool.seek(0)
+                shutil.copyfileobj(spool, outfile)
+                outfile.write('    </TIER>\n')
+            for attrib in self.__linguistic_types:
+                outfile.write('    <LINGUISTIC_TYPE{}/>\n'.format(attrib))
+            for attrib in self.__constraints:
+                outfile.write('    <CONSTRAINT{}/>\n'.format(attrib))
+            for vocab in self.__vocabs:
+                outfile.write(vocab)
+            outfile.write('</ANNOTATION_DOCUMENT>\n')
+        self._discard()
+
+    def _discard(self):
+        ''' [Internal function] Close and remove all spool files '''
+        for _, spool in self.__tiers.values():
+            spool.close()
+        self.closed = True
+
+
+# ----------------------------------------------------------------------
+# Cache
+# ----------------------------------------------------------------------
+
+CACHE_VERSION = 1
+DEFAULT_CACHE_SIZE = 512 * 1024 * 1024  # 512 MB
+
+
+def _default_cache_dir():
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'texttaglib', 'eaf')
+
+
+def _doc_from_compact(data) -> ELANDoc:
+    ''' [Internal function] Rebuild and resolve an ELANDoc object from its compact form '''
+    with _gc_paused():
+        elan_doc = ELANDoc._from_compact(data)
+        __resolve(elan_doc)
     return elan_doc
 
 
-def open_eaf(eaf_path, encoding='utf-8', *args, **kwargs) -> ELANDoc:
+def _normalise_param(value):
+    ''' [Internal function] Turn a name or a collection of names into a sorted tuple so that equal filters have equal cache keys '''
+    if isinstance(value, str):
+        return (value,)
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return tuple(sorted(set(value)))
+    return value
+
+
+class EAFCache():
+
+    ''' An on-disk cache of parsed ELANDoc objects
+
+    Entries are keyed by file path, size and modification time (or by file content when use_hash is True)
+    and by the parsing options. When the total size of the cache directory exceeds max_size,
+    the least recently used entries will be removed.
+
+    Cache entries are pickled, only use cache directories that are not writable by other users.
+
+    A cache hit skips XML parsing but still creates all TimeSlot, tier and annotation objects,
+    which is most of the loading time. On a synthetic EAF file with 200k annotations, loading from
+    the cache is about 2-6 times as fast as parsing (depending on the machine), not an order of magnitude.
+    '''
+
+    EXT = '.eafc'
+
+    def __init__(self, cache_dir=None, max_size=DEFAULT_CACHE_SIZE, use_hash=False):
+        self.cache_dir = str(cache_dir) if cache_dir else _default_cache_dir()
+        self.max_size = max_size
+        self.use_hash = use_hash
+
+    def key(self, eaf_path, encoding='utf-8', **params):
+        ''' Generate cache key for an EAF file and its parsing options
+
+        Collections of names (e.g. tiers=['a', 'b'], tiers=('b', 'a') and tiers={'a', 'b'}) and single names
+        (tiers='a' and tiers=['a']) select the same tiers and produce the same key.
+        '''
+        params = {k: _normalise_param(v) for k, v in params.items() if v is not None}
+        params['encoding'] = encoding
+        fingerprint = hashlib.sha1()
+        if self.use_hash:
+            with open(eaf_path, 'rb') as infile:
+                for chunk in iter(lambda: infile.read(1 << 20), b''):
+                    fingerprint.update(chunk)
+        else:
+            stat = os.stat(eaf_path)
+            fingerprint.update('{}|{}|{}'.format(os.path.abspath(eaf_path), stat.st_size, stat.st_mtime_ns).encode('utf-8'))
+        fingerprint.update(repr((CACHE_VERSION, sorted(params.items()))).encode('utf-8'))
+        return fingerprint.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key + EAFCache.EXT)
+
+    def get(self, eaf_path, encoding='utf-8', **params) -> ELANDoc:
+        ''' Get a cached ELANDoc object, return None if the file has not been cached or has been modified '''
+        entry_path = self._entry_path(self.key(eaf_path, encoding, **params))
+        try:
+            with open(entry_path, 'rb') as infile:
+                data = pickle.load(infile)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            getLogger().warning("Cache entry {} is broken and will be removed ({})".format(entry_path, e))
+            self._remove(entry_path)
+            return None
+        try:
+            os.utime(entry_path)  # mark entry as recently used
+        except OSError:
+            pass
+        return _doc_from_compact(data)
+
+    def put(self, eaf_path, elan_doc, encoding='utf-8', **params):
+        ''' Store a parsed ELANDoc object in the cache '''
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_path = self._entry_path(self.key(eaf_path, encoding, **params))
+        tmp_path = "{}.{}.tmp".format(entry_path, os.getpid())
+        with open(tmp_path, 'wb') as outfile:
+            pickle.dump(elan_doc._to_compact(), outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)  # atomic, other processes never see incomplete entries
+        self.evict()
+
+    def evict(self):
+        ''' Remove least recently used entries until the cache size is within max_size '''
+        if not os.path.isdir(self.cache_dir):
+            return
+        entries = []
+        total_size = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(EAFCache.EXT):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total_size += stat.st_size
+        entries.sort()
+        for _, size, entry_path in entries:
+            if total_size <= self.max_size:
+                break
+            self._remove(entry_path)
+            total_size -= size
+
+    def clear(self):
+        ''' Remove all cache entries '''
+        if os.path.isdir(self.cache_dir):
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith(EAFCache.EXT):
+                    self._remove(entry.path)
+
+    @staticmethod
+    def _remove(entry_path):
+        try:
+            os.remove(entry_path)
+        except FileNotFoundError:
+            pass
+
+
+def clear_cache(cache_dir=None):
+    ''' Remove all cached ELANDoc objects from a cache directory (the default cache directory if cache_dir is None) '''
+    EAFCache(cache_dir).clear()
+
+
+def open_eaf(eaf_path, encoding='utf-8', *args, tiers=None, participants=None, linguistic_types=None, cache=None, backend='auto', **kwargs) -> ELANDoc:
     ''' Read and parse an EAF file and return an ELANDoc object 
 
     :param eaf_path: Path to an EAF file
+    :param tiers: Only load tiers with these IDs
+    :param participants: Only load tiers of these participants
+    :param linguistic_types: Only load tiers of these linguistic types
+    :param cache: Use an on-disk cache of parsed documents. Set to True to use the default cache directory,
+                  a directory path, or an EAFCache object. The cache is not used by default.
+    :param backend: XML parser, 'lxml', 'etree', or 'auto' (see :func:`parse_eaf_stream`)
     :return: An ELANDoc object
     :rtype: texttaglib.elan.ELANDoc
     '''
-    
+    if cache:
+        if not isinstance(cache, EAFCache):
+            cache = EAFCache(cache if not isinstance(cache, bool) else None)
+        params = dict(encoding=encoding, tiers=tiers, participants=participants, linguistic_types=linguistic_types)
+        elan_doc = cache.get(eaf_path, **params)
+        if elan_doc is None:
+            elan_doc = open_eaf(eaf_path, encoding, *args, tiers=tiers, participants=participants, linguistic_types=linguistic_types,
+                                backend=backend, **kwargs)
+            cache.put(eaf_path, elan_doc, **params)
+        return elan_doc
     with chio.open(eaf_path, encoding=encoding, *args, **kwargs) as eaf_stream:
-        elan_doc = parse_eaf_stream(eaf_path)
+        elan_doc = parse_eaf_stream(eaf_stream, tiers=tiers, participants=participants, linguistic_types=linguistic_types, backend=backend)
         return elan_doc
+
+
+def scan_eaf(eaf_path, encoding='utf-8', *args, **kwargs) -> ELANDoc:
+    ''' Read the inventory of an EAF file (metadata, tiers, linguistic types, constraints and vocabularies)
+
+    Time slots and annotations are not loaded, only the number of annotations per tier is available
+    via :attr:`ELANTier.annotation_count`
+
+    :param eaf_path: Path to an EAF file
+    :return: An ELANDoc object with its inventory flag set to True
+    :rtype: texttaglib.elan.ELANDoc
+    '''
+    with chio.open(eaf_path, encoding=encoding, *args, **kwargs) as eaf_stream:
+        return parse_eaf_stream(eaf_stream, inventory=True)
+
+
+def iter_annotations(eaf_stream, tiers=None, participants=None, linguistic_types=None):
+    ''' Iterate through all annotations in an EAF stream as flat records without building an ELANDoc
+
+    The stream is read once and XML nodes are discarded as soon as they are read. Annotation values are not kept,
+    but EAF files do not declare which tiers have child tiers before those are read, so one integer per time slot
+    and one (start, end) pair per annotation are kept in memory until the end of the stream (for resolving the times
+    of ref annotations). Memory use therefore grows with the number of time slots and annotations, not with the size
+    of the file. Ref annotations inherit the time span of the annotation they refer to (looked up in the tier
+    given by PARENT_REF). If the referenced annotation comes later in the stream, start and end will be None.
+
+    :param eaf_stream: a text-based stream object
+    :param tiers: Only yield annotations of tiers with these IDs
+    :param participants: Only yield annotations of tiers of these participants
+    :param linguistic_types: Only yield annotations of tiers of these linguistic types
+    :return: A generator of AnnotationRecord objects
+    '''
+    accept_tier = _make_tier_filter(tiers, participants, linguistic_types)
+    time_slots = {}
+    tier_spans = {}  # tier ID -> {annotation ID -> (start, end)}
+    root = None
+    container = None  # the TIME_ORDER or TIER node that is being read
+    tier_id, participant, selected = None, '', False
+    spans, parent_spans = None, {}
+    for event, elem in ET.iterparse(eaf_stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            elif elem.tag == 'TIME_ORDER':
+                container = elem
+            elif elem.tag == 'TIER':
+                container = elem
+                tier_id = elem.get('TIER_ID')
+                participant = elem.get('PARTICIPANT') or ''
+                selected = accept_tier is None or accept_tier(elem)
+                parent_spans = tier_spans.get(elem.get('PARENT_REF'), {})
+                spans = tier_spans.setdefault(tier_id, {})
+        elif elem.tag == 'TIME_SLOT':
+            value = elem.get('TIME_VALUE')
+            time_slots[elem.get('TIME_SLOT_ID')] = int(value) if value is not None else None
+            container.remove(elem)
+        elif elem.tag == 'ANNOTATION':
+            node = elem.find('ALIGNABLE_ANNOTATION')
+            if node is not None:
+                ref = None
+                for slot_id in (node.get('TIME_SLOT_REF1'), node.get('TIME_SLOT_REF2')):
+                    if slot_id not in time_slots:
+                        raise ValueError("Time slot ID not found ({})".format(slot_id))
+                start, end = time_slots[node.get('TIME_SLOT_REF1')], time_slots[node.get('TIME_SLOT_REF2')]
+            else:
+                node = elem.find('REF_ANNOTATION')
+                if node is None:
+                    raise ValueError("ANNOTATION node must not be empty")
+                ref = node.get('ANNOTATION_REF')
+                start, end = parent_spans.get(ref, (None, None))
+            value_node = node.find('ANNOTATION_VALUE')
+            if value_node is None:
+                raise ValueError("{} node must contain an ANNOTATION_VALUE node".format(node.tag))
+            ann_id = node.get('ANNOTATION_ID')
+            spans[ann_id] = (start, end)
+            container.remove(elem)
+            if selected:
+                yield AnnotationRecord(tier_id, participant, start, end, value_node.text if value_node.text else '',
+                                       node.get('CVE_REF'), ref, ann_id)
+        elif elem.tag in ('TIER', 'TIME_ORDER'):
+            container = None
+            root.clear()
+
+
+# ----------------------------------------------------------------------
+# Corpus processing
+# ----------------------------------------------------------------------
+
+def find_eaf_files(*patterns, recursive=False) -> List[Path]:
+    ''' Collect EAF files from file paths, directories, and glob patterns
+
+    :param patterns: Paths to EAF files, directories that contain EAF files, or glob patterns
+    :param recursive: Look for EAF files in sub directories of the given directories
+    :return: A list of unique file paths (in the given order, files in the same directory are sorted)
+    '''
+    found = OrderedDict()
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = sorted(path.rglob('*.eaf') if recursive else path.glob('*.eaf'))
+        elif glob.has_magic(str(pattern)):
+            matches = sorted(Path(p) for p in glob.glob(str(pattern), recursive=recursive))
+        else:
+            matches = [path]
+        for match in matches:
+            found[match] = True
+    return list(found.keys())
+
+
+class CorpusResult(namedtuple('CorpusResult', ['path', 'value', 'error'])):
+    """ Result of processing a file in a corpus (see :func:`process_corpus`) """
+
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+def _process_corpus_file(job):
+    ''' [Internal function] Load and process one file in a worker process '''
+    path, fn, loader, kwargs = job
+    try:
+        return CorpusResult(path, fn(loader(path, **kwargs) if loader is not None else path), None)
+    except Exception as e:
+        return CorpusResult(path, None, "{}: {}".format(type(e).__name__, e))
+
+
+def process_corpus(paths, fn, jobs=None, loader=open_eaf, **kwargs) -> List[CorpusResult]:
+    ''' Process EAF files in parallel and collect the results in input order
+
+    Each file is loaded with loader (:func:`open_eaf` by default, extra keyword arguments are passed to it)
+    and the loaded object is passed to fn. When loader is None, fn receives the file path instead.
+    fn and loader must be picklable (i.e. module-level functions) when more than one job is used.
+    Failures are logged and reported in the results, they do not abort the run.
+
+    >>> def count_babyname(eaf):
+    ...     return sum(1 for t in eaf for a in t if 'BABYNAME' in a.value)
+    >>> results = process_corpus(find_eaf_files('data/transcript/'), count_babyname, jobs=8, linguistic_types='Utterance')
+    >>> total = sum(r.value for r in results if r.ok)
+
+    :param paths: A list of paths to EAF files
+    :param fn: A function that will be applied to each loaded file
+    :param jobs: Number of worker processes, defaults to the number of CPUs. Use jobs=1 to process files serially
+    :param loader: A function that loads a file path
+    :return: A list of CorpusResult objects (path, value, error) in the same order as paths
+    '''
+    job_list = [(path, fn, loader, kwargs) for path in paths]
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(job_list) < 2:
+        results = [_process_corpus_file(job) for job in job_list]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            chunksize = max(1, len(job_list) // (jobs * 4))
+            results = list(executor.map(_process_corpus_file, job_list, chunksize=chunksize))
+    for result in results:
+        if not result.ok:
+            getLogger().warning("Could not process {} ({})".format(result.path, result.error))
+    return results
+
+
+def _overlap_summary(elan_doc, tiers=None, participants=None, min_overlap=0):
+    ''' [Internal function] Summarise the overlaps of an ELANDoc (used by :func:`corpus_overlaps`) '''
+    return elan_doc.overlaps(tiers=tiers, participants=participants, min_overlap=min_overlap).summary()
+
+
+def corpus_overlaps(paths, tiers=None, participants=None, min_overlap=0, jobs=None) -> Tuple[dict, List[CorpusResult]]:
+    ''' Aggregate overlaps, gaps, pauses and turn transitions across EAF files (see :meth:`ELANDoc.overlaps`)
+
+    Files are processed in parallel (see :func:`process_corpus`). Files that cannot be processed
+    (e.g. when a given tier does not exist) are reported in the results and excluded from the totals.
+
+    :param paths: A list of paths to EAF files
+    :param tiers: Tier IDs to analyse in each file, all root tiers will be used by default
+    :param participants: Only analyse tiers of these participants
+    :param min_overlap: Minimum overlap duration in milliseconds
+    :param jobs: Number of worker processes, defaults to the number of CPUs. Use jobs=1 to process files serially
+    :return: A tuple of (totals, results) where each result contains the summary dict of a file
+    '''
+    fn = partial(_overlap_summary, tiers=tiers, participants=participants, min_overlap=min_overlap)
+    results = process_corpus(paths, fn, jobs=jobs)
+    totals = dd(int)
+    for result in results:
+        if result.ok:
+            for k, v in result.value.items():
+                totals[k] += v
+    return dict(totals), results
+
+
+def concat_columns(columns_list) -> AnnotationColumns:
+    ''' Concatenate AnnotationColumns objects and merge their string tables '''
+    np = _get_numpy()
+    fields = (('doc', 'docs'), ('tier', 'tier_ids'), ('participant', 'participants'), ('value', 'values'))
+    tables = {table_field: {} for _, table_field in fields}
+    parts = dd(list)
+    for columns in columns_list:
+        parts['start'].append(columns.start)
+        parts['end'].append(columns.end)
+        for code_field, table_field in fields:
+            table = tables[table_field]
+            mapping = np.array([table.setdefault(label, len(table)) for label in getattr(columns, table_field)], dtype=np.int32)
+            parts[code_field].append(mapping[getattr(columns, code_field)])
+    if not parts:
+        return _make_columns([])._replace(docs=())
+    return AnnotationColumns(start=np.concatenate(parts['start']), end=np.concatenate(parts['end']),
+                             **{code_field: np.concatenate(parts[code_field]) for code_field, _ in fields},
+                             **{table_field: tuple(tables[table_field]) for _, table_field in fields})
+
+
+def _doc_columns(elan_doc, tiers=None, participants=None):
+    ''' [Internal function] Export an ELANDoc as columns (used by :func:`corpus_columns`) '''
+    return elan_doc.to_columns(tiers=tiers, participants=participants)
+
+
+def corpus_columns(paths, tiers=None, participants=None, linguistic_types=None, jobs=None) -> Tuple[AnnotationColumns, List[CorpusResult]]:
+    ''' Export time-resolved annotations of many EAF files as one AnnotationColumns object (requires numpy)
+
+    Files are processed in parallel (see :func:`process_corpus`) and their file paths are used as doc labels.
+
+    >>> columns, results = corpus_columns(find_eaf_files('data/transcript/'), linguistic_types='Utterance', jobs=8)
+    >>> columns.talk_time(by='participant')
+    >>> columns.gaps(by='doc')
+
+    :param paths: A list of paths to EAF files
+    :param tiers: Tier IDs to export in each file, all tiers will be exported by default
+    :param participants: Only export tiers of these participants
+    :param linguistic_types: Only load tiers of these linguistic types
+    :param jobs: Number of worker processes, defaults to the number of CPUs. Use jobs=1 to process files serially
+    :return: A tuple of (columns, results), results contain errors of the files that could not be processed
+    '''
+    fn = partial(_doc_columns, tiers=tiers, participants=participants)
+    results = process_corpus(paths, fn, jobs=jobs, linguistic_types=linguistic_types)
+    columns = concat_columns(r.value._replace(docs=(str(r.path),)) for r in results if r.ok)
+    return columns, results
+
+
+CATALOGUE_HEADER = ('file', 'media_url', 'mime_type', 'tier', 'participant', 'linguistic_type', 'parent_ref', 'annotations')
+
+
+def _scan_catalogue_rows(eaf_path):
+    ''' [Internal function] Scan an EAF file and build its catalogue rows (one row per tier) '''
+    elan_doc = scan_eaf(eaf_path)
+    return [(str(eaf_path), elan_doc.media_url, elan_doc.mime_type, tier.ID, tier.participant,
+             tier._type_ref_id, tier.parent_ref, tier.annotation_count) for tier in elan_doc.tiers()]
+
+
+def scan_eaf_dir(dir_path, jobs=None, pattern='*.eaf', recursive=False) -> CSVTable:
+    ''' Scan all EAF files in a directory and build a catalogue table (one row per tier)
+
+    Files are scanned in parallel using a process pool (see :func:`process_corpus`).
+    Files that cannot be read are reported via logging and excluded from the catalogue.
+
+    :param dir_path: Path to a directory that contains EAF files
+    :param jobs: Number of worker processes, defaults to the number of CPUs. Use jobs=1 to scan serially
+    :param pattern: Glob pattern for selecting EAF files
+    :param recursive: Look for EAF files in sub directories
+    :return: A list of rows, columns are described in CATALOGUE_HEADER
+    '''
+    paths = sorted(Path(dir_path).rglob(pattern) if recursive else Path(dir_path).glob(pattern))
+    table = []
+    for result in process_corpus(paths, _scan_catalogue_rows, jobs=jobs, loader=None):
+        if result.ok:
+            table.extend(result.value)
+    return table
+
+
+# ----------------------------------------------------------------------
+# Validation
+# ----------------------------------------------------------------------
+
+class Problem(namedtuple('Problem', ['path', 'line', 'code', 'message'])):
+    """ A problem found in an EAF file (see :func:`validate`) """
+
+    __slots__ = ()
+
+    def __str__(self):
+        return "{}:{}: [{}] {}".format(self.path, self.line, self.code, self.message)
+
+
+class _EAFValidator():
+    ''' [Internal function] Check an EAF file in a single streaming pass
+
+    expat is used instead of ElementTree because it reports line numbers. References that may point
+    forward (parent tiers, linguistic types, vocabularies, referenced annotations) are checked at the end.
+    '''
+
+    def __init__(self, path=''):
+        self.path = str(path)
+        self.problems = []
+        self.parser = expat.ParserCreate()
+        self.parser.buffer_text = True
+        self.parser.StartElementHandler = self._start
+        self.parser.EndElementHandler = self._end
+        self.slots = {}  # slot ID -> time value
+        self.tiers = OrderedDict()  # tier ID -> (line, linguistic type ID, parent ref)
+        self.linguistic_types = {}  # linguistic type ID -> controlled vocabulary ID
+        self.vocabs = dd(set)  # vocabulary ID -> CV entry IDs
+        self.annotations = set()
+        self.refs = []  # (line, annotation ID, referred annotation ID) of ref annotations
+        self.cve_refs = []  # (line, annotation ID, tier ID, CVE_REF)
+        self.current_tier = None
+        self.current_vocab = None
+        self.pending_value = None  # (line, annotation ID) of an annotation without ANNOTATION_VALUE yet
+
+    def report(self, line, code, message):
+        self.problems.append(Problem(self.path, line, code, message))
+
+    def _annotation(self, line, attrs):
+        ''' [Internal function] Check attributes that alignable and ref annotations share '''
+        ann_id = attrs.get('ANNOTATION_ID')
+        if not ann_id:
+            self.report(line, 'missing_id', "Annotation without ANNOTATION_ID")
+        elif ann_id in self.annotations:
+            self.report(line, 'duplicate_annotation', "Duplicated annotation ID ({})".format(ann_id))
+        else:
+            self.annotations.add(ann_id)
+        if self.current_tier is None:
+            self.report(line, 'orphan_annotation', "Annotation {} is not inside a tier".format(ann_id))
+        elif attrs.get('CVE_REF'):
+            self.cve_refs.append((line, ann_id, self.current_tier, attrs['CVE_REF']))
+        self.pending_value = (line, ann_id)
+        return ann_id
+
+    def _start(self, tag, attrs):
+        line = self.parser.CurrentLineNumber
+        if tag == 'ALIGNABLE_ANNOTATION':
+            ann_id = self._annotation(line, attrs)
+            values = []
+            for ref_attr in ('TIME_SLOT_REF1', 'TIME_SLOT_REF2'):
+                slot_id = attrs.get(ref_attr)
+                if slot_id not in self.slots:
+                    self.report(line, 'missing_slot', "Annotation {} refers to an unknown time slot ({}={})".format(ann_id, ref_attr, slot_id))
+                values.append(self.slots.get(slot_id))
+            if values[0] is not None and values[1] is not None and values[0] >= values[1]:
+                self.report(line, 'invalid_span', "Annotation {} starts at {} but ends at {}".format(ann_id, values[0], values[1]))
+        elif tag == 'REF_ANNOTATION':
+            ann_id = self._annotation(line, attrs)
+            self.refs.append((line, ann_id, attrs.get('ANNOTATION_REF')))
+            if attrs.get('PREVIOUS_ANNOTATION'):
+                self.refs.append((line, ann_id, attrs['PREVIOUS_ANNOTATION']))
+        elif tag == 'ANNOTATION_VALUE':
+            self.pending_value = None
+        elif tag == 'TIME_SLOT':
+            slot_id = attrs.get('TIME_SLOT_ID')
+            value = attrs.get('TIME_VALUE')
+            if slot_id in self.slots:
+                self.report(line, 'duplicate_slot', "Duplicated time slot ID ({})".format(slot_id))
+            if value is not None:
+                try:
+                    value = int(value)
+                except ValueError:
+                    self.report(line, 'invalid_time', "Time slot {} has an invalid value ({})".format(slot_id, value))
+                    value = None
+            self.slots[slot_id] = value
+        elif tag == 'TIER':
+            tier_id = attrs.get('TIER_ID')
+            if tier_id in self.tiers:
+                self.report(line, 'duplicate_tier', "Duplicated tier ID ({})".format(tier_id))
+            else:
+                self.tiers[tier_id] = (line, attrs.get('LINGUISTIC_TYPE_REF'), attrs.get('PARENT_REF'))
+            self.current_tier = tier_id
+        elif tag == 'LINGUISTIC_TYPE':
+            self.linguistic_types[attrs.get('LINGUISTIC_TYPE_ID')] = (line, attrs.get('CONTROLLED_VOCABULARY_REF'))
+        elif tag == 'CONTROLLED_VOCABULARY':
+            self.current_vocab = attrs.get('CV_ID')
+            self.vocabs.setdefault(self.current_vocab, set())  # vocabularies without entries are known too
+        elif tag in ('CV_ENTRY_ML', 'CV_ENTRY') and self.current_vocab is not None:
+            self.vocabs[self.current_vocab].add(attrs.get('CVE_ID'))
+
+    def _end(self, tag):
+        if tag in ('ALIGNABLE_ANNOTATION', 'REF_ANNOTATION'):
+            if self.pending_value is not None:
+                line, ann_id = self.pending_value
+                self.report(line, 'missing_value', "Annotation {} does not have an ANNOTATION_VALUE".format(ann_id))
+                self.pending_value = None
+        elif tag == 'TIER':
+            self.current_tier = None
+        elif tag == 'CONTROLLED_VOCABULARY':
+            self.current_vocab = None
+
+    def _finish(self):
+        ''' [Internal function] Check references that can only be resolved after the whole file was read '''
+        for tier_id, (line, type_ref, parent_ref) in self.tiers.items():
+            if parent_ref is not None and parent_ref not in self.tiers:
+                self.report(line, 'dangling_parent', "Tier {} refers to an unknown parent tier ({})".format(tier_id, parent_ref))
+            if type_ref not in self.linguistic_types:
+                self.report(line, 'unknown_type', "Tier {} refers to an unknown linguistic type ({})".format(tier_id, type_ref))
+        for type_id, (line, vocab_id) in self.linguistic_types.items():
+            if vocab_id is not None and vocab_id not in self.vocabs:
+                self.report(line, 'unknown_vocab', "Linguistic type {} refers to an unknown controlled vocabulary ({})".format(type_id, vocab_id))
+        for line, ann_id, ref in self.refs:
+            if ref not in self.annotations:
+                self.report(line, 'unknown_ref', "Annotation {} refers to an unknown annotation ({})".format(ann_id, ref))
+        for line, ann_id, tier_id, cve_ref in self.cve_refs:
+            type_ref = self.tiers[tier_id][1] if tier_id in self.tiers else None
+            vocab_id = self.linguistic_types.get(type_ref, (None, None))[1]
+            if vocab_id is None or cve_ref not in self.vocabs.get(vocab_id, ()):
+                self.report(line, 'unknown_cve', "Annotation {} refers to an unknown CV entry ({})".format(ann_id, cve_ref))
+
+    def check(self, eaf_stream) -> List[Problem]:
+        ''' Check a binary EAF stream and return all problems sorted by line number '''
+        try:
+            self.parser.ParseFile(eaf_stream)
+        except expat.ExpatError as e:
+            self.report(e.lineno, 'xml', expat.ErrorString(e.code))
+        else:
+            self._finish()
+        self.problems.sort(key=lambda p: p.line)
+        return self.problems
+
+
+def validate_eaf(eaf_path) -> List[Problem]:
+    ''' Check an EAF file in a single streaming pass and collect all problems (see :func:`validate`) '''
+    with open(eaf_path, 'rb') as eaf_stream:
+        return _EAFValidator(eaf_path).check(eaf_stream)
+
+
+def validate(paths, jobs=None) -> List[CorpusResult]:
+    ''' Check EAF files in parallel without building ELANDoc objects
+
+    Each file is read once and every problem is reported with its line number:
+    malformed XML, duplicated time slot, tier or annotation IDs, invalid time values,
+    annotations that refer to unknown time slots or that do not end after they start,
+    dangling PARENT_REF, unknown linguistic types, unknown ANNOTATION_REF or PREVIOUS_ANNOTATION,
+    and CVE_REF values that are not entries of the controlled vocabulary of their tiers.
+
+    >>> for result in validate(find_eaf_files('data/transcript/'), jobs=8):
+    ...     for problem in result.value:
+    ...         print(problem)
+
+    :param paths: A path or a list of paths to EAF files
+    :param jobs: Number of worker processes, defaults to the number of CPUs. Use jobs=1 to check files serially
+    :return: A list of CorpusResult objects whose values are lists of Problem objects (empty for valid files)
+    '''
+    if isinstance(paths, (str, Path)):
+        paths = [paths]
+    return process_corpus(paths, validate_eaf, jobs=jobs, loader=None)
+
+
+# ----------------------------------------------------------------------
+# Search
+# ----------------------------------------------------------------------
+
+INDEX_VERSION = 1
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize_value(value):
+    ''' Split an annotation value into lowercased word tokens (for indexing and searching) '''
+    return TOKEN_PATTERN.findall(value.lower()) if value else []
+
+
+class SearchHit(namedtuple('SearchHit', ['path', 'tier', 'participant', 'start', 'end', 'value'])):
+    """ An annotation found by :class:`EAFIndex` (start and end are in milliseconds) """
+
+    __slots__ = ()
+
+    @property
+    def duration(self):
+        return self.end - self.start if self.start is not None and self.end is not None else None
+
+
+def _index_records(eaf_path):
+    ''' [Internal function] Read all annotations of an EAF file as (tier, participant, start, end, value) tuples '''
+    with chio.open(eaf_path, encoding='utf-8') as eaf_stream:
+        return [(r.tier, r.participant, r.start, r.end, r.value) for r in iter_annotations(eaf_stream)]
+
+
+class EAFIndex():
+
+    ''' A persistent inverted index over annotation values of EAF files in a directory
+
+    Each posting records the file, tier, participant and time span (in milliseconds) of an annotation.
+    :meth:`update` only re-indexes files that were added or modified (by size and modification time)
+    since the last update and saves the index to index_path.
+
+    >>> index = EAFIndex('data/transcript/')
+    >>> index.update(jobs=4)
+    >>> for hit in index.search('BABYNAME', participants=['Mother']):
+    ...     print(hit.path, hit.tier, hit.start, hit.end, hit.value)
+
+    The index is pickled, only store it in locations that are not writable by other users.
+    '''
+
+    INDEX_NAME = '.eafindex'
+
+    def __init__(self, dir_path, index_path=None, pattern='*.eaf', recursive=False):
+        self.dir_path = str(dir_path)
+        self.index_path = str(index_path) if index_path else os.path.join(self.dir_path, EAFIndex.INDEX_NAME)
+        self.pattern = pattern
+        self.recursive = recursive
+        self.files = {}  # path -> (size, mtime_ns)
+        self.records = {}  # path -> list of (tier, participant, start, end, value)
+        self.postings = {}  # token -> {path: [record indices]}
+        self.load()
+
+    def __len__(self):
+        return len(self.files)
+
+    def load(self):
+        ''' Load the index from index_path, an empty index will be used if it does not exist or is outdated '''
+        try:
+            with open(self.index_path, 'rb') as infile:
+                version, files, records, postings = pickle.load(infile)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            getLogger().warning("Index {} is broken and will be rebuilt ({})".format(self.index_path, e))
+            return
+        if version == INDEX_VERSION:
+            self.files, self.records, self.postings = files, records, postings
+
+    def save(self):
+        ''' Save the index to index_path '''
+        index_dir = os.path.dirname(self.index_path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(self.index_path, os.getpid())
+        with open(tmp_path, 'wb') as outfile:
+            pickle.dump((INDEX_VERSION, self.files, self.records, self.postings), outfile, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.index_path)
+
+    def _remove_file(self, path):
+        ''' [Internal function] Remove all postings of a file '''
+        for tier, participant, start, end, value in self.records.pop(path, ()):
+            for token in tokenize_value(value):
+                file_postings = self.postings.get(token)
+                if file_postings is not None:
+                    file_postings.pop(path, None)
+                    if not file_postings:
+                        del self.postings[token]
+        self.files.pop(path, None)
+
+    def _add_file(self, path, stat, records):
+        ''' [Internal function] Add postings of a file '''
+        self.files[path] = stat
+        self.records[path] = records
+        for idx, (tier, participant, start, end, value) in enumerate(records):
+            for token in set(tokenize_value(value)):
+                self.postings.setdefault(token, {}).setdefault(path, []).append(idx)
+
+    def update(self, jobs=None):
+        ''' Index new and modified files, drop deleted files, and save the index when something has changed
+
+        :param jobs: Number of worker processes for reading files (see :func:`process_corpus`)
+        :return: A tuple of (indexed, removed) file counts
+        '''
+        base = Path(self.dir_path)
+        paths = sorted(base.rglob(self.pattern) if self.recursive else base.glob(self.pattern))
+        current = {}
+        for path in paths:
+            stat = path.stat()
+            current[str(path)] = (stat.st_size, stat.st_mtime_ns)
+        removed = [p for p in self.files if p not in current]
+        changed = [p for p, stat in current.items() if self.files.get(p) != stat]
+        for path in removed:
+            self._remove_file(path)
+        for result in process_corpus(changed, _index_records, jobs=jobs, loader=None):
+            self._remove_file(result.path)
+            if result.ok:
+                self._add_file(result.path, current[result.path], result.value)
+        if removed or changed:
+            self.save()
+        return len(changed), len(removed)
+
+    def _hits(self, candidates, tiers=None, participants=None, accept=None):
+        ''' [Internal function] Build search hits from (path, record indices) pairs '''
+        tiers = {tiers} if isinstance(tiers, str) else set(tiers) if tiers is not None else None
+        participants = {participants} if isinstance(participants, str) else set(participants) if participants is not None else None
+        hits = []
+        for path, indices in candidates:
+            records = self.records[path]
+            for idx in indices:
+                tier, participant, start, end, value = records[idx]
+                if tiers is not None and tier not in tiers:
+                    continue
+                if participants is not None and participant not in participants:
+                    continue
+                if accept is not None and not accept(value):
+                    continue
+                hits.append(SearchHit(path, tier, participant, start, end, value))
+        return hits
+
+    def _candidates(self, tokens):
+        ''' [Internal function] Find records that contain all tokens '''
+        if not tokens:
+            return []
+        postings = [self.postings.get(token) for token in set(tokens)]
+        if not all(postings):
+            return []
+        postings.sort(key=len)  # start from the rarest token
+        candidates = []
+        for path in sorted(postings[0]):
+            indices = set(postings[0][path])
+            for other in postings[1:]:
+                if path not in other:
+                    break
+                indices.intersection_update(other[path])
+            else:
+                if indices:
+                    candidates.append((path, sorted(indices)))
+        return candidates
+
+    def search(self, query, tiers=None, participants=None) -> List[SearchHit]:
+        ''' Find annotations that contain all tokens of a query (case-insensitive) '''
+        return self._hits(self._candidates(tokenize_value(query)), tiers, participants)
+
+    def search_phrase(self, phrase, tiers=None, participants=None) -> List[SearchHit]:
+        ''' Find annotations that contain the tokens of a phrase in the same order (case-insensitive) '''
+        tokens = tokenize_value(phrase)
+        size = len(tokens)
+
+        def _accept(value):
+            value_tokens = tokenize_value(value)
+            return any(value_tokens[i:i + size] == tokens for i in range(len(value_tokens) - size + 1))
+        return self._hits(self._candidates(tokens), tiers, participants, accept=_accept)
+
+    def search_regex(self, pattern, tiers=None, participants=None, flags=0) -> List[SearchHit]:
+        ''' Find annotations with values that match a regular expression (using re.search) '''
+        regex = re.compile(pattern, flags)
+        candidates = ((path, range(len(self.records[path]))) for path in sorted(self.records))
+        return self._hits(candidates, tiers, participants, accept=lambda value: regex.search(value) is not None)
+
+
+def index_eaf_dir(dir_path, index_path=None, jobs=None, pattern='*.eaf', recursive=False) -> EAFIndex:
+    ''' Open the search index of a directory of EAF files and bring it up to date (see :class:`EAFIndex`) '''
+    index = EAFIndex(dir_path, index_path=index_path, pattern=pattern, recursive=recursive)
+    index.update(jobs=jobs)
+    return index
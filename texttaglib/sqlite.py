@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 
 '''
-TTL SQLite Data Access Layer
+TTL and ELAN SQLite Data Access Layer
 
 Latest version can be found at https://github.com/letuananh/texttaglib
 
@@ -31,12 +31,15 @@ Latest version can be found at https://github.com/letuananh/texttaglib
 
 ########################################################################
 
+import os
 import logging
+import sqlite3
 
 from .puchikarui import Schema, with_ctx
 from .chirptext import DataObject
 from .chirptext import ttl
-from .data import INIT_TTL_SQLITE
+from . import elan
+from .data import INIT_TTL_SQLITE, INIT_ELAN_SQLITE, INIT_ELAN_RTREE
 
 
 # ----------------------------------------------------------------------
@@ -261,3 +264,201 @@ class TTLSQLite(Schema):
         query = '''INSERT OR REPLACE INTO meta_cor VALUES (?, ?, ?)'''
         params = (name, key, value)
         return ctx.execute(query, params)
+
+
+# ----------------------------------------------------------------------
+# ELAN
+# ----------------------------------------------------------------------
+
+def _rtree_available():
+    ''' [Internal function] Check if the current SQLite library supports R*Tree indexes '''
+    try:
+        conn = sqlite3.connect(':memory:')
+        try:
+            conn.execute('CREATE VIRTUAL TABLE test_rtree USING rtree_i32(ID, start, end)')
+        finally:
+            conn.close()
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def _eaf_rows(eaf_path):
+    ''' [Internal function] Read an EAF file into rows for ELANSQLite (runs in worker processes) '''
+    eaf = elan.open_eaf(eaf_path)
+    stat = os.stat(eaf_path)
+    doc = (str(eaf_path), stat.st_size, stat.st_mtime_ns, eaf.author, eaf.date, eaf.fileformat, eaf.version,
+           eaf.media_file, eaf.time_units, eaf.media_url, eaf.mime_type, eaf.relative_media_url)
+    tiers = [(t.ID, t.participant, t._type_ref_id, t.parent_ref, t.default_locale) for t in eaf.tiers()]
+    slots = [(ts.ID, ts.value) for ts in eaf.time_order.values()]
+    annotations = []
+    for tier in eaf.tiers():
+        for ann in tier.annotations:
+            start = ann.from_ts.value if ann.from_ts is not None else None
+            end = ann.to_ts.value if ann.to_ts is not None else None
+            if isinstance(ann, elan.ELANTimeAnnotation):
+                annotations.append((tier.ID, ann.ID, ann.value, ann.cve_ref, ann.from_ts.ID, ann.to_ts.ID, None, None, start, end))
+            else:
+                annotations.append((tier.ID, ann.ID, ann.value, ann.cve_ref, None, None, ann.ref, ann.previous, start, end))
+    vocab_entries = [(v.ID, e.ID, e.lang_ref, e.value, e.description) for v in eaf.vocabs for e in v]
+    return doc, tiers, slots, annotations, vocab_entries
+
+
+class ELANSQLite(Schema):
+
+    ''' A SQLite database of ELAN transcripts
+
+    Each EAF file is stored in a single transaction using bulk inserts. Annotation time spans
+    (in milliseconds) are indexed with an R*Tree index when SQLite supports it.
+
+    >>> db = ELANSQLite('corpus.db')
+    >>> db.ingest(elan.find_eaf_files('data/transcript/'), jobs=8)
+    >>> for ann in db.query(from_ts='00:10:00', to_ts='00:20:00', participants='Mother', linguistic_types='Utterance'):
+    ...     print(ann.path, ann.tier, ann.start, ann.end, ann.value)
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.add_file(INIT_ELAN_SQLITE)
+        if _rtree_available():
+            self.add_file(INIT_ELAN_RTREE)
+        self.add_table('eaf_doc', ['ID', 'path', 'size', 'mtime_ns', 'author', 'date', 'fileformat', 'version',
+                                   'media_file', 'time_units', 'media_url', 'mime_type', 'relative_media_url']).set_id('ID')
+        self.add_table('eaf_tier', ['ID', 'docID', 'tierID', 'participant', 'type_ref', 'parent_ref', 'default_locale']).set_id('ID')
+        self.add_table('eaf_timeslot', ['docID', 'slotID', 'value'])
+        self.add_table('eaf_annotation', ['ID', 'docID', 'tid', 'annID', 'value', 'cve_ref', 'from_slot', 'to_slot',
+                                          'ref', 'previous', 'start', 'end']).set_id('ID')
+        self.add_table('eaf_vocab_entry', ['docID', 'vocabID', 'entryID', 'lang_ref', 'value', 'description'])
+
+    @staticmethod
+    def _has_rtree(ctx):
+        ''' [Internal function] Check if the span index exists in the database '''
+        return ctx.select_single("SELECT name FROM sqlite_master WHERE type='table' AND name='eaf_annotation_span'") is not None
+
+    @with_ctx
+    def is_current(self, eaf_path, ctx=None):
+        ''' Check if an EAF file has been ingested and not been modified since '''
+        stat = os.stat(eaf_path)
+        row = ctx.select_single('SELECT size, mtime_ns FROM eaf_doc WHERE path = ?', (str(eaf_path),))
+        return row is not None and (row['size'], row['mtime_ns']) == (stat.st_size, stat.st_mtime_ns)
+
+    def _delete_doc(self, cur, path, has_rtree):
+        ''' [Internal function] Remove a document and everything that belongs to it '''
+        row = cur.execute('SELECT ID FROM eaf_doc WHERE path = ?', (path,)).fetchone()
+        if row is None:
+            return
+        doc_id = row[0]
+        if has_rtree:
+            cur.execute('DELETE FROM eaf_annotation_span WHERE ID IN (SELECT ID FROM eaf_annotation WHERE docID = ?)', (doc_id,))
+        for table in ('eaf_annotation', 'eaf_vocab_entry', 'eaf_timeslot', 'eaf_tier'):
+            cur.execute('DELETE FROM {} WHERE docID = ?'.format(table), (doc_id,))
+        cur.execute('DELETE FROM eaf_doc WHERE ID = ?', (doc_id,))
+
+    def _store_rows(self, rows, ctx):
+        ''' [Internal function] Store rows of an EAF file (see _eaf_rows) in one transaction, return the new docID '''
+        doc, tiers, slots, annotations, vocab_entries = rows
+        has_rtree = self._has_rtree(ctx)
+        cur = ctx.conn.cursor()
+        with ctx.conn:  # commit once (or roll back) for the whole file
+            self._delete_doc(cur, doc[0], has_rtree)
+            cur.execute('INSERT INTO eaf_doc (path, size, mtime_ns, author, date, fileformat, version, media_file, '
+                        'time_units, media_url, mime_type, relative_media_url) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', doc)
+            doc_id = cur.lastrowid
+            cur.executemany('INSERT INTO eaf_tier (docID, tierID, participant, type_ref, parent_ref, default_locale) VALUES (?, ?, ?, ?, ?, ?)',
+                            ((doc_id,) + t for t in tiers))
+            tier_map = dict(cur.execute('SELECT tierID, ID FROM eaf_tier WHERE docID = ?', (doc_id,)).fetchall())
+            cur.executemany('INSERT INTO eaf_timeslot (docID, slotID, value) VALUES (?, ?, ?)', ((doc_id,) + s for s in slots))
+            cur.executemany('INSERT INTO eaf_annotation (docID, tid, annID, value, cve_ref, from_slot, to_slot, ref, previous, start, end) '
+                            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            ((doc_id, tier_map[a[0]]) + a[1:] for a in annotations))
+            cur.executemany('INSERT INTO eaf_vocab_entry (docID, vocabID, entryID, lang_ref, value, description) VALUES (?, ?, ?, ?, ?, ?)',
+                            ((doc_id,) + v for v in vocab_entries))
+            if has_rtree:
+                cur.execute('INSERT INTO eaf_annotation_span (ID, start, end) SELECT ID, start, end FROM eaf_annotation '
+                            'WHERE docID = ? AND start IS NOT NULL AND end IS NOT NULL AND start <= end', (doc_id,))
+        return doc_id
+
+    @with_ctx
+    def add_eaf(self, eaf_path, ctx=None):
+        ''' Store an EAF file (an existing copy of the same path will be replaced), return the new docID '''
+        return self._store_rows(_eaf_rows(eaf_path), ctx)
+
+    @with_ctx
+    def ingest(self, paths, jobs=None, force=False, ctx=None):
+        ''' Store many EAF files, files are read in parallel and written to the database one by one
+
+        :param paths: Paths to EAF files
+        :param jobs: Number of worker processes for reading files (see :func:`texttaglib.elan.process_corpus`)
+        :param force: Store all files even when they have not been modified since the last ingestion
+        :return: A list of CorpusResult objects (the value of each result is the new docID)
+        '''
+        paths = [p for p in paths if force or not self.is_current(p, ctx=ctx)]
+        batch_size = max(1, (jobs or os.cpu_count() or 1) * 4)  # keep only a few files in memory at a time
+        results = []
+        for idx in range(0, len(paths), batch_size):
+            for result in elan.process_corpus(paths[idx:idx + batch_size], _eaf_rows, jobs=jobs, loader=None):
+                if result.ok:
+                    try:
+                        result = result._replace(value=self._store_rows(result.value, ctx))
+                    except Exception as e:
+                        getLogger().warning("Could not store {} ({})".format(result.path, e))
+                        result = result._replace(value=None, error="{}: {}".format(type(e).__name__, e))
+                results.append(result)
+        return results
+
+    @with_ctx
+    def query(self, from_ts=None, to_ts=None, participants=None, tiers=None, linguistic_types=None, paths=None, value=None, ctx=None):
+        ''' Find annotations across all stored documents
+
+        Annotations that overlap [from_ts, to_ts] are found using the span index. Ref annotations are matched
+        by the time spans that they inherit from the annotations they refer to.
+
+        :param from_ts: A TimeSlot, a VTT timestamp string or a number (in milliseconds)
+        :param to_ts: A TimeSlot, a VTT timestamp string or a number (in milliseconds)
+        :param participants: Only select annotations of these participants
+        :param tiers: Only select annotations of tiers with these IDs
+        :param linguistic_types: Only select annotations of tiers with these linguistic types
+        :param paths: Only select annotations of these EAF files
+        :param value: An SQL LIKE pattern for annotation values
+        :return: A list of annotations sorted by path and time, with extra path, tier, participant, type_ref, start and end
+                 (in milliseconds) attributes. Time-alignable annotations are ELANTimeAnnotation objects and
+                 ref annotations are ELANRefAnnotation objects. Ref annotations are not linked to the annotations
+                 they refer to, so their inherited times are only available as start and end.
+        '''
+        _from, _to = elan._to_ms(from_ts), elan._to_ms(to_ts)
+        conditions = []
+        params = []
+        joins = ''
+        if _from is not None or _to is not None:
+            if self._has_rtree(ctx):
+                joins = ' JOIN eaf_annotation_span s ON s.ID = a.ID'
+                span = 's'
+            else:
+                span = 'a'
+            if _from is not None:
+                conditions.append('{}.end >= ?'.format(span))
+                params.append(_from)
+            if _to is not None:
+                conditions.append('{}.start <= ?'.format(span))
+                params.append(_to)
+        for column, values in (('t.participant', participants), ('t.tierID', tiers), ('t.type_ref', linguistic_types), ('d.path', paths)):
+            if values is not None:
+                values = [values] if isinstance(values, str) else [str(v) for v in values]
+                conditions.append('{} IN ({})'.format(column, ', '.join('?' * len(values))))
+                params.extend(values)
+        if value is not None:
+            conditions.append('a.value LIKE ?')
+            params.append(value)
+        query = ('SELECT d.path, t.tierID, t.participant, t.type_ref, a.annID, a.value, a.cve_ref, a.from_slot, a.to_slot, '
+                 'a.ref, a.previous, a.start, a.end FROM eaf_annotation a JOIN eaf_tier t ON t.ID = a.tid JOIN eaf_doc d ON d.ID = a.docID' + joins)
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY d.path, a.start, a.end, a.ID'
+        annotations = []
+        for path, tier, participant, type_ref, ann_id, ann_value, cve_ref, from_slot, to_slot, ref, previous, start, end in ctx.select(query, params):
+            extra = dict(cve_ref=cve_ref, path=path, tier=tier, participant=participant, type_ref=type_ref, start=start, end=end)
+            if from_slot is not None:
+                annotations.append(elan.ELANTimeAnnotation(ann_id, elan.TimeSlot(from_slot, start), elan.TimeSlot(to_slot, end), ann_value, **extra))
+            else:
+                annotations.append(elan.ELANRefAnnotation(ann_id, ref, previous, ann_value, **extra))
+        return annotations
@@ -31,15 +31,21 @@ Latest version can be found at https://github.com/letuananh/texttaglib
 
 ########################################################################
 
+import io
+import os
 import re
+import json
+import mmap
+import random
 import logging
 from difflib import ndiff
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple, deque
+from concurrent.futures import ProcessPoolExecutor
 import warnings
 
 from .chirptext import DataObject, piter
 from .chirptext import chio
-from .chirptext.deko import is_kana, parse
+from .chirptext.deko import is_kana, parse, HIRAGANA, KATAKANA, KATA2HIRA_TRANS
 from .chirptext import ttl
 
 
@@ -52,6 +58,109 @@ def getLogger():
     return logging.getLogger(__name__)
 
 
+# ----------------------------------------------------------------------
+# Furigana cache
+# ----------------------------------------------------------------------
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+CACHED_FUNCTIONS = ('parse_furigana', 'from_furi', 'make_ruby_html')
+_MISSING = object()
+
+
+class LRUCache(object):
+    ''' A size-bounded least-recently-used cache with hit/miss statistics '''
+
+    def __init__(self, maxsize=100000):
+        if not maxsize or maxsize < 1:
+            raise ValueError("Cache size must be a positive number (received {})".format(maxsize))
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.__data = OrderedDict()
+
+    def __len__(self):
+        return len(self.__data)
+
+    def get(self, key, default=None):
+        value = self.__data.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.__data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.__data[key] = value
+        self.__data.move_to_end(key)
+        if len(self.__data) > self.maxsize:
+            self.__data.popitem(last=False)
+
+    def clear(self):
+        self.__data.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self.__data))
+
+
+_CACHES = {}  # function name -> LRUCache, empty when caching is disabled
+
+
+def enable_cache(maxsize=100000):
+    ''' Memoize parse_furigana(), RubyToken.from_furi() and make_ruby_html()
+
+    Each function keeps at most maxsize results. Cached RubyToken objects are frozen (read-only)
+    so that they can be shared safely, and they remember their own HTML.
+    '''
+    for name in CACHED_FUNCTIONS:
+        _CACHES[name] = LRUCache(maxsize)
+
+
+def disable_cache():
+    ''' Stop memoizing and drop all cached results '''
+    _CACHES.clear()
+
+
+def clear_cache():
+    ''' Drop all cached results and reset statistics '''
+    for cache in _CACHES.values():
+        cache.clear()
+
+
+def cache_info():
+    ''' Return a map of function names to CacheInfo(hits, misses, maxsize, currsize) '''
+    return {name: cache.info() for name, cache in _CACHES.items()}
+
+
+class _Freezable(object):
+    ''' [Internal class] Objects that can be made read-only
+
+    The frozen flag and cached values are kept in slots, so they do not appear in to_dict() or to_json()
+    '''
+
+    __slots__ = ('_frozen', '_html')
+
+    def __init__(self, *args, **kwargs):
+        object.__setattr__(self, '_frozen', False)
+        object.__setattr__(self, '_html', None)
+        super().__init__(*args, **kwargs)
+
+    @property
+    def frozen(self):
+        return self._frozen
+
+    def _freeze(self):
+        ''' [Internal function] Mark this object as read-only '''
+        object.__setattr__(self, '_frozen', True)
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise AttributeError("Cannot modify a frozen {} object".format(type(self).__name__))
+        super().__setattr__(name, value)
+
+
 # ----------------------------------------------------------------------
 # Models
 # ----------------------------------------------------------------------
@@ -282,11 +391,16 @@ class TTLIG(object):
                 raise ValueError("Mismatch number of lines for {} - {}".format(line_tags, line_list))
             return IGRow(**{k: v for k, v in zip(line_tags, line_list)})
 
-    def read_iter(self, stream):
+    def _check_row_format(self):
+        ''' [Internal function] Warn about unknown labels in the header and return the row format '''
         line_tags = self.row_format()
         for tag in line_tags:
             if tag.lower() not in TTLIG.KNOWN_LABELS + TTLIG.SPECIAL_LABELS:
                 getLogger().warning("Unknown label in header: {}".format(tag))
+        return line_tags
+
+    def read_iter(self, stream):
+        line_tags = self._check_row_format()
         for row in IGStreamReader._iter_stream(stream):
             yield self._parse_row(row, line_tags)
 
@@ -353,29 +467,557 @@ def read(ttlig_filepath):
         return read_stream(infile)
 
 
+# ----------------------------------------------------------------------
+# Random access
+# ----------------------------------------------------------------------
+
+INDEX_EXT = '.idx'
+IGBlock = namedtuple('IGBlock', ['offset', 'length', 'ident'])
+
+
+BLANK_LINE = re.compile(rb'^\r*\n', re.MULTILINE)
+MANUAL_IDENT = re.compile(rb'^[ \t\r\x0b\x0c]*ident[ \t\r\x0b\x0c]*:(.*)$', re.MULTILINE)
+COMMENT_CHAR = ord('#')
+CR_CHAR = ord('\r')
+LF_CHAR = ord('\n')
+
+
+def _decode_line(raw, encoding):
+    ''' [Internal function] Decode a raw line the same way a text-mode stream does '''
+    line = str(raw, encoding)
+    return line[:-2] + '\n' if line.endswith('\r\n') else line
+
+
+def _block_spans(data, start=0):
+    ''' [Internal function] Find sentence blocks in a bytes-like object, yield (start, end) byte offsets
+
+    Blocks are separated by blank lines, comment lines before the first line of a block are skipped.
+    start must be the beginning of a line.
+    '''
+    for m in BLANK_LINE.finditer(data, start):
+        end = m.start()
+        if start < end:
+            if data[start] == COMMENT_CHAR:
+                start = _skip_comments(data, start, end)
+            if start < end:
+                yield start, end
+        start = m.end()
+    # the last line may be a blank line without \n
+    end = tail = len(data)
+    while tail > start and data[tail - 1] == CR_CHAR:
+        tail -= 1
+    if tail == start or data[tail - 1] == LF_CHAR:
+        end = tail
+    if start < end and data[start] == COMMENT_CHAR:
+        start = _skip_comments(data, start, end)
+    if start < end:
+        yield start, end
+
+
+def _skip_comments(data, start, end):
+    ''' [Internal function] Skip leading comment lines of a block candidate, return the offset of its first content line '''
+    while start < end and data[start] == COMMENT_CHAR:
+        newline = data.find(b'\n', start, end)
+        if newline == -1:
+            return end
+        start = newline + 1
+    return start
+
+
+class RawBlock(object):
+    ''' A sentence block of a memory-mapped TTLIG file, bytes are only decoded when they are requested '''
+
+    __slots__ = ('offset', 'data', 'encoding')
+
+    def __init__(self, offset, data, encoding='utf-8'):
+        self.offset = offset
+        self.data = data  # a memoryview into the mapped file
+        self.encoding = encoding
+
+    def __len__(self):
+        return len(self.data)
+
+    def text(self):
+        ''' Decode the block (comment lines included) '''
+        return str(self.data, self.encoding).replace('\r\n', '\n')
+
+    def lines(self):
+        ''' Return the content lines of the block (the same lines :func:`read_stream_iter` parses) '''
+        return [line for line in (line.rstrip('\r') for line in self.text().split('\n')) if line and not line.startswith('#')]
+
+
+class IGBlockSplitter(object):
+    ''' Split a TTLIG file into sentence blocks by scanning the bytes of a memory-mapped file
+
+    The header is read with the same rules as :func:`read_stream_iter`.
+    Lines must end with \\n or \\r\\n. Blocks are yielded as :class:`RawBlock` objects holding zero-copy memoryview
+    slices of the file, which should be dropped before the splitter is closed.
+
+    >>> with ttlig.IGBlockSplitter('corpus.tig') as splitter:
+    ...     print(splitter.count())
+    ...     for block in splitter:
+    ...         lines = block.lines()
+    '''
+
+    def __init__(self, ttlig_path, encoding='utf-8'):
+        if ttlig_path.endswith('.gz'):
+            raise ValueError("Compressed TTLIG files cannot be memory-mapped ({})".format(ttlig_path))
+        self.path = ttlig_path
+        self.encoding = encoding
+        self.__file = open(ttlig_path, 'rb')
+        self.size = os.fstat(self.__file.fileno()).st_size
+        self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.__data = memoryview(self.__mmap if self.__mmap is not None else b'')
+        try:
+            self.meta, self.body_offset = self.__read_header()
+        except BaseException:
+            self.close()
+            raise
+
+    def __read_header(self):
+        consumed = [0]  # _read_header peeks one line ahead, so count every line it pulls
+
+        def _lines():
+            mm = self.__mmap
+            while mm is not None and consumed[0] < self.size:
+                newline = mm.find(b'\n', consumed[0])
+                end = self.size if newline == -1 else newline + 1
+                raw = mm[consumed[0]:end]
+                consumed[0] = end
+                yield _decode_line(raw, self.encoding)
+        meta = IGStreamReader._read_header(_lines())
+        return meta, consumed[0]
+
+    def spans(self):
+        ''' Yield (start, end) byte offsets of all sentence blocks '''
+        if self.__mmap is not None:
+            yield from _block_spans(self.__mmap, self.body_offset)
+
+    def finditer(self, pattern):
+        ''' Match a compiled bytes pattern against the body of the file '''
+        if self.__mmap is not None:
+            yield from pattern.finditer(self.__mmap, self.body_offset)
+
+    def count(self):
+        ''' Count sentence blocks without decoding them '''
+        return sum(1 for _ in self.spans())
+
+    def __iter__(self):
+        data = self.__data
+        for start, end in self.spans():
+            yield RawBlock(start, data[start:end], self.encoding)
+
+    def close(self):
+        self.__data.release()
+        if self.__mmap is not None:
+            try:
+                self.__mmap.close()
+            except BufferError:
+                # some blocks are still in use, the mapping will be released together with them
+                pass
+            self.__mmap = None
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class IGIndex(object):
+    ''' Byte offset and length of every sentence block in a TTLIG file
+
+    Blocks are found with the same rules as :func:`read_stream_iter`, so that ordinal i refers to the i-th sentence.
+    '''
+
+    VERSION = 1
+
+    def __init__(self, size, mtime_ns, meta, blocks, encoding='utf-8'):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.meta = meta
+        self.blocks = blocks
+        self.encoding = encoding
+        self.__idents = None
+
+    def __len__(self):
+        return len(self.blocks)
+
+    @property
+    def idents(self):
+        ''' Map sentence idents to their ordinals (the first block wins when an ident is duplicated) '''
+        if self.__idents is None:
+            self.__idents = {}
+            for ordinal, block in enumerate(self.blocks):
+                if block.ident and block.ident not in self.__idents:
+                    self.__idents[block.ident] = ordinal
+        return self.__idents
+
+    def is_valid(self, ttlig_path):
+        ''' Check if this index still matches a TTLIG file (same size and modification time) '''
+        stat = os.stat(ttlig_path)
+        return stat.st_size == self.size and stat.st_mtime_ns == self.mtime_ns
+
+    @staticmethod
+    def build(ttlig_path, encoding='utf-8'):
+        ''' Scan a TTLIG file and record the position of each sentence block '''
+        if ttlig_path.endswith('.gz'):
+            raise ValueError("Random access is not available for compressed TTLIG files ({})".format(ttlig_path))
+        stat = os.stat(ttlig_path)
+        with IGBlockSplitter(ttlig_path, encoding=encoding) as splitter:
+            line_tags = TTLIG(splitter.meta).row_format()
+            if line_tags == [TTLIG.MANUAL_TAG]:
+                spans = list(splitter.spans())
+                idents = IGIndex._manual_idents(splitter.finditer(MANUAL_IDENT), spans, encoding)
+                blocks = [IGBlock(start, end - start, ident) for (start, end), ident in zip(spans, idents)]
+            elif 'ident' in line_tags:
+                ident_pos = line_tags.index('ident')
+                blocks = [IGBlock(b.offset, len(b), IGIndex._explicit_ident(b, ident_pos)) for b in splitter]
+            else:
+                blocks = [IGBlock(start, end - start, '') for start, end in splitter.spans()]
+            meta = splitter.meta
+        return IGIndex(stat.st_size, stat.st_mtime_ns, meta, blocks, encoding=encoding)
+
+    @staticmethod
+    def _explicit_ident(block, ident_pos):
+        ''' [Internal function] Find the ident line of a block when the header lists the lines explicitly '''
+        lines = block.lines()
+        return lines[ident_pos] if ident_pos < len(lines) else ''
+
+    @staticmethod
+    def _manual_idents(matches, spans, encoding):
+        ''' [Internal function] Find the value of the last ident line of each block of the __manual__ format
+
+        Ident lines are matched in a single pass over the file and assigned to blocks by their offsets.
+        '''
+        m = next(matches, None)
+        for block_start, block_end in spans:
+            ident = None
+            while m is not None and m.start() < block_end:
+                if m.start() >= block_start:
+                    ident = m
+                m = next(matches, None)
+            yield str(ident.group(1).rstrip(b'\r').lstrip(), encoding) if ident is not None else ''
+
+    def save(self, index_path):
+        ''' Write this index to a sidecar file '''
+        header = {'version': IGIndex.VERSION, 'size': self.size, 'mtime_ns': self.mtime_ns,
+                  'encoding': self.encoding, 'meta': list(self.meta.items())}
+        tmp_path = index_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8', newline='\n') as outfile:
+            outfile.write(json.dumps(header, ensure_ascii=False))
+            outfile.write('\n')
+            for block in self.blocks:
+                outfile.write('{}\t{}\t{}\n'.format(block.offset, block.length, block.ident))
+        os.replace(tmp_path, index_path)
+
+    @staticmethod
+    def load(index_path):
+        ''' Read an index from a sidecar file, return None if the file cannot be used '''
+        try:
+            with open(index_path, encoding='utf-8', newline='\n') as infile:
+                header = json.loads(infile.readline())
+                if header.get('version') != IGIndex.VERSION:
+                    return None
+                blocks = []
+                for line in infile:
+                    offset, length, ident = line.rstrip('\n').split('\t', 2)
+                    blocks.append(IGBlock(int(offset), int(length), ident))
+        except (OSError, ValueError):
+            getLogger().warning("Could not read TTLIG index {}".format(index_path))
+            return None
+        return IGIndex(header['size'], header['mtime_ns'], OrderedDict(header['meta']), blocks, encoding=header['encoding'])
+
+
+def build_index(ttlig_path, index_path=None, encoding='utf-8'):
+    ''' Build the sidecar index of a TTLIG file (ttlig_path + '.idx' by default) and return it '''
+    index = IGIndex.build(ttlig_path, encoding=encoding)
+    index.save(index_path if index_path else ttlig_path + INDEX_EXT)
+    return index
+
+
+def load_index(ttlig_path, index_path=None, encoding='utf-8', save_index=True):
+    ''' Return the sidecar index of a TTLIG file, it is (re)built when it is missing or out of date
+
+    :param save_index: Write a (re)built index to index_path. When False, the index is only kept in memory
+    '''
+    if not index_path:
+        index_path = ttlig_path + INDEX_EXT
+    index = IGIndex.load(index_path) if os.path.isfile(index_path) else None
+    if index is not None and index.encoding == encoding and index.is_valid(ttlig_path):
+        return index
+    getLogger().debug("Building TTLIG index for {}".format(ttlig_path))
+    index = IGIndex.build(ttlig_path, encoding=encoding)
+    if save_index:
+        try:
+            index.save(index_path)
+        except OSError:
+            getLogger().warning("Could not write TTLIG index to {}, the index will be kept in memory".format(index_path))
+    return index
+
+
+class IndexedTTLIG(object):
+    ''' Random access to the sentences of a TTLIG file
+
+    Sentences can be accessed by ordinal (ig[10], ig[-1], ig[10:20]) or by ident (ig['01a_02']).
+    Only the requested blocks are read (through mmap) and parsed.
+    '''
+
+    def __init__(self, ttlig_path, index):
+        self.path = ttlig_path
+        self.index = index
+        self.__ig = TTLIG(index.meta)
+        self.__line_tags = self.__ig.row_format()
+        self.__file = open(ttlig_path, 'rb')
+        self.__mmap = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ) if index.size else None
+
+    @property
+    def meta(self):
+        return self.index.meta
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        for ordinal in range(len(self)):
+            yield self[ordinal]
+
+    def __contains__(self, ident):
+        return ident in self.index.idents
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return [self[ordinal] for ordinal in range(*key.indices(len(self)))]
+        elif isinstance(key, str):
+            if key not in self.index.idents:
+                raise KeyError(key)
+            return self.read_block(self.index.idents[key])
+        return self.read_block(key)
+
+    def get(self, ident, default=None):
+        ''' Get a sentence by ident '''
+        return self[ident] if ident in self.index.idents else default
+
+    def sample(self, k, seed=None):
+        ''' Return k random sentences (without replacement) '''
+        return [self[ordinal] for ordinal in random.Random(seed).sample(range(len(self)), k)]
+
+    def raw_block(self, ordinal):
+        ''' Return the raw text of a sentence block '''
+        block = self.index.blocks[ordinal]
+        return self.__mmap[block.offset:block.offset + block.length].decode(self.index.encoding)
+
+    def read_block(self, ordinal):
+        ''' Parse a sentence block into an IGRow '''
+        text = self.raw_block(ordinal).replace('\r\n', '\n')
+        for lines in IGStreamReader._iter_stream(io.StringIO(text)):
+            return self.__ig._parse_row(lines, self.__line_tags)
+
+    def close(self):
+        if self.__mmap is not None:
+            self.__mmap.close()
+            self.__mmap = None
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def open_indexed(ttlig_path, index_path=None, encoding='utf-8'):
+    ''' Open a TTLIG file for random access, the sidecar index is (re)built when needed
+
+    >>> with ttlig.open_indexed('corpus.tig') as ig:
+    ...     sent = ig['01a_02']
+    ...     first_ten = ig[:10]
+    ...     some = ig.sample(100, seed=1)
+    '''
+    return IndexedTTLIG(ttlig_path, load_index(ttlig_path, index_path, encoding=encoding))
+
+
+# ----------------------------------------------------------------------
+# Chunked processing
+# ----------------------------------------------------------------------
+
+def _read_chunk(job):
+    ''' [Internal function] Parse a byte range of sentence blocks and apply fn to the [(ordinal, IGRow), ...] list '''
+    ttlig_path, encoding, meta, offset, length, first_ordinal, fn = job
+    with open(ttlig_path, 'rb') as infile:
+        infile.seek(offset)
+        text = infile.read(length).decode(encoding).replace('\r\n', '\n')
+    ig = TTLIG(meta)
+    line_tags = ig.row_format()
+    rows = [(first_ordinal + idx, ig._parse_row(lines, line_tags))
+            for idx, lines in enumerate(IGStreamReader._iter_stream(io.StringIO(text)))]
+    return fn(rows)
+
+
+def _init_worker(cache):
+    ''' [Internal function] Set up a worker process of :func:`map_chunks` '''
+    if cache:
+        enable_cache(cache)
+    else:
+        disable_cache()
+
+
+def map_chunks(ttlig_path, fn, jobs=1, chunk_size=500, max_pending=None, cache=0, index_path=None, save_index=True, encoding='utf-8'):
+    ''' Apply fn to chunks of sentences of a TTLIG file and yield the results in the original order
+
+    fn receives a list of (ordinal, IGRow) tuples (ordinals start from 0).
+    With jobs=1, or when the file is compressed (.gz) and cannot be read by byte ranges,
+    the file is read sequentially in the current process.
+    Otherwise the file is split into byte ranges of chunk_size sentence blocks using its sidecar index
+    (see :func:`load_index`) and each range is read, parsed and passed to fn in a worker process.
+    At most max_pending chunks (2 per job by default) are in flight, so memory use does not grow with the file size.
+    fn must be picklable (i.e. a module-level function) when more than one job is used.
+
+    :param jobs: Number of worker processes, None for the number of CPUs
+    :param cache: Furigana cache size in each worker (see :func:`enable_cache`), 0 to disable caching
+    :param index_path: Path to the sidecar index, ttlig_path + '.idx' by default
+    :param save_index: Write the index to index_path when it is (re)built, use False to keep it in memory only
+                       (e.g. when the input directory is read-only or shared)
+    '''
+    if chunk_size < 1:
+        raise ValueError("Chunk size must be a positive number (received {})".format(chunk_size))
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or ttlig_path.endswith('.gz'):
+        with chio.open(ttlig_path, encoding=encoding) as infile:
+            chunk = []
+            for ordinal, row in enumerate(read_stream_iter(infile)):
+                chunk.append((ordinal, row))
+                if len(chunk) >= chunk_size:
+                    yield fn(chunk)
+                    chunk = []
+            if chunk:
+                yield fn(chunk)
+        return
+    index = load_index(ttlig_path, index_path, encoding=encoding, save_index=save_index)
+    TTLIG(index.meta)._check_row_format()
+    if max_pending is None:
+        max_pending = jobs * 2
+    blocks = index.blocks
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(cache,)) as executor:
+        pending = deque()
+        for first in range(0, len(blocks), chunk_size):
+            last = blocks[min(first + chunk_size, len(blocks)) - 1]
+            job = (ttlig_path, encoding, index.meta, blocks[first].offset, last.offset + last.length - blocks[first].offset, first, fn)
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+            pending.append(executor.submit(_read_chunk, job))
+        while pending:
+            yield pending.popleft().result()
+
+
+def chunk_to_ttl(rows):
+    ''' Convert [(ordinal, IGRow), ...] to TTL-TXT content
+
+    Sentence IDs are ordinal + 1, i.e. the same IDs a TxtWriter gives when the whole file is converted sequentially.
+    :return: A tuple of (sents, tokens, concepts, links, tags) strings
+    '''
+    streams = [io.StringIO() for _ in range(5)]
+    writer = ttl.TxtWriter(*streams)
+    for ordinal, row in rows:
+        ttl_sent = row.to_ttl()
+        ttl_sent.ID = ordinal + 1
+        writer.write_sent(ttl_sent)
+    return tuple(stream.getvalue() for stream in streams)
+
+
+def chunk_to_expex(rows):
+    ''' Convert [(ordinal, IGRow), ...] to ExPex, sentences without ident are labelled with ordinal + 1 '''
+    return ''.join('{}\n\n\n\n'.format(row.to_expex(default_ident=ordinal + 1)) for ordinal, row in rows)
+
+
 FURIMAP = re.compile(r'\{(?P<text>[\w%％]+?)/(?P<furi>[\w%％]+?)\}')
+FURI_ALIGNERS = ('ndiff', 'kana')
+KANA_CHARS = frozenset(HIRAGANA + KATAKANA)
+
 
+def _align_kana(surface, kana):
+    ''' [Internal function] Align a surface string with its reading by anchoring on their shared kana runs
+
+    Surface kana runs must be found in the reading in order, each non-kana run takes the reading between its neighbour anchors.
+    Return a list of groups (strings and RubyFrag objects), or None when the reading cannot be matched unambiguously.
+    '''
+    runs = []  # [is_kana, text]
+    for c in surface:
+        c_is_kana = c in KANA_CHARS
+        if runs and runs[-1][0] == c_is_kana:
+            runs[-1][1] += c
+        else:
+            runs.append([c_is_kana, c])
+    # minimum reading length needed by the runs from i onwards
+    needed = [0] * (len(runs) + 1)
+    for i in range(len(runs) - 1, -1, -1):
+        needed[i] = needed[i + 1] + (len(runs[i][1]) if runs[i][0] else 1)
+    groups = []
+    pos = 0
+    for i, (run_is_kana, text) in enumerate(runs):
+        if run_is_kana:
+            anchor = text.translate(KATA2HIRA_TRANS)
+            if not kana.startswith(anchor, pos):
+                return None
+            groups.append(text)
+            pos += len(anchor)
+            continue
+        if i + 1 < len(runs):
+            # the next run is a kana anchor, it must occur exactly once where the remaining runs still fit
+            anchor = runs[i + 1][1].translate(KATA2HIRA_TRANS)
+            limit = len(kana) - needed[i + 1] + len(anchor)
+            end = kana.find(anchor, pos + 1, limit)
+            if end < 0 or kana.find(anchor, end + 1, limit) >= 0:
+                return None
+        else:
+            end = len(kana)
+            if end <= pos:
+                return None
+        furi = kana[pos:end]
+        groups.append(text if furi == text else RubyFrag(text=text, furi=furi))
+        pos = end
+    return groups if pos == len(kana) else None
 
-class RubyToken(DataObject):
+
+class RubyToken(_Freezable, DataObject):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         if 'groups' not in kwargs:
             self.groups = []
 
     def append(self, group):
+        if self.frozen:
+            raise AttributeError("Cannot modify a frozen RubyToken object")
         self.groups.append(group)
 
+    def freeze(self):
+        ''' Make this token and its fragments read-only, return the token itself '''
+        if not self.frozen:
+            for g in self.groups:
+                if isinstance(g, RubyFrag):
+                    g.freeze()
+            self.groups = tuple(self.groups)
+            self._freeze()
+        return self
+
     def text(self):
         return ''.join(str(x) for x in self.groups)
 
     def to_html(self):
+        if self._html is not None:
+            return self._html
         frags = []
         for g in self.groups:
             if isinstance(g, RubyFrag):
                 frags.append(g.to_html())
             else:
                 frags.append(str(g))
-        return ''.join(frags)
+        html = ''.join(frags)
+        if self.frozen:
+            object.__setattr__(self, '_html', html)
+        return html
 
     def to_code(self):
         frags = []
@@ -400,11 +1042,37 @@ class RubyToken(DataObject):
         return self.text()
 
     @staticmethod
-    def from_furi(surface, kana):
+    def from_furi(surface, kana, aligner='ndiff'):
+        ''' Create a RubyToken from a surface string and its reading in hiragana
+
+        :param aligner: 'ndiff' (default) aligns kanji with their readings using difflib.
+                        'kana' aligns them in a single pass by anchoring on shared kana (faster)
+                        and falls back to 'ndiff' when the reading cannot be matched unambiguously
+        '''
+        if aligner not in FURI_ALIGNERS:
+            raise ValueError("Invalid furigana aligner {} (must be one of {})".format(repr(aligner), ', '.join(FURI_ALIGNERS)))
+        cache = _CACHES.get('from_furi')
+        if cache is None:
+            return RubyToken._from_furi(surface, kana, aligner)
+        key = (surface, kana, aligner)
+        ruby = cache.get(key)
+        if ruby is None:
+            ruby = RubyToken._from_furi(surface, kana, aligner).freeze()
+            cache.put(key, ruby)
+        return ruby
+
+    @staticmethod
+    def _from_furi(surface, kana, aligner):
+        ''' [Internal function] Align surface and kana without caching '''
         ruby = RubyToken(surface=surface)
         if is_kana(surface):
             ruby.append(surface)
             return ruby
+        if aligner == 'kana':
+            groups = _align_kana(surface, kana)
+            if groups is not None:
+                ruby.groups = groups
+                return ruby
         edit_seq = ndiff(surface, kana)
         kanji = ''
         text = ''
@@ -459,10 +1127,15 @@ class RubyToken(DataObject):
         return ruby
 
 
-class RubyFrag(DataObject):
+class RubyFrag(_Freezable, DataObject):
     def __init__(self, text, furi, **kwargs):
         super().__init__(text=text, furi=furi, **kwargs)
 
+    def freeze(self):
+        ''' Make this fragment read-only, return the fragment itself '''
+        self._freeze()
+        return self
+
     def __repr__(self):
         return "Ruby(text={}, furi={})".format(repr(self.text), repr(self.furi))
 
@@ -477,6 +1150,18 @@ def parse_furigana(text):
     ''' Parse TTLRuby token (returns a RubyToken)'''
     if text is None:
         raise ValueError
+    cache = _CACHES.get('parse_furigana')
+    if cache is None:
+        return _parse_furigana(text)
+    ruby = cache.get(text)
+    if ruby is None:
+        ruby = _parse_furigana(text).freeze()
+        cache.put(text, ruby)
+    return ruby
+
+
+def _parse_furigana(text):
+    ''' [Internal function] Parse TTLRuby token without caching '''
     start = 0
     ruby = RubyToken(surface=text)
     ms = [(m.groupdict(), m.span()) for m in FURIMAP.finditer(text)]
@@ -498,6 +1183,52 @@ class TTLTokensParser(object):
         self.delimiter = delimiter
 
     def parse(self, text):
+        ''' Split a line into tokens
+
+        Lines without escape characters are split with str.split(), other lines are scanned from one
+        escape character to the next. Both give the same tokens and warnings as the character-by-character parser.
+        '''
+        if not isinstance(text, str) or len(self.escapechar) != 1 or len(self.delimiter) != 1 or self.escapechar == self.delimiter:
+            return self._parse_chars(text)
+        if self.escapechar not in text:
+            return [t for t in text.split(self.delimiter) if t]
+        return self._parse_escaped(text)
+
+    def parse_many(self, lines):
+        ''' Parse a sequence of lines and return a list of token lists '''
+        parse = self.parse
+        return [parse(line) for line in lines]
+
+    def _parse_escaped(self, text):
+        ''' [Internal function] Split a line that contains escape characters '''
+        escapechar, delimiter = self.escapechar, self.delimiter
+        tokens = []
+        current = ''
+        start = 0
+        while True:
+            esc = text.find(escapechar, start)
+            parts = (text[start:esc] if esc >= 0 else text[start:]).split(delimiter)
+            current += parts[0]
+            if len(parts) > 1:
+                if current:
+                    tokens.append(current)
+                tokens.extend(t for t in parts[1:-1] if t)
+                current = parts[-1]
+            if esc < 0:
+                break
+            if esc + 1 >= len(text):
+                raise ValueError("Escape char ({}) cannot be the last character".format(escapechar))
+            escaped = text[esc + 1]
+            if escaped not in (escapechar, delimiter):
+                getLogger().warning("Escape char ({}) should not be used for normal character ({}). This can be a potential bug in the data.".format(escapechar, escaped))
+            current += escaped
+            start = esc + 2
+        if current:
+            tokens.append(current)
+        return tokens
+
+    def _parse_chars(self, text):
+        ''' [Internal function] Character-by-character parser, used for non-string input and multi-character delimiters '''
         tokens = []
         current = []
         chars = piter(text)
@@ -539,13 +1270,24 @@ def tokenize(text):
     return DEFAULT_TTL_TOKEN_PARSER.parse(text)
 
 
+def tokenize_many(lines):
+    ''' Tokenize a sequence of lines, return a list of token lists '''
+    return DEFAULT_TTL_TOKEN_PARSER.parse_many(lines)
+
+
 def parse_ruby(text):
     return DEFAULT_TTL_TOKEN_PARSER.parse_ruby(text)
 
 
 def make_ruby_html(text):
-    tokens = parse_ruby(text)
-    return DEFAULT_TTL_TOKEN_PARSER.delimiter.join(r.to_html() for r in tokens)
+    cache = _CACHES.get('make_ruby_html')
+    html = cache.get(text) if cache is not None else None
+    if html is None:
+        tokens = parse_ruby(text)
+        html = DEFAULT_TTL_TOKEN_PARSER.delimiter.join(r.to_html() for r in tokens)
+        if cache is not None:
+            cache.put(text, html)
+    return html
 
 
 def mctoken_to_furi(token):
@@ -554,8 +1296,11 @@ def mctoken_to_furi(token):
     return RubyToken.from_furi(token.surface, token.reading_hira())
 
 
-def text_to_igrow(txt):
-    ''' Parse text to TTLIG format '''
+def text_to_igrow(txt, aligner='ndiff'):
+    ''' Parse text to TTLIG format
+
+    :param aligner: Furigana aligner, see :meth:`RubyToken.from_furi`
+    '''
     msent = parse(txt)
     tokens = []
     pos = []
@@ -564,7 +1309,7 @@ def text_to_igrow(txt):
         if token.is_eos:
             continue
         pos.append(token.pos3())
-        r = RubyToken.from_furi(token.surface, token.reading_hira())
+        r = RubyToken.from_furi(token.surface, token.reading_hira(), aligner=aligner)
         tokens.append(r.to_code())
         lemmas.append(token.root)
     igrow = IGRow(text=txt, tokens=' '.join(tokens), pos=' '.join(pos), lemma=' '.join(lemmas))